@@ -0,0 +1,131 @@
+"""
+Demand-driven pacing for the continuous recognition loop
+Place this in: smart_glasses_server/server/adaptive_rate.py
+
+The loop used to run every 0.5 s for as long as the camera was on.  The
+controller here picks the delay before the next iteration from two signals:
+
+  * demand - when a client last polled for results (frame endpoints,
+    connect).  With no demand for idle_timeout seconds the loop pauses
+    until the next request wakes it.
+  * scene change - whether the set of faces differs from the previous
+    iteration.  New or changing faces run at fast_hz; once the scene has
+    been unchanged for stable_after iterations the loop drops to slow_hz.
+
+Both rates are multiplied by scale, which the thermal governor lowers when
+the device runs hot or on low battery.
+"""
+
+import os
+import time
+import threading
+
+REASON_ACTIVE = 'scene_changing'
+REASON_STABLE = 'scene_stable'
+REASON_IDLE = 'no_recent_demand'
+
+
+class AdaptiveRateController:
+    def __init__(self, fast_hz=8.0, slow_hz=2.0, idle_timeout=10.0, stable_after=5):
+        self.fast_hz = fast_hz
+        self.slow_hz = slow_hz
+        self.idle_timeout = idle_timeout
+        self.stable_after = stable_after
+        self.scale = 1.0
+
+        self.wake_event = threading.Event()
+        self.last_demand = 0.0
+        self.last_signature = None
+        self.stable_iterations = 0
+        self.current_hz = 0.0
+        self.reason = REASON_IDLE
+        self.stats = {
+            'iterations': 0,
+            'fast_iterations': 0,
+            'slow_iterations': 0,
+            'pauses': 0,
+            'wakeups': 0
+        }
+
+    @classmethod
+    def from_env(cls):
+        """Controller from RECOGNITION_* environment variables, defaults otherwise"""
+        env = os.environ
+        return cls(
+            fast_hz=float(env.get('RECOGNITION_FAST_HZ', 8.0)),
+            slow_hz=float(env.get('RECOGNITION_SLOW_HZ', 2.0)),
+            idle_timeout=float(env.get('RECOGNITION_IDLE_TIMEOUT', 10.0)),
+            stable_after=int(env.get('RECOGNITION_STABLE_AFTER', 5))
+        )
+
+    def set_scale(self, scale):
+        """Multiply fast_hz and slow_hz by scale (1.0 = configured rates)"""
+        self.scale = max(0.05, float(scale))
+
+    def note_demand(self):
+        """Record that a client asked for results; wakes a paused loop"""
+        self.last_demand = time.time()
+        if not self.wake_event.is_set():
+            self.wake_event.set()
+
+    def has_demand(self):
+        return time.time() - self.last_demand < self.idle_timeout
+
+    def _scene_signature(self, result):
+        faces = (result or {}).get('faces') or []
+        names = sorted(face.get('name') or 'unknown' for face in faces if face.get('recognized'))
+        unknown = sum(1 for face in faces if not face.get('recognized'))
+        return tuple(names), unknown
+
+    def observe(self, result):
+        """Feed one recognition result; tracks how long the scene has been stable"""
+        signature = self._scene_signature(result)
+        if signature == self.last_signature:
+            self.stable_iterations += 1
+        else:
+            self.stable_iterations = 0
+            self.last_signature = signature
+        self.stats['iterations'] += 1
+
+    def next_interval(self):
+        """Seconds until the next iteration, or None to pause until demand returns"""
+        if not self.has_demand():
+            if self.reason != REASON_IDLE:
+                self.stats['pauses'] += 1
+            self.current_hz = 0.0
+            self.reason = REASON_IDLE
+            return None
+
+        if self.stable_iterations >= self.stable_after:
+            self.current_hz = self.slow_hz * self.scale
+            self.reason = REASON_STABLE
+            self.stats['slow_iterations'] += 1
+        else:
+            self.current_hz = self.fast_hz * self.scale
+            self.reason = REASON_ACTIVE
+            self.stats['fast_iterations'] += 1
+        return 1.0 / self.current_hz
+
+    def wait_for_demand(self, timeout=1.0):
+        """Block while paused; True once a client has asked for results again"""
+        self.wake_event.clear()
+        woken = self.wake_event.wait(timeout) or self.has_demand()
+        if woken:
+            self.stats['wakeups'] += 1
+            # A fresh consumer should get fresh results quickly
+            self.stable_iterations = 0
+        return woken
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats.update({
+            'current_hz': self.current_hz,
+            'reason': self.reason,
+            'fast_hz': self.fast_hz,
+            'slow_hz': self.slow_hz,
+            'scale': self.scale,
+            'idle_timeout': self.idle_timeout,
+            'stable_iterations': self.stable_iterations,
+            'seconds_since_demand': round(time.time() - self.last_demand, 3) if self.last_demand else None
+        })
+        return stats
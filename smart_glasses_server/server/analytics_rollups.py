@@ -0,0 +1,160 @@
+"""
+Incrementally maintained rollups of recognition_logs
+Place this in: smart_glasses_server/server/analytics_rollups.py
+
+Three rollup tables hold counts, sums (for averages) and the confidence
+level histogram per hour, per day and per (day, person, method).  Writers
+call update_rollups() inside the same transaction that inserts the raw rows,
+so the analytics endpoints can read O(days) rollup rows instead of
+re-aggregating O(events) raw rows on every dashboard refresh.
+"""
+
+from collections import defaultdict
+
+CONFIDENCE_LEVELS = (
+    ('very_high', 0.85),
+    ('high', 0.70),
+    ('medium', 0.50),
+    ('low', 0.35),
+    ('very_low', float('-inf'))
+)
+
+LEVEL_COLUMNS = [name for name, _ in CONFIDENCE_LEVELS]
+
+_METRIC_COLUMNS = '''
+        count INTEGER NOT NULL DEFAULT 0,
+        confidence_sum REAL NOT NULL DEFAULT 0.0,
+        quality_sum REAL NOT NULL DEFAULT 0.0,
+        processing_time_sum REAL NOT NULL DEFAULT 0.0,
+        very_high INTEGER NOT NULL DEFAULT 0,
+        high INTEGER NOT NULL DEFAULT 0,
+        medium INTEGER NOT NULL DEFAULT 0,
+        low INTEGER NOT NULL DEFAULT 0,
+        very_low INTEGER NOT NULL DEFAULT 0
+'''
+
+ROLLUP_SCHEMA_STATEMENTS = [
+    f'''
+    CREATE TABLE IF NOT EXISTS recognition_rollup_hourly (
+        hour TEXT PRIMARY KEY,
+        {_METRIC_COLUMNS}
+    )
+    ''',
+    f'''
+    CREATE TABLE IF NOT EXISTS recognition_rollup_daily (
+        day TEXT PRIMARY KEY,
+        {_METRIC_COLUMNS}
+    )
+    ''',
+    f'''
+    CREATE TABLE IF NOT EXISTS recognition_rollup_person_daily (
+        day TEXT NOT NULL,
+        person_name TEXT NOT NULL,
+        method_used TEXT NOT NULL,
+        {_METRIC_COLUMNS},
+        PRIMARY KEY (day, person_name, method_used)
+    )
+    '''
+]
+
+ROLLUP_TABLES = {
+    'recognition_rollup_hourly': ('hour',),
+    'recognition_rollup_daily': ('day',),
+    'recognition_rollup_person_daily': ('day', 'person_name', 'method_used')
+}
+
+_METRICS = ['count', 'confidence_sum', 'quality_sum', 'processing_time_sum'] + LEVEL_COLUMNS
+
+
+def confidence_level(confidence):
+    for name, threshold in CONFIDENCE_LEVELS:
+        if confidence >= threshold:
+            return name
+    return 'very_low'
+
+
+def confidence_level_sql(column):
+    """SQL CASE expression mapping a confidence column to its level name"""
+    cases = ' '.join(
+        f"WHEN {column} >= {threshold} THEN '{name}'"
+        for name, threshold in CONFIDENCE_LEVELS[:-1]
+    )
+    return f"CASE {cases} ELSE 'very_low' END"
+
+
+def _upsert_sql(table, keys):
+    columns = list(keys) + _METRICS
+    placeholders = ', '.join('?' for _ in columns)
+    updates = ', '.join(f"{m} = {m} + excluded.{m}" for m in _METRICS)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates}"
+    )
+
+
+def update_rollups(conn, rows):
+    """Fold freshly inserted recognition_logs rows into the rollup tables.
+
+    rows are (person_name, confidence, quality_score, processing_time,
+    method_used, timestamp) tuples with timestamps in face_db's
+    TIMESTAMP_FORMAT.  Must run inside the transaction that inserted them.
+    """
+    buckets = {table: defaultdict(lambda: [0, 0.0, 0.0, 0.0] + [0] * len(LEVEL_COLUMNS))
+               for table in ROLLUP_TABLES}
+
+    for person_name, confidence, quality_score, processing_time, method_used, timestamp in rows:
+        confidence = float(confidence or 0.0)
+        level_index = 4 + LEVEL_COLUMNS.index(confidence_level(confidence))
+        keys = {
+            'recognition_rollup_hourly': (timestamp[:13],),
+            'recognition_rollup_daily': (timestamp[:10],),
+            'recognition_rollup_person_daily': (timestamp[:10], person_name or 'unknown',
+                                                method_used or 'standard')
+        }
+        for table, key in keys.items():
+            bucket = buckets[table][key]
+            bucket[0] += 1
+            bucket[1] += confidence
+            bucket[2] += float(quality_score or 0.0)
+            bucket[3] += float(processing_time or 0.0)
+            bucket[level_index] += 1
+
+    for table, key_columns in ROLLUP_TABLES.items():
+        if buckets[table]:
+            conn.executemany(
+                _upsert_sql(table, key_columns),
+                [tuple(key) + tuple(values) for key, values in buckets[table].items()]
+            )
+
+
+def rebuild_rollups(conn):
+    """Recompute every rollup from the raw recognition_logs rows"""
+    # Legacy rows may hold NULL metrics; count them as 0 like update_rollups
+    # does, since SUM() of an all-NULL group would violate NOT NULL.
+    level = confidence_level_sql('COALESCE(confidence, 0.0)')
+    level_sums = ', '.join(f"COALESCE(SUM({level} = '{name}'), 0)" for name in LEVEL_COLUMNS)
+    aggregates = (
+        "COUNT(*), TOTAL(confidence), TOTAL(quality_score), TOTAL(processing_time), " + level_sums
+    )
+    metric_columns = ', '.join(_METRICS)
+
+    for table in ROLLUP_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+
+    conn.execute(f'''
+        INSERT INTO recognition_rollup_hourly (hour, {metric_columns})
+        SELECT substr(timestamp, 1, 13), {aggregates}
+        FROM recognition_logs GROUP BY substr(timestamp, 1, 13)
+    ''')
+    conn.execute(f'''
+        INSERT INTO recognition_rollup_daily (day, {metric_columns})
+        SELECT substr(timestamp, 1, 10), {aggregates}
+        FROM recognition_logs GROUP BY substr(timestamp, 1, 10)
+    ''')
+    conn.execute(f'''
+        INSERT INTO recognition_rollup_person_daily (day, person_name, method_used, {metric_columns})
+        SELECT substr(timestamp, 1, 10), COALESCE(person_name, 'unknown'),
+               COALESCE(method_used, 'standard'), {aggregates}
+        FROM recognition_logs
+        GROUP BY substr(timestamp, 1, 10), COALESCE(person_name, 'unknown'), COALESCE(method_used, 'standard')
+    ''')
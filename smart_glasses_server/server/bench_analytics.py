@@ -0,0 +1,139 @@
+"""
+Benchmark for the recognition analytics queries
+Place this in: smart_glasses_server/server/bench_analytics.py
+
+Fills a scratch database with synthetic recognition_logs rows and compares
+the old DATE(timestamp) = ? filters with the half-open timestamp ranges,
+printing the SQLite query plan of each so the index range scan is visible.
+
+Usage:
+    python bench_analytics.py                 # 10M rows over one year
+    python bench_analytics.py --rows 1000000 --db /tmp/analytics_bench.db
+"""
+
+import argparse
+import os
+import time
+from datetime import datetime, timedelta
+
+from face_db import FaceDatabase, day_range, format_timestamp
+
+DAILY_SUMMARY_LEGACY = '''
+    SELECT COUNT(*), COUNT(DISTINCT person_name), AVG(confidence), AVG(quality_score)
+    FROM recognition_logs
+    WHERE DATE(timestamp) = ?
+'''
+
+DAILY_SUMMARY_RANGE = '''
+    SELECT COUNT(*), COUNT(DISTINCT person_name), AVG(confidence), AVG(quality_score)
+    FROM recognition_logs
+    WHERE timestamp >= ? AND timestamp < ?
+'''
+
+HISTORY_LEGACY = '''
+    SELECT DATE(timestamp), COUNT(*), COUNT(DISTINCT person_name)
+    FROM recognition_logs
+    WHERE DATE(timestamp) <= ? AND DATE(timestamp) >= DATE(?, '-30 days')
+    GROUP BY DATE(timestamp)
+'''
+
+HISTORY_RANGE = '''
+    SELECT DATE(timestamp), COUNT(*), COUNT(DISTINCT person_name)
+    FROM recognition_logs
+    WHERE timestamp >= ? AND timestamp < ?
+    GROUP BY DATE(timestamp)
+'''
+
+
+def populate(db, rows, days, people):
+    """Insert rows evenly spread over `days` days ending now, in one statement"""
+    start = datetime.now() - timedelta(days=days)
+    spacing = days * 86400.0 / rows
+
+    with db.connection() as conn:
+        conn.execute("DROP INDEX IF EXISTS idx_recognition_logs_timestamp")
+        conn.execute("DROP INDEX IF EXISTS idx_recognition_logs_person_timestamp")
+
+    load_start = time.perf_counter()
+    with db.transaction() as conn:
+        conn.execute('''
+            WITH RECURSIVE seq(n) AS (
+                SELECT 0 UNION ALL SELECT n + 1 FROM seq WHERE n + 1 < ?
+            )
+            INSERT INTO recognition_logs
+            (person_name, confidence, quality_score, processing_time, method_used, timestamp)
+            SELECT
+                'person_' || (abs(random()) % ?),
+                0.35 + (abs(random()) % 600) / 1000.0,
+                0.3 + (abs(random()) % 600) / 1000.0,
+                (abs(random()) % 800) / 1000.0,
+                'multi_face_recognition',
+                strftime('%Y-%m-%d %H:%M:%S', ?, '+' || CAST(n * ? AS INTEGER) || ' seconds')
+            FROM seq
+        ''', (rows, people, format_timestamp(start), spacing))
+    print(f"Inserted {rows:,} rows in {time.perf_counter() - load_start:.1f}s")
+
+    index_start = time.perf_counter()
+    db.init_schema()
+    with db.connection() as conn:
+        conn.execute("ANALYZE")
+    print(f"Built indexes in {time.perf_counter() - index_start:.1f}s")
+
+
+def explain(conn, sql, params):
+    return [row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params)]
+
+
+def timed(conn, sql, params, repeat):
+    conn.execute(sql, params).fetchall()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, params).fetchall()
+    return (time.perf_counter() - start) * 1000.0 / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark recognition analytics queries")
+    parser.add_argument('--db', default='analytics_bench.db', help='Scratch database path')
+    parser.add_argument('--rows', type=int, default=10_000_000, help='Synthetic rows to generate')
+    parser.add_argument('--days', type=int, default=365, help='Days the rows are spread over')
+    parser.add_argument('--people', type=int, default=50, help='Distinct person names')
+    parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query')
+    parser.add_argument('--keep', action='store_true', help='Reuse an existing scratch database')
+    args = parser.parse_args()
+
+    if os.path.exists(args.db) and not args.keep:
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(args.db + suffix):
+                os.remove(args.db + suffix)
+
+    db = FaceDatabase(args.db)
+    db.init_schema()
+    row_count = db.query_one("SELECT COUNT(*) FROM recognition_logs")[0]
+    if row_count == 0:
+        populate(db, args.rows, args.days, args.people)
+
+    date = (datetime.now() - timedelta(days=1)).strftime('%Y-%m-%d')
+    day_start, day_end = day_range(date)
+    month_start, month_end = day_range(date, days=31, offset_days=-30)
+
+    cases = [
+        ('daily_report legacy', DAILY_SUMMARY_LEGACY, (date,)),
+        ('daily_report range', DAILY_SUMMARY_RANGE, (day_start, day_end)),
+        ('historical_data legacy', HISTORY_LEGACY, (date, date)),
+        ('historical_data range', HISTORY_RANGE, (month_start, month_end)),
+    ]
+
+    with db.connection() as conn:
+        for name, sql, params in cases:
+            repeat = 1 if 'legacy' in name else args.repeat
+            elapsed = timed(conn, sql, params, repeat)
+            print(f"\n{name}: {elapsed:.1f} ms")
+            for step in explain(conn, sql, params):
+                print(f"    plan: {step}")
+
+    db.close_all()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Offline benchmark of the face pipeline with gallery scaling curves
+Place this in: smart_glasses_server/server/bench_face_pipeline.py
+
+Replays a directory of images or a video file through the server's own
+preprocess_camera_frame and recognize_multiple_faces, against synthetic
+galleries of random unit vectors, and reports fps, per-stage p50/p99 and
+peak RSS for each gallery size.  Results are written as JSON so runs can be
+compared over time.
+
+The face server is imported with FACE_DB_PATH pointing at a scratch database
+so the real enrolment database is never touched, and with GOVERNOR=0 so
+every run measures the full performance tier.
+
+Usage:
+    python bench_face_pipeline.py --images ./frames --galleries 10,1000,10000,100000
+    python bench_face_pipeline.py --video walk.mp4 --max-frames 300 --output run.json
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import cv2
+import numpy as np
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+
+def load_frames(images=None, video=None, max_frames=0):
+    """Decode all input frames up front so file I/O is not part of the timings"""
+    frames = []
+    if images:
+        paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(images, pattern)))
+        for path in paths:
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+            if max_frames and len(frames) >= max_frames:
+                break
+    elif video:
+        capture = cv2.VideoCapture(video)
+        while not max_frames or len(frames) < max_frames:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            frames.append(frame)
+        capture.release()
+    return frames
+
+
+def synthetic_gallery(count, per_person, dim, rng):
+    """Random unit-vector identities"""
+    people = {}
+    for i in range(count):
+        vectors = rng.standard_normal((per_person, dim)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        people[f"synthetic_{i}"] = [
+            {'encoding': vector, 'quality': 0.8, 'weight': 1.0} for vector in vectors
+        ]
+    return people
+
+
+def rss_mb():
+    """Peak resident set size of this process so far (ru_maxrss is KiB on Linux)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 1024.0 if sys.platform != 'darwin' else peak / (1024.0 * 1024.0), 1)
+
+
+def run_once(server, frames, gallery_size, args, rng):
+    from stage_metrics import StageMetrics
+
+    build_start = time.perf_counter()
+    server.gallery.load(synthetic_gallery(gallery_size, args.per_person, args.dim, rng))
+    build_seconds = time.perf_counter() - build_start
+
+    server.metrics = StageMetrics('face_server')
+    server.face_tracker.clear()
+
+    for frame in frames[:args.warmup]:
+        server.recognize_multiple_faces(server.preprocess_camera_frame(frame), use_tracking=args.tracking)
+    server.metrics = StageMetrics('face_server')
+
+    faces = 0
+    deferred = 0
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for frame in frames:
+            with server.metrics.time('preprocess'):
+                processed = server.preprocess_camera_frame(frame)
+            result = server.recognize_multiple_faces(processed, use_tracking=args.tracking)
+            faces += result.get('face_count', 0)
+            deferred += result.get('deferred_count', 0)
+    elapsed = time.perf_counter() - start
+    processed_frames = len(frames) * args.repeat
+
+    stages = {
+        stage: {'count': s['count'], 'p50_ms': s['p50_ms'], 'p99_ms': s['p99_ms'], 'avg_ms': s['avg_ms']}
+        for stage, s in server.metrics.summary().items()
+    }
+    return {
+        'gallery_size': gallery_size,
+        'gallery_embeddings': server.gallery.embedding_count(),
+        'gallery_bytes': server.gallery.memory_bytes(),
+        'gallery_build_seconds': round(build_seconds, 3),
+        'frames': processed_frames,
+        'faces': faces,
+        'deferred_faces': deferred,
+        'seconds': round(elapsed, 3),
+        'fps': round(processed_frames / elapsed, 3) if elapsed > 0 else 0.0,
+        'stages': stages,
+        'peak_rss_mb': rss_mb()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the face pipeline against synthetic galleries")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--images', help='Directory of images to replay')
+    source.add_argument('--video', help='Video file to replay')
+    parser.add_argument('--max-frames', type=int, default=200, help='Frames to load (0 = all)')
+    parser.add_argument('--galleries', default='10,1000,10000,100000',
+                        help='Comma separated gallery sizes (identities)')
+    parser.add_argument('--per-person', type=int, default=1, help='Embeddings per synthetic identity')
+    parser.add_argument('--dim', type=int, default=512, help='Embedding dimension')
+    parser.add_argument('--repeat', type=int, default=1, help='Passes over the frames per gallery size')
+    parser.add_argument('--warmup', type=int, default=3, help='Untimed frames before each run')
+    parser.add_argument('--tracking', action='store_true',
+                        help='Use face tracking and the per-frame time budget as the live loop does')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=f"face_pipeline_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
+                        help='Where to write the JSON results')
+    args = parser.parse_args()
+
+    frames = load_frames(args.images, args.video, args.max_frames)
+    if not frames:
+        print("No frames could be loaded")
+        return 1
+
+    scratch = tempfile.mkdtemp(prefix='face_bench_')
+    os.environ['FACE_DB_PATH'] = os.path.join(scratch, 'face_database.db')
+    # Measure the full pipeline, not whatever tier the governor picks mid-run
+    os.environ['GOVERNOR'] = '0'
+
+    rss_before_import = rss_mb()
+    from face_server import face_server as server
+    if not server.model_loaded:
+        print("Face model failed to load; nothing to benchmark")
+        return 1
+    # Only the inference thread; the scratch database needs no writer or retention
+    server.start_background(log_writer=False, retention=False, governor=False)
+    rss_after_model = rss_mb()
+
+    rng = np.random.default_rng(args.seed)
+    runs = []
+    for size in (int(s) for s in args.galleries.split(',') if s.strip()):
+        run = run_once(server, frames, size, args, rng)
+        runs.append(run)
+        print(f"gallery={size:>7}  fps={run['fps']:>7.2f}  "
+              f"recognize p50={run['stages'].get('recognize_total', {}).get('p50_ms', 0):.1f}ms "
+              f"p99={run['stages'].get('recognize_total', {}).get('p99_ms', 0):.1f}ms  "
+              f"peak_rss={run['peak_rss_mb']}MB")
+
+    frame_shape = frames[0].shape
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'source': args.images or args.video,
+        'config': {
+            'frames': len(frames),
+            'frame_size': f"{frame_shape[1]}x{frame_shape[0]}",
+            'per_person': args.per_person,
+            'dim': args.dim,
+            'repeat': args.repeat,
+            'tracking': args.tracking,
+            'frame_time_budget_ms': server.frame_time_budget * 1000.0 if args.tracking else None,
+            'seed': args.seed
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'machine': platform.machine(),
+            'cpu_count': os.cpu_count(),
+            'numpy': np.__version__,
+            'opencv': cv2.__version__,
+            'similarity_backend': server.gallery.backend.name,
+            'similarity_isa': server.gallery.backend.isa,
+            'storage_dtype': server.gallery.memory_report()['storage_dtype']
+        },
+        'rss_mb': {
+            'before_import': rss_before_import,
+            'after_model_load': rss_after_model,
+            'peak': rss_mb()
+        },
+        'runs': runs
+    }
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Gallery storage report: memory use and accuracy drift of compact embeddings
+Place this in: smart_glasses_server/server/bench_gallery_storage.py
+
+Builds the gallery in float32, float16 and int8 and compares memory use,
+match latency and how far the confidences and top-1 identities drift from
+the float32 reference.  Uses the enrolled faces from face_database.db when
+--db is given, random synthetic identities otherwise.
+
+Usage:
+    python bench_gallery_storage.py --db face_database.db
+    python bench_gallery_storage.py --people 5000 --per-person 8
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+import numpy as np
+
+from gallery import FaceGallery, STORAGE_DTYPES, decode_embedding
+from similarity import get_backend
+
+
+def load_db_people(db_path):
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
+    cursor.execute("PRAGMA table_info(face_encodings)")
+    columns = {row[1] for row in cursor.fetchall()}
+    has_dtype = 'encoding_dtype' in columns
+
+    cursor.execute(f'''
+        SELECT p.name, fe.encoding, fe.image_quality
+               {', fe.encoding_dtype, fe.encoding_scale' if has_dtype else ''}
+        FROM people p
+        JOIN face_encodings fe ON p.id = fe.person_id
+        WHERE fe.is_outlier = FALSE
+    ''')
+
+    people = {}
+    for row in cursor.fetchall():
+        name, blob, quality = row[0], row[1], row[2]
+        dtype, scale = (row[3], row[4]) if has_dtype else ('float32', 1.0)
+        people.setdefault(name, []).append({
+            'encoding': decode_embedding(blob, dtype, scale),
+            'quality': float(quality) if isinstance(quality, (int, float)) else 0.5,
+            'weight': 1.0
+        })
+    conn.close()
+    return people
+
+
+def synthetic_people(count, per_person, dim, rng):
+    people = {}
+    for i in range(count):
+        centre = rng.standard_normal(dim).astype(np.float32) * 20.0
+        people[f"person_{i}"] = [
+            {
+                'encoding': centre + rng.standard_normal(dim).astype(np.float32) * 8.0,
+                'quality': float(rng.uniform(0.3, 1.0)),
+                'weight': 1.0
+            }
+            for _ in range(per_person)
+        ]
+    return people
+
+
+def make_queries(people, count, rng):
+    """Noisy copies of enrolled embeddings, so most queries have a true match"""
+    names = list(people.keys())
+    queries = []
+    for _ in range(count):
+        entries = people[names[rng.integers(len(names))]]
+        base = entries[rng.integers(len(entries))]['encoding']
+        queries.append(base + rng.standard_normal(base.shape).astype(np.float32) * 6.0)
+    return queries
+
+
+def run(people, query_count, backend_name, seed):
+    rng = np.random.default_rng(seed)
+    queries = make_queries(people, query_count, rng)
+    qualities = [0.7] * len(queries)
+    backend = get_backend(backend_name)
+
+    reference = None
+    report = []
+    for dtype in STORAGE_DTYPES:
+        gallery = FaceGallery(backend=backend, storage_dtype=dtype)
+        gallery.load(people)
+
+        start = time.perf_counter()
+        matches = [gallery.match([q], [quality])[0] for q, quality in zip(queries, qualities)]
+        elapsed_ms = (time.perf_counter() - start) * 1000.0 / max(1, len(queries))
+
+        row = dict(gallery.memory_report())
+        row['backend'] = backend.name
+        row['match_ms'] = round(elapsed_ms, 3)
+
+        if reference is None:
+            reference = matches
+            row['top1_agreement'] = 1.0
+            row['max_confidence_drift'] = 0.0
+            row['mean_confidence_drift'] = 0.0
+        else:
+            drift = np.array([abs(a[1] - b[1]) for a, b in zip(matches, reference)])
+            agree = np.mean([a[0] == b[0] for a, b in zip(matches, reference)])
+            row['top1_agreement'] = round(float(agree), 4)
+            row['max_confidence_drift'] = round(float(drift.max()), 5)
+            row['mean_confidence_drift'] = round(float(drift.mean()), 5)
+
+        report.append(row)
+        print(json.dumps(row))
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report gallery memory and accuracy per storage dtype")
+    parser.add_argument('--db', help='face_database.db to take the enrolled faces from')
+    parser.add_argument('--people', type=int, default=1000, help='Synthetic identities')
+    parser.add_argument('--per-person', type=int, default=8, help='Synthetic embeddings per identity')
+    parser.add_argument('--dim', type=int, default=512, help='Embedding dimension')
+    parser.add_argument('--queries', type=int, default=200, help='Query faces to score')
+    parser.add_argument('--backend', default=None, help="Similarity backend: auto, numpy or simsimd")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write the report as JSON to this file')
+    args = parser.parse_args()
+
+    if args.db:
+        people = load_db_people(args.db)
+        if not people:
+            print(f"No enrolled faces found in {args.db}")
+            return
+    else:
+        people = synthetic_people(args.people, args.per_person, args.dim, np.random.default_rng(args.seed))
+
+    report = run(people, args.queries, args.backend, args.seed)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Micro-benchmark for the face similarity backends
+Place this in: smart_glasses_server/server/bench_similarity.py
+
+Compares the NumPy and SimSIMD backends (and the legacy per-pair Python
+loop for small galleries) on random embeddings.
+
+Usage:
+    python bench_similarity.py
+    python bench_similarity.py --sizes 10 1000 100000 --queries 4 --repeat 20
+"""
+
+import argparse
+import json
+import time
+import numpy as np
+
+from similarity import NumpyBackend, SimSIMDBackend, SIMSIMD_AVAILABLE, simd_supported
+from gallery import FaceGallery
+
+DEFAULT_SIZES = [10, 100, 1000, 10000, 100000]
+LEGACY_MAX_SIZE = 10000
+
+
+def legacy_match(encoding, gallery_matrix):
+    """Per-pair scoring the way recognize_multiple_faces used to do it"""
+    best = 0.0
+    for stored_encoding in gallery_matrix:
+        cosine_sim = np.dot(encoding, stored_encoding) / (
+            np.linalg.norm(encoding) * np.linalg.norm(stored_encoding)
+        )
+        euclidean_dist = np.linalg.norm(encoding - stored_encoding)
+        euclidean_sim = 1.0 / (1.0 + euclidean_dist * 0.3)
+        best = max(best, cosine_sim * 0.6 + euclidean_sim * 0.4)
+    return best
+
+
+def time_call(func, repeat):
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings)) * 1000.0
+
+
+def build_gallery(backend, matrix, per_person):
+    gallery = FaceGallery(backend=backend)
+    people = {}
+    for i in range(0, len(matrix), per_person):
+        people[f"person_{i // per_person}"] = [
+            {'encoding': row, 'quality': 0.8, 'weight': 1.0}
+            for row in matrix[i:i + per_person]
+        ]
+    gallery.load(people)
+    return gallery
+
+
+def run(sizes, dim, queries, repeat, per_person):
+    rng = np.random.default_rng(0)
+    backends = [NumpyBackend()]
+    if SIMSIMD_AVAILABLE:
+        backends.append(SimSIMDBackend())
+
+    results = []
+    for size in sizes:
+        matrix = rng.standard_normal((size, dim)).astype(np.float32)
+        query = rng.standard_normal((queries, dim)).astype(np.float32)
+        row = {'gallery_size': size, 'queries': queries}
+
+        for backend in backends:
+            row[f'{backend.name}_cosine_ms'] = round(time_call(lambda: backend.cosine(query, matrix), repeat), 3)
+            row[f'{backend.name}_sqeuclidean_ms'] = round(time_call(lambda: backend.sqeuclidean(query, matrix), repeat), 3)
+
+            gallery = build_gallery(backend, matrix, per_person)
+            qualities = [0.8] * queries
+            row[f'{backend.name}_match_ms'] = round(time_call(lambda: gallery.match(query, qualities), repeat), 3)
+
+        if size <= LEGACY_MAX_SIZE:
+            row['legacy_loop_ms'] = round(
+                time_call(lambda: [legacy_match(q, matrix) for q in query], max(1, repeat // 5)), 3
+            )
+
+        results.append(row)
+        print(json.dumps(row))
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark face similarity backends")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES,
+                        help='Gallery sizes (number of stored embeddings)')
+    parser.add_argument('--dim', type=int, default=512, help='Embedding dimension')
+    parser.add_argument('--queries', type=int, default=1, help='Faces per frame')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed repetitions per measurement')
+    parser.add_argument('--per-person', type=int, default=5, help='Embeddings per enrolled person')
+    parser.add_argument('--output', help='Write results as JSON to this file')
+    args = parser.parse_args()
+
+    print(f"simsimd installed: {SIMSIMD_AVAILABLE}, SIMD usable: {simd_supported()}")
+    results = run(args.sizes, args.dim, args.queries, args.repeat, args.per_person)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+"""
+Camera discovery with an on-disk cache of the working configuration
+Place this in: smart_glasses_server/server/camera_discovery.py
+
+Probing every /dev/video node with every OpenCV backend takes seconds on
+the Pi, so the first successful probe is written to CAMERA_CACHE_PATH
+(camera_profile.json by default) as a profile: kind ('rpi' or 'usb'),
+device, backend, pixel format, size and fps.  Later starts and restarts
+open that profile directly and only fall back to a full probe if it no
+longer works.  Delete the file to force a fresh probe after swapping
+cameras.
+
+Only backends that exist on the running platform are tried (V4L2 on
+Linux), only capture nodes are considered on Linux (the metadata and codec
+nodes under /sys/class/video4linux are skipped) and the handle that passed
+the probe is returned for use instead of being closed and reopened.
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import logging
+
+import cv2
+import numpy as np
+
+# Video nodes of the Pi's ISP, codecs and metadata streams, never a camera
+NON_CAMERA_NAMES = ('codec', 'isp', 'hevc', 'pispbe', 'unicam-embedded', 'bcm2835-isp')
+
+PIXEL_FORMATS = ('MJPG', 'YUYV', None)
+
+
+def platform_backends():
+    """OpenCV capture backends worth trying on this OS, best first"""
+    if sys.platform.startswith('linux'):
+        return [('V4L2', cv2.CAP_V4L2), ('ANY', cv2.CAP_ANY)]
+    if sys.platform == 'darwin':
+        return [('AVFOUNDATION', cv2.CAP_AVFOUNDATION), ('ANY', cv2.CAP_ANY)]
+    if sys.platform.startswith('win'):
+        return [('DSHOW', cv2.CAP_DSHOW), ('MSMF', cv2.CAP_MSMF), ('ANY', cv2.CAP_ANY)]
+    return [('ANY', cv2.CAP_ANY)]
+
+
+def candidate_devices(limit=3):
+    """Capture device indices, from sysfs on Linux and 0..limit-1 elsewhere"""
+    nodes = sorted(glob.glob('/sys/class/video4linux/video*'),
+                   key=lambda path: int(path.rsplit('video', 1)[-1]))
+    if not nodes:
+        return list(range(limit))
+
+    devices = []
+    for node in nodes:
+        try:
+            with open(os.path.join(node, 'name')) as f:
+                name = f.read().strip().lower()
+            index_path = os.path.join(node, 'index')
+            index = open(index_path).read().strip() if os.path.exists(index_path) else '0'
+        except OSError:
+            continue
+        # UVC cameras expose the image stream on index 0 and metadata on 1
+        if index != '0' or any(word in name for word in NON_CAMERA_NAMES):
+            continue
+        devices.append(int(node.rsplit('video', 1)[-1]))
+    return devices
+
+
+def frame_is_usable(frame, min_intensity=15, max_intensity=240):
+    return frame is not None and frame.size > 0 and min_intensity < np.mean(frame) < max_intensity
+
+
+class CameraDiscovery:
+    def __init__(self, cache_path='camera_profile.json', probe_frames=5):
+        self.cache_path = cache_path
+        self.probe_frames = probe_frames
+        self.profile = self._load()
+        self.stats = {
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'probes': 0,
+            'last_open_ms': None
+        }
+
+    def _load(self):
+        try:
+            with open(self.cache_path) as f:
+                profile = json.load(f)
+            if profile.get('kind') in ('rpi', 'usb'):
+                return profile
+        except (OSError, ValueError):
+            pass
+        return None
+
+    def save(self, profile):
+        profile = dict(profile, probed_at=time.time())
+        self.profile = profile
+        try:
+            tmp_path = f"{self.cache_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(profile, f, indent=2)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            logging.warning(f"Could not cache camera profile: {e}")
+
+    def invalidate(self):
+        self.profile = None
+        try:
+            os.remove(self.cache_path)
+        except OSError:
+            pass
+
+    def cached_kind(self):
+        return self.profile.get('kind') if self.profile else None
+
+    def _open(self, device, backend_id, fourcc, settings):
+        """Open and configure one device; returns the capture if it delivers a usable frame"""
+        capture = cv2.VideoCapture(device, backend_id)
+        if not capture.isOpened():
+            capture.release()
+            return None
+
+        if fourcc:
+            capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, settings['width'])
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, settings['height'])
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+        capture.set(cv2.CAP_PROP_FPS, settings['fps'])
+
+        # Auto exposure may need a few frames to leave a black first frame
+        for _ in range(self.probe_frames):
+            ret, frame = capture.read()
+            if ret and frame_is_usable(frame):
+                return capture
+        capture.release()
+        return None
+
+    def open_usb(self, settings):
+        """(capture, profile) for a working USB camera, or (None, None).
+
+        Tries the cached profile first and probes devices, backends and
+        pixel formats only when that fails.
+        """
+        start = time.perf_counter()
+        backends = dict(platform_backends())
+
+        profile = self.profile
+        if profile and profile.get('kind') == 'usb' and profile.get('backend') in backends:
+            capture = self._open(profile['device'], backends[profile['backend']], profile.get('fourcc'), settings)
+            if capture is not None:
+                self.stats['cache_hits'] += 1
+                self.stats['last_open_ms'] = round((time.perf_counter() - start) * 1000.0, 1)
+                logging.info(f"Opened cached camera profile: /dev/video{profile['device']} "
+                             f"{profile['backend']} {profile.get('fourcc') or 'default'}")
+                return capture, profile
+            logging.warning("Cached camera profile no longer works, probing")
+        self.stats['cache_misses'] += 1
+
+        self.stats['probes'] += 1
+        for device in candidate_devices():
+            if sys.platform.startswith('linux') and not os.path.exists(f"/dev/video{device}"):
+                continue
+            for backend_name, backend_id in platform_backends():
+                for fourcc in PIXEL_FORMATS:
+                    try:
+                        capture = self._open(device, backend_id, fourcc, settings)
+                    except Exception as e:
+                        logging.debug(f"Camera {device} {backend_name} {fourcc} failed: {e}")
+                        continue
+                    if capture is None:
+                        continue
+
+                    profile = {
+                        'kind': 'usb',
+                        'device': device,
+                        'backend': backend_name,
+                        'fourcc': fourcc,
+                        'width': int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                        'height': int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                        'fps': float(capture.get(cv2.CAP_PROP_FPS) or settings['fps'])
+                    }
+                    self.save(profile)
+                    self.stats['last_open_ms'] = round((time.perf_counter() - start) * 1000.0, 1)
+                    logging.info(f"Camera probe found /dev/video{device} {backend_name} "
+                                 f"{fourcc or 'default'} in {self.stats['last_open_ms']} ms")
+                    return capture, profile
+
+        self.stats['last_open_ms'] = round((time.perf_counter() - start) * 1000.0, 1)
+        return None, None
+
+    def record_rpi(self, width, height, fps):
+        self.save({'kind': 'rpi', 'device': 'picamera2', 'width': width, 'height': height, 'fps': fps})
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['cache_path'] = self.cache_path
+        stats['profile'] = self.profile
+        return stats
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            cache_path=os.environ.get('CAMERA_CACHE_PATH', 'camera_profile.json'),
+            probe_frames=int(os.environ.get('CAMERA_PROBE_FRAMES', 5))
+        )
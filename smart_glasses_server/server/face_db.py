@@ -0,0 +1,255 @@
+"""
+Pooled SQLite access layer for the face server
+Place this in: smart_glasses_server/server/face_db.py
+
+Connections are opened once, tuned (WAL journal, synchronous=NORMAL,
+memory-mapped I/O, larger page cache) and then reused.  A thread checks a
+connection out for the duration of a `with db.connection()` block, so it
+has exclusive use of it, and it goes back to the pool afterwards even on
+early returns or exceptions.  Each pooled connection keeps sqlite3's
+prepared statement cache warm, and WAL lets dashboard readers run while the
+recognition log writer commits.
+"""
+
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from analytics_rollups import ROLLUP_SCHEMA_STATEMENTS, rebuild_rollups
+
+# Every timestamp written to recognition_logs uses this local-time format, so
+# plain string comparison orders rows chronologically and range filters can
+# use the timestamp index.
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+DATE_FORMAT = '%Y-%m-%d'
+
+SCHEMA_VERSION = 2
+
+SCHEMA_STATEMENTS = [
+    '''
+    CREATE TABLE IF NOT EXISTS people (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT UNIQUE NOT NULL,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        photo_count INTEGER DEFAULT 0,
+        avg_quality REAL DEFAULT 0.0,
+        best_quality REAL DEFAULT 0.0,
+        registration_method TEXT DEFAULT 'single'
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS face_encodings (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        person_id INTEGER,
+        encoding BLOB NOT NULL,
+        image_quality REAL DEFAULT 0.0,
+        weight REAL DEFAULT 1.0,
+        is_outlier BOOLEAN DEFAULT FALSE,
+        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        encoding_dtype TEXT DEFAULT 'float32',
+        encoding_scale REAL DEFAULT 1.0,
+        FOREIGN KEY (person_id) REFERENCES people (id)
+    )
+    ''',
+    '''
+    CREATE TABLE IF NOT EXISTS recognition_logs (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        person_name TEXT,
+        confidence REAL,
+        quality_score REAL DEFAULT 0.0,
+        processing_time REAL DEFAULT 0.0,
+        method_used TEXT DEFAULT 'standard',
+        face_count INTEGER DEFAULT 1,
+        timestamp TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+        source TEXT DEFAULT 'realtime'
+    )
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_recognition_logs_timestamp
+    ON recognition_logs (timestamp)
+    ''',
+    '''
+    CREATE INDEX IF NOT EXISTS idx_recognition_logs_person_timestamp
+    ON recognition_logs (person_name, timestamp)
+    '''
+] + ROLLUP_SCHEMA_STATEMENTS
+
+
+def format_timestamp(value):
+    """Format a datetime (or epoch seconds) for recognition_logs"""
+    if isinstance(value, (int, float)):
+        value = datetime.fromtimestamp(value)
+    return value.strftime(TIMESTAMP_FORMAT)
+
+
+def day_range(date_str, days=1, offset_days=0):
+    """Half-open [start, end) timestamp bounds covering `days` days, starting
+    `offset_days` days from date_str.
+
+    Raises ValueError for anything that is not YYYY-MM-DD.
+    """
+    start = datetime.strptime(date_str, DATE_FORMAT) + timedelta(days=offset_days)
+    end = start + timedelta(days=days)
+    return format_timestamp(start), format_timestamp(end)
+
+
+def since(delta):
+    """Lower timestamp bound for "the last <delta>" queries"""
+    return format_timestamp(datetime.now() - delta)
+
+
+DEFAULT_PRAGMAS = {
+    'synchronous': 'NORMAL',
+    'mmap_size': 64 * 1024 * 1024,
+    'cache_size': -8192,
+    'temp_store': 'MEMORY',
+    'busy_timeout': 5000
+}
+
+
+class FaceDatabase:
+    def __init__(self, db_path, max_idle=8, cached_statements=128, pragmas=None):
+        self.db_path = db_path
+        self.max_idle = max_idle
+        self.cached_statements = cached_statements
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+
+        self._idle = []
+        self._lock = threading.Lock()
+        self.journal_mode = None
+        self.stats = {
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'reuses': 0
+        }
+
+    def _open(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=self.pragmas['busy_timeout'] / 1000.0,
+            check_same_thread=False,
+            cached_statements=self.cached_statements
+        )
+        mode = conn.execute("PRAGMA journal_mode=WAL").fetchone()
+        self.journal_mode = mode[0] if mode else None
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name}={value}")
+
+        with self._lock:
+            self.stats['connections_opened'] += 1
+        return conn
+
+    def _acquire(self):
+        with self._lock:
+            self.stats['checkouts'] += 1
+            if self._idle:
+                self.stats['reuses'] += 1
+                return self._idle.pop()
+        return self._open()
+
+    def _release(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error as e:
+            logging.warning(f"Discarding broken database connection: {e}")
+            self._close(conn)
+            return
+
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(conn)
+                return
+        self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self.stats['connections_closed'] += 1
+
+    @contextmanager
+    def connection(self):
+        """Check out a pooled connection for reads (or manual commits)"""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Check out a pooled connection and commit on success, roll back on error"""
+        with self.connection() as conn:
+            with conn:
+                yield conn
+
+    def init_schema(self):
+        """Create tables and indexes and run pending data migrations"""
+        with self.connection() as conn:
+            # Incremental auto-vacuum lets retention return freed pages in
+            # small steps; switching an existing file over needs one VACUUM.
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+                conn.execute("VACUUM")
+
+        with self.transaction() as conn:
+            for statement in SCHEMA_STATEMENTS:
+                conn.execute(statement)
+
+            encoding_columns = {row[1] for row in conn.execute("PRAGMA table_info(face_encodings)")}
+            if 'encoding_dtype' not in encoding_columns:
+                conn.execute("ALTER TABLE face_encodings ADD COLUMN encoding_dtype TEXT DEFAULT 'float32'")
+            if 'encoding_scale' not in encoding_columns:
+                conn.execute("ALTER TABLE face_encodings ADD COLUMN encoding_scale REAL DEFAULT 1.0")
+
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < 1:
+                # Rows that took the old CURRENT_TIMESTAMP default are UTC in
+                # TIMESTAMP_FORMAT already; every explicit write was isoformat.
+                # Convert the defaults to local time first, while the two can
+                # still be told apart.
+                conn.execute('''
+                    UPDATE recognition_logs
+                    SET timestamp = datetime(timestamp, 'localtime')
+                    WHERE timestamp NOT LIKE '____-__-__T%' AND length(timestamp) = 19
+                ''')
+                # Test data used to be written with isoformat() ('T' separator
+                # and microseconds); bring it in line with TIMESTAMP_FORMAT.
+                conn.execute('''
+                    UPDATE recognition_logs
+                    SET timestamp = substr(replace(timestamp, 'T', ' '), 1, 19)
+                    WHERE timestamp LIKE '____-__-__T%' OR length(timestamp) > 19
+                ''')
+            if version < 2:
+                rebuild_rollups(conn)
+            if version < SCHEMA_VERSION:
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def query(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchall()
+
+    def query_one(self, sql, params=()):
+        with self.connection() as conn:
+            return conn.execute(sql, params).fetchone()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._close(conn)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats['idle'] = len(self._idle)
+        stats['journal_mode'] = self.journal_mode
+        return stats
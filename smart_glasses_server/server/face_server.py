@@ -4,17 +4,18 @@ Place this in: smart_glasses_server/server/face_server.py
 """
 
 import statistics
-from flask import Flask, Response, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, stream_with_context
 import cv2
 import numpy as np
 import base64
 import json
 import os
-import sqlite3
 from datetime import datetime, timedelta
 import logging
 import time
 from flask_cors import CORS
+from sampling_profiler import profiler_blueprint
+from serving import serve, serving_stats
 import io
 from PIL import Image
 import PIL.Image
@@ -27,6 +28,27 @@ import threading
 import socket
 from collections import defaultdict, deque
 import random
+import zipfile
+import signal
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+
+from gallery import FaceGallery, encode_embedding, decode_embedding
+from gallery_shm import SharedGalleryPublisher, SharedGalleryReader, SharedFaceGallery
+from recognition_log_writer import RecognitionLogWriter
+from face_db import FaceDatabase, day_range, since, format_timestamp
+from analytics_rollups import LEVEL_COLUMNS, confidence_level, update_rollups
+from log_retention import RetentionEngine
+from adaptive_rate import AdaptiveRateController
+from face_tracking import FaceTracker, face_priority
+from stage_metrics import StageMetrics
+from file_camera import FileCamera
+from camera_discovery import CameraDiscovery, frame_is_usable
+from frame_quality import FrameQualityGate
+from inference_scheduler import InferenceScheduler, LIVE, ON_DEMAND, ENROLLMENT, BATCH
+from thermal_governor import ThermalGovernor
+from stream_enrollment import score_face, dominant_face, select_diverse, consistent_embeddings
+from image_decode import decode_image, decode_base64
 
 try:
     from picamera2 import Picamera2
@@ -52,6 +74,7 @@ app = Flask(
     static_folder=STATIC_DIR
 )
 CORS(app)
+app.register_blueprint(profiler_blueprint)
 
 PERSON_DESCRIPTIONS = [
     "{name} is here",
@@ -83,8 +106,18 @@ class EnhancedFaceRecognitionServer:
     def __init__(self):
         self.model = None
         self.model_loaded = False
-        self.db_path = "face_database.db"
-        self.face_encodings = {}
+        self.inference = None
+        self.db_path = os.environ.get('FACE_DB_PATH', "face_database.db")
+        self.db = FaceDatabase(self.db_path)
+        self.gallery = FaceGallery()
+
+        # FACE_WORKERS > 0 forks that many API worker processes after the
+        # model is loaded; they map the gallery from shared memory.
+        self.api_workers = int(os.environ.get('FACE_WORKERS', 0))
+        self.api_worker_port = int(os.environ.get('FACE_WORKER_PORT', 5010))
+        self.role = 'primary'
+        self.worker_index = None
+        self.gallery_publisher = None
 
         self.recognition_threshold = 0.40   
         self.quality_threshold = 0.10
@@ -93,19 +126,42 @@ class EnhancedFaceRecognitionServer:
 
         self.max_faces_to_detect = 10
         self.min_face_distance = 50  
+
+        # Recognition time budget per live frame; the nearest face is always
+        # processed, the rest in priority order until the budget runs out.
+        self.frame_time_budget = float(os.environ.get('FRAME_TIME_BUDGET_MS', 300)) / 1000.0
+        self.face_cost_estimate = 0.05
+        self.face_tracker = FaceTracker.from_env()
+        self.last_announcement = (None, None)
+        self.recognize_max_side = int(os.environ.get('RECOGNIZE_MAX_SIDE', 1280))
+
+        self.batch_max_images = int(os.environ.get('BATCH_MAX_IMAGES', 200))
+        self.batch_max_bytes = int(os.environ.get('BATCH_MAX_MB', 100)) * 1024 * 1024
+        self.batch_concurrency = int(os.environ.get('BATCH_CONCURRENCY', os.cpu_count() or 2))
+        self.batch_size = int(os.environ.get('BATCH_SIZE', 8))
+        self.metrics = StageMetrics('face_server')
         
         self.recognition_cache = {}
         self.cache_duration = 2.0
 
         self.picamera2 = None
         self.camera_mode = None
+        # 'auto' tries the RPi camera then USB; 'file' plays CAMERA_FILE instead
+        self.camera_source = os.environ.get('CAMERA_SOURCE', 'auto').lower()
+        self.camera_discovery = CameraDiscovery.from_env()
+        self.rpi_warmup_seconds = float(os.environ.get('RPI_WARMUP_SECONDS', 3.0))
         self.camera_width = 1920
         self.camera_height = 1080
         self.fps = 30
         self.camera = None
         self.camera_active = False
         self.camera_lock = threading.Lock()
+        # Signalled by the capture thread whenever last_frame is replaced;
+        # frame_seq numbers frames so consumers can wait for a newer one.
+        self.frame_ready = threading.Condition(self.camera_lock)
         self.last_frame = None
+        self.frame_seq = 0
+        self.last_frame_time = None
         self.frame_capture_thread = None
         self.stop_capture = False
         self.camera_error = None
@@ -114,6 +170,10 @@ class EnhancedFaceRecognitionServer:
         self.stop_processing = False
         self.last_recognition_result = None
         self.recognition_lock = threading.Lock()
+        self.recognition_rate = AdaptiveRateController.from_env()
+        self.frame_gate = FrameQualityGate.from_env()
+        self.governor = ThermalGovernor.from_env()
+        self.enrollment_lock = threading.Lock()
         
         self.recognition_stats = {
             'total_requests': 0,
@@ -121,6 +181,11 @@ class EnhancedFaceRecognitionServer:
             'multi_face_detections': 0,
             'cache_hits': 0,
             'avg_processing_time': 0.0,
+            'deferred_faces': 0,
+            'identity_changes': 0,
+            'suppressed_flips': 0,
+            'skipped_frames': 0,
+            'rejected_frames': 0,
             'errors': 0
         }
 
@@ -134,56 +199,40 @@ class EnhancedFaceRecognitionServer:
         }
 
         self.init_database()
+        self.log_writer = RecognitionLogWriter(self.db)
+        self.retention = RetentionEngine(self.db)
         self.init_face_model()
         self.load_face_database()
 
+    def start_background(self, log_writer=True, retention=True, governor=True):
+        """Start the inference thread and, as requested, the log writer,
+        retention and governor threads.
+
+        Kept out of __init__ so API workers can be forked while the process
+        is still single-threaded; call it once per process before serving.
+        Retention must run in one process per database only.
+        """
+        if log_writer:
+            self.log_writer.start()
+        if retention:
+            self.retention.start()
+        if self.inference is not None:
+            self.inference.start()
+        if governor:
+            self.governor.add_listener(self.apply_performance_tier)
+            self.governor.start()
+
+    def apply_performance_tier(self, tier):
+        """Push a governor tier into the rate controller and the detector;
+        preprocessing and capture read the active tier themselves"""
+        self.recognition_rate.set_scale(tier.rate_scale)
+        if self.inference is not None:
+            self.inference.det_size = (tier.det_size, tier.det_size) if tier.det_size else None
+
     def init_database(self):
         """Initialize SQLite database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS people (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT UNIQUE NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    photo_count INTEGER DEFAULT 0,
-                    avg_quality REAL DEFAULT 0.0,
-                    best_quality REAL DEFAULT 0.0,
-                    registration_method TEXT DEFAULT 'single'
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS face_encodings (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    person_id INTEGER,
-                    encoding BLOB NOT NULL,
-                    image_quality REAL DEFAULT 0.0,
-                    weight REAL DEFAULT 1.0,
-                    is_outlier BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    FOREIGN KEY (person_id) REFERENCES people (id)
-                )
-            ''')
-            
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS recognition_logs (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    person_name TEXT,
-                    confidence REAL,
-                    quality_score REAL DEFAULT 0.0,
-                    processing_time REAL DEFAULT 0.0,
-                    method_used TEXT DEFAULT 'standard',
-                    face_count INTEGER DEFAULT 1,
-                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    source TEXT DEFAULT 'realtime'
-                )
-            ''')
-            
-            conn.commit()
-            conn.close()
+            self.db.init_schema()
             logging.info("Database initialized successfully")
             
         except Exception as e:
@@ -195,15 +244,32 @@ class EnhancedFaceRecognitionServer:
             logging.info("Initializing InsightFace model...")
             
             import insightface
+
+            model_options = {}
+            # ONNX Runtime thread pools do not survive fork(); with one thread
+            # per session inference runs on the calling thread and the worker
+            # processes provide the parallelism instead.  FACE_INFERENCE_THREADS
+            # sets the per-session thread count explicitly (0 = ORT default).
+            inference_threads = int(os.environ.get('FACE_INFERENCE_THREADS', 1 if self.api_workers > 0 else 0))
+            if inference_threads > 0:
+                import onnxruntime
+                session_options = onnxruntime.SessionOptions()
+                session_options.intra_op_num_threads = inference_threads
+                session_options.inter_op_num_threads = 1
+                model_options['sess_options'] = session_options
             
             self.model = insightface.app.FaceAnalysis(
                 providers=['CPUExecutionProvider'],
-                allowed_modules=['detection', 'recognition']
+                allowed_modules=['detection', 'recognition'],
+                **model_options
             )
             self.model.prepare(ctx_id=0, det_size=(640, 640))
             
             test_image = np.random.randint(0, 255, (480, 640, 3), dtype=np.uint8)
             test_faces = self.model.get(test_image)
+
+            # From here on every model call goes through the scheduler
+            self.inference = InferenceScheduler.from_env(self.model, self.metrics)
             
             self.model_loaded = True
             logging.info("InsightFace model loaded successfully")
@@ -217,59 +283,129 @@ class EnhancedFaceRecognitionServer:
     def load_face_database(self):
         """Load face encodings from database - FIXED VERSION"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self.db.connection() as conn:
+                cursor = conn.cursor()
             
-            cursor.execute('''
-                SELECT p.name, fe.encoding, fe.image_quality, fe.weight, fe.is_outlier 
-                FROM people p
-                JOIN face_encodings fe ON p.id = fe.person_id
-                WHERE fe.is_outlier = FALSE
-                ORDER BY fe.image_quality DESC
-            ''')
+                cursor.execute('''
+                    SELECT p.name, fe.encoding, fe.image_quality, fe.weight, fe.is_outlier,
+                           fe.encoding_dtype, fe.encoding_scale
+                    FROM people p
+                    JOIN face_encodings fe ON p.id = fe.person_id
+                    WHERE fe.is_outlier = FALSE
+                    ORDER BY fe.image_quality DESC
+                ''')
             
-            results = cursor.fetchall()
+                results = cursor.fetchall()
+                people_entries = {}
             
-            for name, encoding_blob, quality, weight, is_outlier in results:
-                encoding = np.frombuffer(encoding_blob, dtype=np.float32)
-                if name not in self.face_encodings:
-                    self.face_encodings[name] = []
+                for name, encoding_blob, quality, weight, is_outlier, encoding_dtype, encoding_scale in results:
+                    encoding = decode_embedding(encoding_blob, encoding_dtype, encoding_scale)
+                    if name not in people_entries:
+                        people_entries[name] = []
                 
-                try:
-                    if isinstance(quality, bytes):
-                        quality_float = float(np.frombuffer(quality, dtype=np.float32)[0])
-                    elif quality is not None:
-                        quality_float = float(quality)
-                    else:
-                        quality_float = 0.5
+                    try:
+                        if isinstance(quality, bytes):
+                            quality_float = float(np.frombuffer(quality, dtype=np.float32)[0])
+                        elif quality is not None:
+                            quality_float = float(quality)
+                        else:
+                            quality_float = 0.5
                         
-                    if isinstance(weight, bytes):
-                        weight_float = float(np.frombuffer(weight, dtype=np.float32)[0])
-                    elif weight is not None:
-                        weight_float = float(weight)
-                    else:
-                        weight_float = 1.0
+                        if isinstance(weight, bytes):
+                            weight_float = float(np.frombuffer(weight, dtype=np.float32)[0])
+                        elif weight is not None:
+                            weight_float = float(weight)
+                        else:
+                            weight_float = 1.0
                         
-                except (TypeError, ValueError, IndexError) as e:
-                    logging.warning(f"Invalid quality/weight for {name}: quality={type(quality)}, weight={type(weight)}, error={e}")
-                    quality_float = 0.5
-                    weight_float = 1.0
+                    except (TypeError, ValueError, IndexError) as e:
+                        logging.warning(f"Invalid quality/weight for {name}: quality={type(quality)}, weight={type(weight)}, error={e}")
+                        quality_float = 0.5
+                        weight_float = 1.0
                 
-                self.face_encodings[name].append({
-                    'encoding': encoding,
-                    'quality': quality_float,
-                    'weight': weight_float
-                })
+                    people_entries[name].append({
+                        'encoding': encoding,
+                        'quality': quality_float,
+                        'weight': weight_float
+                    })
             
-            conn.close()
-            logging.info(f"Loaded {len(self.face_encodings)} people from database")
+            self.gallery.load(people_entries)
+            memory = self.gallery.memory_report()
+            logging.info(f"Loaded {len(self.gallery)} people from database "
+                         f"(similarity backend: {self.gallery.backend.name} [{self.gallery.backend.isa}], "
+                         f"{memory['storage_dtype']} gallery: {memory['total_bytes'] / 1024:.1f} KiB)")
         
         except Exception as e:
             logging.error(f"Error loading face database: {e}")
 
-    def recognize_multiple_faces(self, image):
-        """Recognize all faces in an image - FIXED VERSION"""
+    def share_gallery(self, prefix):
+        """Publish the gallery to shared memory now and after every change"""
+        self.gallery_publisher = SharedGalleryPublisher(prefix)
+        self.gallery_publisher.publish(self.gallery.snapshot())
+        self.gallery.add_listener(self.gallery_publisher.publish)
+        logging.info(f"Gallery shared as {prefix} ({self.gallery_publisher.stats['last_bytes'] / 1024:.1f} KiB)")
+
+    def become_api_worker(self, index, gallery_prefix):
+        """Reset per-process state in a freshly forked API worker.
+
+        The model is inherited copy-on-write.  SQLite connections and locks
+        are not safe to carry over a fork, so the database pool, log writer,
+        metrics, inference scheduler, governor and locks are recreated and
+        their threads started here.  Retention is left to the primary.  The
+        gallery becomes a read-only view of the primary's shared memory.
+        """
+        self.role = 'worker'
+        self.worker_index = index
+        self.gallery_publisher = None
+        self.db = FaceDatabase(self.db_path)
+        self.log_writer = RecognitionLogWriter(self.db)
+        # Not started: the primary's retention pass covers the shared database
+        self.retention = RetentionEngine(self.db)
+        self.metrics = StageMetrics('face_server')
+        if self.model_loaded:
+            self.inference = InferenceScheduler.from_env(self.model, self.metrics)
+        self.governor = ThermalGovernor.from_env()
+        self.recognition_lock = threading.Lock()
+        self.camera_lock = threading.Lock()
+        self.frame_ready = threading.Condition(self.camera_lock)
+        self.gallery = SharedFaceGallery(
+            SharedGalleryReader(gallery_prefix),
+            backend=self.gallery.backend,
+            top_k=self.gallery.top_k
+        )
+        self.start_background(retention=False)
+
+    def process_info(self):
+        info = {
+            'role': self.role,
+            'pid': os.getpid(),
+            'gallery_version': self.gallery.version
+        }
+        if self.role == 'worker':
+            info['worker_index'] = self.worker_index
+            info['shared_gallery'] = self.gallery.reader.get_stats()
+        elif self.gallery_publisher:
+            info['api_workers'] = {
+                'port': self.api_worker_port,
+                'configured': self.api_workers,
+                'alive': sum(1 for p in api_worker_processes if p.is_alive())
+            }
+            info['shared_gallery'] = self.gallery_publisher.get_stats()
+        return info
+
+    def recognize_multiple_faces(self, image, use_tracking=True, priority=LIVE, now=None):
+        """Recognize faces in an image, nearest first, within the frame time budget.
+
+        With use_tracking, faces are associated with tracks across calls and
+        faces that do not fit in frame_time_budget are deferred: they report
+        their track's last identity (or none yet) with 'deferred' set.  Tracked
+        faces report the track's voted identity ('pending' until it decides);
+        the frame's own match is in frame_name/frame_confidence.  now is the
+        frame's time for tracking and voting (default: wall clock); offline
+        callers pass the video timestamp.
+        """
         start_time = time.time()
+        now = start_time if now is None else now
         
         try:
             if not self.model_loaded:
@@ -281,117 +417,150 @@ class EnhancedFaceRecognitionServer:
                     'processing_time': time.time() - start_time
                 }
             
-            faces = self.model.get(image)
+            stage_times = {}
+            stage_start = time.perf_counter()
+            bboxes, kpss = self.inference.detect(image, priority, self.max_faces_to_detect)
+            stage_times['detection'] = time.perf_counter() - stage_start
+            self.metrics.observe('detection', stage_times['detection'])
             
-            if not faces:
+            if bboxes.shape[0] == 0:
                 return {
                     'recognized': False,
                     'faces': [],
                     'face_count': 0,
                     'message': "No faces detected",
-                    'processing_time': time.time() - start_time
+                    'processing_time': time.time() - start_time,
+                    'stage_times_ms': {'detection': round(stage_times['detection'] * 1000.0, 3)}
                 }
             
             recognized_faces = []
             unknown_count = 0
+            deferred_count = 0
+            candidates = []
+            image_area = float(image.shape[0] * image.shape[1])
             
-            for face in faces:
-                bbox = face.bbox
-                if not isinstance(bbox, np.ndarray):
-                    bbox = np.array(bbox, dtype=np.float32)
-                
+            for index in range(bboxes.shape[0]):
                 try:
-                    x1, y1, x2, y2 = float(bbox[0]), float(bbox[1]), float(bbox[2]), float(bbox[3])
+                    x1, y1, x2, y2 = (float(v) for v in bboxes[index, 0:4])
                     face_area = (x2 - x1) * (y2 - y1)
-                    image_area = float(image.shape[0] * image.shape[1])
                     size_ratio = face_area / image_area if image_area > 0 else 0
                 except (IndexError, ValueError, TypeError) as e:
-                    logging.error(f"Bbox calculation error: {e}, bbox={bbox}")
+                    logging.error(f"Bbox calculation error: {e}, bbox={bboxes[index]}")
                     continue
                 
                 quality_score = min(1.0, size_ratio * 3.0 + 0.3)
-                
-                best_match = None
-                best_confidence = 0.0
-                
-                encoding = face.embedding
-                
-                for name, stored_data in self.face_encodings.items():
-                    confidences = []
-                    
-                    for data in stored_data:
-                        stored_encoding = data['encoding']
-                        
-                        try:
-                            stored_quality = float(data['quality'])
-                        except (TypeError, ValueError):
-                            logging.warning(f"Invalid quality value for {name}: {data['quality']}")
-                            stored_quality = 0.5
-                        
-                        cosine_sim = np.dot(encoding, stored_encoding) / (
-                            np.linalg.norm(encoding) * np.linalg.norm(stored_encoding)
-                        )
-                        
-                        euclidean_dist = np.linalg.norm(encoding - stored_encoding)
-                        euclidean_sim = 1.0 / (1.0 + euclidean_dist * 0.3)
-                        
-                        combined_similarity = (
-                            cosine_sim * 0.6 + 
-                            euclidean_sim * 0.4
-                        )
-                        
-                        quality_factor = min(1.2, (quality_score * 1.1 + stored_quality * 0.9) / 1.5)
-                        final_confidence = combined_similarity * quality_factor
-                        
-                        confidences.append(final_confidence)
-                    
-                    if confidences:
-                        avg_confidence = sum(sorted(confidences, reverse=True)[:3]) / min(3, len(confidences))
-                        
-                        if avg_confidence > best_confidence:
-                            best_confidence = avg_confidence
-                            best_match = name
-                
+                candidates.append((index, [x1, y1, x2, y2], quality_score, face_area))
+            
+            if use_tracking:
+                tracks = self.face_tracker.update([c[1] for c in candidates], now)
+            else:
+                tracks = [None] * len(candidates)
+            
+            order = sorted(
+                range(len(candidates)),
+                key=lambda i: face_priority(candidates[i][1], image.shape, tracks[i], now),
+                reverse=True
+            )
+            if order:
+                nearest = max(order, key=lambda i: candidates[i][3])
+                order.remove(nearest)
+                order.insert(0, nearest)
+            
+            # As many faces as the remaining budget allows, embedded in one call
+            chosen = order if kpss is not None else []
+            if use_tracking and len(chosen) > 1:
+                remaining = self.frame_time_budget - (time.time() - start_time)
+                if remaining != float('inf'):
+                    chosen = order[:max(1, int(remaining / max(self.face_cost_estimate, 1e-3)))]
+            
+            embeddings = {}
+            if chosen:
+                stage_start = time.perf_counter()
+                crops = [self.inference.align(image, kpss[candidates[i][0]]) for i in chosen]
+                embeddings = dict(zip(chosen, self.inference.embed(crops, priority)))
+                stage_times['embedding'] = time.perf_counter() - stage_start
+                face_cost = stage_times['embedding'] / len(chosen)
+                self.metrics.observe('embedding', face_cost)
+                self.face_cost_estimate = 0.8 * self.face_cost_estimate + 0.2 * face_cost
+            
+            processed = [i for i in order if i in embeddings]
+            stage_start = time.perf_counter()
+            matches = dict(zip(processed, self.gallery.match(
+                [embeddings[i] for i in processed],
+                [candidates[i][2] for i in processed]
+            )))
+            stage_times['matching'] = time.perf_counter() - stage_start
+            self.metrics.observe('matching', stage_times['matching'])
+            
+            identity_changes = []
+            pending_count = 0
+            for i in order:
+                _, bbox, quality_score, _ = candidates[i]
+                track = tracks[i]
                 face_result = {
-                    'bbox': [x1, y1, x2, y2],
-                    'quality_score': float(quality_score),
-                    'confidence': float(best_confidence)
+                    'bbox': bbox,
+                    'quality_score': float(quality_score)
                 }
+                if track is not None:
+                    face_result['track_id'] = track.track_id
                 
-                if best_confidence > 0.40:
-                    face_result['recognized'] = True
-                    face_result['name'] = best_match
-                    face_result['confidence_level'] = self.get_confidence_level(best_confidence)
+                if i in matches:
+                    raw_result = self.face_result(bbox, quality_score, matches[i])
+                    face_result['deferred'] = False
+                    if track is None:
+                        face_result.update(raw_result)
+                    else:
+                        previous = track.name
+                        if track.record_identity(raw_result['name'], raw_result['confidence'],
+                                                 quality_score, now):
+                            identity_changes.append({'track_id': track.track_id, 'name': track.name,
+                                                     'previous': previous})
+                        elif track.decided and raw_result['name'] != track.name:
+                            self.recognition_stats['suppressed_flips'] += 1
+                        face_result.update(self.track_identity(track))
+                        face_result['frame_name'] = raw_result['name']
+                        face_result['frame_confidence'] = raw_result['confidence']
                 else:
-                    face_result['recognized'] = False
-                    face_result['name'] = None
-                    unknown_count += 1
+                    face_result['deferred'] = True
+                    deferred_count += 1
+                    if track is not None:
+                        face_result.update(self.track_identity(track))
+                    else:
+                        face_result['recognized'] = False
+                        face_result['name'] = None
+                        face_result['confidence'] = 0.0
                 
+                if face_result.get('pending') and not face_result['deferred']:
+                    pending_count += 1
+                elif not face_result['recognized'] and not face_result['deferred']:
+                    unknown_count += 1
                 recognized_faces.append(face_result)
             
-            recognized_names = [f['name'] for f in recognized_faces if f['recognized']]
+            if deferred_count:
+                self.recognition_stats['deferred_faces'] += deferred_count
+            if identity_changes:
+                self.recognition_stats['identity_changes'] += len(identity_changes)
             
-            if recognized_names:
-                if len(recognized_names) == 1:
-                    template = random.choice(PERSON_DESCRIPTIONS)
-                    message = template.format(name=recognized_names[0])
-                else:
-                    template = random.choice(MULTI_PERSON_TEMPLATES)
-                    names_str = ", ".join(recognized_names[:-1]) + " and " + recognized_names[-1]
-                    message = template.format(count=len(recognized_names), names=names_str)
-                
-                if unknown_count > 0:
-                    message += f" plus {unknown_count} unknown"
+            recognized_names = [f['name'] for f in recognized_faces if f['recognized']]
+            waiting_count = deferred_count + pending_count
+            # The phone speaks whenever the message text changes, so the same
+            # voted scene keeps the same wording instead of a new random template
+            scene = (tuple(sorted(recognized_names)), unknown_count, waiting_count > 0)
+            if use_tracking and scene == self.last_announcement[0]:
+                message = self.last_announcement[1]
+                announce = False
             else:
-                if unknown_count == 1:
-                    message = "I see 1 unknown person"
-                else:
-                    message = f"I see {unknown_count} unknown people"
+                message = self.describe_faces(recognized_names, unknown_count, waiting_count)
+                announce = True
+                if use_tracking:
+                    self.last_announcement = (scene, message)
             
             processing_time = time.time() - start_time
             
             if len(recognized_faces) > 1:
                 self.recognition_stats['multi_face_detections'] += 1
+            if recognized_names:
+                self.recognition_stats['successful_recognitions'] += 1
             
             return {
                 'recognized': len(recognized_names) > 0,
@@ -399,13 +568,19 @@ class EnhancedFaceRecognitionServer:
                 'face_count': len(recognized_faces),
                 'recognized_count': len(recognized_names),
                 'unknown_count': unknown_count,
+                'deferred_count': deferred_count,
+                'pending_count': pending_count,
+                'identity_changes': identity_changes,
+                'announce': announce,
                 'message': message,
                 'processing_time': processing_time,
+                'stage_times_ms': {stage: round(t * 1000.0, 3) for stage, t in stage_times.items()},
                 'method_used': 'multi_face_recognition'
             }
             
         except Exception as e:
             logging.error(f"Multi-face recognition error: {e}")
+            self.recognition_stats['errors'] += 1
             import traceback
             logging.error(traceback.format_exc())
             return {
@@ -415,6 +590,141 @@ class EnhancedFaceRecognitionServer:
                 'message': f"Error: {str(e)}",
                 'processing_time': time.time() - start_time
             }
+        finally:
+            if self.model_loaded:
+                self._record_processing_time(time.time() - start_time)
+
+    def track_identity(self, track):
+        """Voted identity fields of a face result; 'pending' until the track has decided"""
+        identity = {
+            'recognized': track.name is not None,
+            'name': track.name,
+            'confidence': float(track.confidence),
+            'pending': not track.decided,
+            'stable': track.stable
+        }
+        if track.name is not None:
+            identity['confidence_level'] = self.get_confidence_level(track.confidence)
+        return identity
+
+    def describe_faces(self, recognized_names, unknown_count, deferred_count=0):
+        """Spoken summary of a recognition result"""
+        if recognized_names:
+            if len(recognized_names) == 1:
+                template = random.choice(PERSON_DESCRIPTIONS)
+                message = template.format(name=recognized_names[0])
+            else:
+                template = random.choice(MULTI_PERSON_TEMPLATES)
+                names_str = ", ".join(recognized_names[:-1]) + " and " + recognized_names[-1]
+                message = template.format(count=len(recognized_names), names=names_str)
+            
+            if unknown_count > 0:
+                message += f" plus {unknown_count} unknown"
+        elif unknown_count == 0 and deferred_count > 0:
+            message = "Checking who is there"
+        elif unknown_count == 1:
+            message = "I see 1 unknown person"
+        else:
+            message = f"I see {unknown_count} unknown people"
+        return message
+
+    def face_result(self, bbox, quality_score, match):
+        """Per-face result dict for a (name, confidence) gallery match"""
+        best_match, best_confidence = match
+        face_result = {
+            'bbox': bbox,
+            'quality_score': float(quality_score),
+            'confidence': float(best_confidence)
+        }
+        if best_confidence > self.recognition_threshold:
+            face_result['recognized'] = True
+            face_result['name'] = best_match
+            face_result['confidence_level'] = self.get_confidence_level(best_confidence)
+        else:
+            face_result['recognized'] = False
+            face_result['name'] = None
+        return face_result
+
+    def recognize_batch(self, images):
+        """Recognize a list of images: detection per image, then one embedding
+        pass and one gallery match over every face in the batch."""
+        crops = []
+        owners = []
+        detection_times = []
+        for index, image in enumerate(images):
+            stage_start = time.perf_counter()
+            bboxes, kpss = self.inference.detect(image, BATCH, self.max_faces_to_detect)
+            detection_times.append(time.perf_counter() - stage_start)
+            self.metrics.observe('detection', detection_times[-1])
+            if kpss is None:
+                continue
+
+            image_area = float(image.shape[0] * image.shape[1])
+            for i in range(bboxes.shape[0]):
+                x1, y1, x2, y2 = (float(v) for v in bboxes[i, 0:4])
+                size_ratio = (x2 - x1) * (y2 - y1) / image_area if image_area > 0 else 0
+                crops.append(self.inference.align(image, kpss[i]))
+                owners.append((index, [x1, y1, x2, y2], min(1.0, size_ratio * 3.0 + 0.3)))
+
+        stage_start = time.perf_counter()
+        embeddings = self.inference.embed(crops, BATCH)
+        embedding_time = time.perf_counter() - stage_start
+        if crops:
+            self.metrics.observe('embedding_batch', embedding_time)
+
+        stage_start = time.perf_counter()
+        matches = self.gallery.match(embeddings, [owner[2] for owner in owners])
+        matching_time = time.perf_counter() - stage_start
+        self.metrics.observe('matching', matching_time)
+
+        per_image = [[] for _ in images]
+        for (index, bbox, quality_score), match in zip(owners, matches):
+            per_image[index].append(self.face_result(bbox, quality_score, match))
+
+        results = []
+        for index, faces in enumerate(per_image):
+            recognized_names = [f['name'] for f in faces if f['recognized']]
+            unknown_count = len(faces) - len(recognized_names)
+            results.append({
+                'recognized': bool(recognized_names),
+                'faces': faces,
+                'face_count': len(faces),
+                'recognized_count': len(recognized_names),
+                'unknown_count': unknown_count,
+                'message': self.describe_faces(recognized_names, unknown_count) if faces else "No faces detected",
+                'stage_times_ms': {
+                    'detection': round(detection_times[index] * 1000.0, 3),
+                    'embedding_batch': round(embedding_time * 1000.0, 3),
+                    'matching_batch': round(matching_time * 1000.0, 3)
+                }
+            })
+        return results
+
+    def recognize_image_bytes(self, data, max_side=None, preprocess=False):
+        """Decode one uploaded image and recognize it on the calling thread (no tracking)"""
+        stage_start = time.perf_counter()
+        image, image_info = decode_image(data, max_side or self.recognize_max_side)
+        decode_time = time.perf_counter() - stage_start
+        self.metrics.observe('decode', decode_time)
+
+        stage_times = {'decode': round(decode_time * 1000.0, 3)}
+        if preprocess:
+            stage_start = time.perf_counter()
+            image = self.preprocess_camera_frame(image)
+            stage_times['preprocess'] = round((time.perf_counter() - stage_start) * 1000.0, 3)
+
+        result = self.recognize_multiple_faces(image, use_tracking=False, priority=ON_DEMAND)
+        stage_times.update(result.get('stage_times_ms', {}))
+        result['stage_times_ms'] = stage_times
+        result['image_info'] = image_info
+        return result
+
+    def _record_processing_time(self, elapsed):
+        """Fold one recognize call into the stage histogram and running average"""
+        self.metrics.observe('recognize_total', elapsed)
+        stats = self.recognition_stats
+        stats['total_requests'] += 1
+        stats['avg_processing_time'] += (elapsed - stats['avg_processing_time']) / stats['total_requests']
 
     def get_confidence_level(self, confidence):
         """Get confidence level description"""
@@ -438,6 +748,7 @@ class EnhancedFaceRecognitionServer:
         self.stop_processing = False
         self.processing_thread = threading.Thread(
             target=self._continuous_recognition_loop,
+            name='recognition-loop',
             daemon=True
         )
         self.processing_thread.start()
@@ -452,21 +763,48 @@ class EnhancedFaceRecognitionServer:
 
     def _continuous_recognition_loop(self):
         """Background loop for continuous recognition"""
+        last_seq = 0
         while not self.stop_processing and self.camera_active:
             try:
-                frame = self.capture_frame()
-                if frame is not None:
+                seq, frame, frame_time = self.wait_for_frame(last_seq, timeout=1.0)
+                if frame is None:
+                    continue
+                iteration_start = time.time()
+                if last_seq and seq > last_seq + 1:
+                    self.recognition_stats['skipped_frames'] += seq - last_seq - 1
+                last_seq = seq
+
+                # Blurred, badly exposed or moving frames never reach the model
+                with self.metrics.time('quality_gate'):
+                    accepted, reason, _ = self.frame_gate.check(frame)
+                if not accepted:
+                    self.recognition_stats['rejected_frames'] += 1
+                    continue
+
+                with self.metrics.time('preprocess'):
                     processed_frame = self.preprocess_camera_frame(frame)
-                    result = self.recognize_multiple_faces(processed_frame)
-                    
-                    with self.recognition_lock:
-                        self.last_recognition_result = {
-                            'result': result,
-                            'timestamp': time.time(),
-                            'frame': frame
-                        }
+                result = self.recognize_multiple_faces(processed_frame)
+                
+                with self.recognition_lock:
+                    self.last_recognition_result = {
+                        'result': result,
+                        'timestamp': time.time(),
+                        'frame': frame
+                    }
                 
-                time.sleep(0.5) 
+                self.metrics.observe('capture_to_result', time.monotonic() - frame_time)
+                self.log_writer.submit_result(result)
+                self.recognition_rate.observe(result)
+
+                interval = self.recognition_rate.next_interval()
+                if interval is None:
+                    # Nobody is consuming results; idle until a client polls again
+                    while (not self.stop_processing and self.camera_active
+                           and not self.recognition_rate.wait_for_demand(1.0)):
+                        pass
+                    continue
+
+                time.sleep(max(0.0, interval - (time.time() - iteration_start)))
                 
             except Exception as e:
                 logging.error(f"Recognition loop error: {e}")
@@ -489,22 +827,8 @@ class EnhancedFaceRecognitionServer:
                     'photos_processed': 0
                 }
             
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute("SELECT id FROM people WHERE name = ?", (name,))
-            result = cursor.fetchone()
-            
-            if result:
-                person_id = result[0]
-                cursor.execute("DELETE FROM face_encodings WHERE person_id = ?", (person_id,))
-            else:
-                cursor.execute("INSERT INTO people (name, registration_method) VALUES (?, ?)", 
-                            (name, 'enhanced'))
-                person_id = cursor.lastrowid
-            
-            successful_encodings = []
-            quality_scores = []
+            crops = []
+            qualities = []
             
             for i, img_base64 in enumerate(images_base64):
                 try:
@@ -515,37 +839,31 @@ class EnhancedFaceRecognitionServer:
                     if image is None:
                         continue
 
-                    faces = self.model.get(image)
-                    if not faces:
+                    bboxes, kpss = self.inference.detect(image, ENROLLMENT)
+                    if kpss is None or bboxes.shape[0] == 0:
                         continue
                     
-                    face = faces[0]  
-                    encoding = face.embedding
-                    
-                    bbox = face.bbox
-                    if not isinstance(bbox, np.ndarray):
-                        bbox = np.array(bbox, dtype=np.float32)
-                    
-                    x1, y1, x2, y2 = float(bbox[0]), float(bbox[1]), float(bbox[2]), float(bbox[3])
+                    x1, y1, x2, y2 = (float(v) for v in bboxes[0, 0:4])
                     face_area = (x2 - x1) * (y2 - y1)
                     image_area = float(image.shape[0] * image.shape[1])
                     quality = min(1.0, (face_area / image_area) * 3.0 + 0.2)
                     
                     if quality > 0.20:
-                        successful_encodings.append({
-                            'encoding': encoding,
-                            'quality': float(quality),  
-                            'weight': float(quality * 1.2) 
-                        })
-                        quality_scores.append(float(quality))
+                        crops.append(self.inference.align(image, kpss[0]))
+                        qualities.append(float(quality))
                         
                 except Exception as e:
                     logging.error(f"Error processing image {i+1}: {e}")
                     continue
             
+            # One embedding call for all accepted photos
+            successful_encodings = [{
+                'encoding': encoding,
+                'quality': quality,
+                'weight': float(quality * 1.2)
+            } for encoding, quality in zip(self.inference.embed(crops, ENROLLMENT), qualities)]
+            
             if len(successful_encodings) < 2:
-                conn.rollback()
-                conn.close()
                 return {
                     'success': False,
                     'message': f'Need at least 2 good images. Got {len(successful_encodings)}',
@@ -556,27 +874,8 @@ class EnhancedFaceRecognitionServer:
                 successful_encodings.sort(key=lambda x: x['quality'], reverse=True)
                 successful_encodings = successful_encodings[:8]
             
-            for enc_data in successful_encodings:
-                encoding_blob = enc_data['encoding'].tobytes()
-                cursor.execute('''
-                    INSERT INTO face_encodings (person_id, encoding, image_quality, weight)
-                    VALUES (?, ?, ?, ?)
-                ''', (person_id, encoding_blob, float(enc_data['quality']), float(enc_data['weight'])))
-            
-            avg_quality = sum([e['quality'] for e in successful_encodings]) / len(successful_encodings)
-            best_quality = max([e['quality'] for e in successful_encodings])
-            
-            cursor.execute('''
-                UPDATE people SET photo_count = ?, avg_quality = ?, best_quality = ? WHERE id = ?
-            ''', (len(successful_encodings), float(avg_quality), float(best_quality), person_id))
+            avg_quality, best_quality = self.save_person(name, successful_encodings, 'enhanced')
 
-            self.face_encodings[name] = successful_encodings
-            
-            conn.commit()
-            conn.close()
-            
-            self.recognition_cache.clear()
-            
             return {
                 'success': True,
                 'message': f'Successfully registered {name} with {len(successful_encodings)} images',
@@ -586,9 +885,6 @@ class EnhancedFaceRecognitionServer:
             }
                     
         except Exception as e:
-            if 'conn' in locals():
-                conn.rollback()
-                conn.close()
             logging.error(f"Registration error: {e}")
             logging.error(traceback.format_exc())
             return {
@@ -597,6 +893,145 @@ class EnhancedFaceRecognitionServer:
                 'photos_processed': 0
             }
 
+    def save_person(self, name, encodings, registration_method):
+        """Replace a person's stored encodings; returns (avg_quality, best_quality)"""
+        avg_quality = sum([e['quality'] for e in encodings]) / len(encodings)
+        best_quality = max([e['quality'] for e in encodings])
+
+        # Inference runs before the write transaction so the database is
+        # only locked for the few inserts below.
+        with self.db.transaction() as conn:
+            cursor = conn.cursor()
+
+            cursor.execute("SELECT id FROM people WHERE name = ?", (name,))
+            result = cursor.fetchone()
+
+            if result:
+                person_id = result[0]
+                cursor.execute("DELETE FROM face_encodings WHERE person_id = ?", (person_id,))
+            else:
+                cursor.execute("INSERT INTO people (name, registration_method) VALUES (?, ?)",
+                               (name, registration_method))
+                person_id = cursor.lastrowid
+
+            storage_dtype = self.gallery.storage_dtype
+            for enc_data in encodings:
+                encoding_blob, encoding_scale = encode_embedding(enc_data['encoding'], storage_dtype)
+                cursor.execute('''
+                    INSERT INTO face_encodings
+                    (person_id, encoding, image_quality, weight, encoding_dtype, encoding_scale)
+                    VALUES (?, ?, ?, ?, ?, ?)
+                ''', (person_id, encoding_blob, float(enc_data['quality']), float(enc_data['weight']),
+                      storage_dtype, encoding_scale))
+
+            cursor.execute('''
+                UPDATE people SET photo_count = ?, avg_quality = ?, best_quality = ? WHERE id = ?
+            ''', (len(encodings), float(avg_quality), float(best_quality), person_id))
+
+        self.gallery.set_person(name, encodings)
+
+        self.recognition_cache.clear()
+        return avg_quality, best_quality
+
+    def register_from_stream(self, name, seconds=4.0, frames=5, max_candidates=60):
+        """Register a person from the live camera.
+
+        Every new frame for `seconds` is run through the detector only and
+        the dominant face scored on size, sharpness and pose; the best
+        `frames` distinct candidates are then embedded in one batch.
+        """
+        if not self.model_loaded:
+            return {'success': False, 'message': 'Face recognition model not loaded', 'photos_processed': 0}
+        if not self.camera_active:
+            return {'success': False, 'message': 'Camera is not running', 'photos_processed': 0}
+        if not self.enrollment_lock.acquire(blocking=False):
+            return {'success': False, 'message': 'Another stream registration is running', 'photos_processed': 0}
+
+        try:
+            counts = {'frames_seen': 0, 'no_face': 0, 'ambiguous': 0, 'bad_pose': 0}
+            candidates = []
+
+            start = time.monotonic()
+            deadline = start + seconds
+            seq = self.frame_seq
+            while time.monotonic() < deadline:
+                seq, frame, _ = self.wait_for_frame(seq, timeout=min(1.0, max(0.05, deadline - time.monotonic())))
+                if frame is None:
+                    if not self.camera_active:
+                        break
+                    continue
+                counts['frames_seen'] += 1
+
+                with self.metrics.time('enroll_detection'):
+                    bboxes, kpss = self.inference.detect(frame, ENROLLMENT, self.max_faces_to_detect)
+                if kpss is None or len(bboxes) == 0:
+                    counts['no_face'] += 1
+                    continue
+                index = dominant_face(bboxes)
+                if index is None:
+                    counts['ambiguous'] += 1
+                    continue
+
+                crop = self.inference.align(frame, kpss[index])
+                scored = score_face(bboxes[index], kpss[index], crop, det_score=bboxes[index][4])
+                if scored is None:
+                    counts['bad_pose'] += 1
+                    continue
+
+                x1, y1, x2, y2 = (float(v) for v in bboxes[index][:4])
+                image_area = float(frame.shape[0] * frame.shape[1])
+                scored.update({
+                    'time': round(time.monotonic() - start, 3),
+                    'crop': crop,
+                    'quality': min(1.0, (x2 - x1) * (y2 - y1) / image_area * 3.0 + 0.2)
+                })
+                candidates.append(scored)
+                if len(candidates) > max_candidates:
+                    # Keep memory flat on long captures; a single worst frame goes
+                    candidates.remove(min(candidates, key=lambda c: c['score']))
+
+            selected = select_diverse(candidates, frames)
+            if len(selected) < 2:
+                return dict(counts, success=False, candidates=len(candidates), photos_processed=len(selected),
+                            message=f'Need at least 2 good frames. Got {len(selected)}; '
+                                    f'look at the camera and hold still')
+
+            crops = [candidate['crop'] for candidate in selected]
+            with self.metrics.time('enroll_embedding'):
+                embeddings = self.inference.embed(crops, ENROLLMENT)
+
+            # Drops frames where someone else was briefly the dominant face
+            keep = consistent_embeddings(embeddings)
+            encodings = [{
+                'encoding': np.asarray(embeddings[i], dtype=np.float32).flatten(),
+                'quality': float(selected[i]['quality']),
+                'weight': float(selected[i]['quality'] * 1.2)
+            } for i in keep]
+            if len(encodings) < 2:
+                return dict(counts, success=False, candidates=len(candidates), photos_processed=len(encodings),
+                            message='Selected frames do not show the same person; try again alone in view')
+
+            avg_quality, best_quality = self.save_person(name, encodings, 'stream')
+
+            return dict(
+                counts,
+                success=True,
+                message=f'Successfully registered {name} with {len(encodings)} frames',
+                photos_processed=len(encodings),
+                avg_quality=round(float(avg_quality) * 100, 1),
+                best_quality=round(float(best_quality) * 100, 1),
+                candidates=len(candidates),
+                duration=round(time.monotonic() - start, 2),
+                selected=[{key: value for key, value in selected[i].items() if key != 'crop'} for i in keep]
+            )
+
+        except Exception as e:
+            logging.error(f"Stream registration error: {e}")
+            logging.error(traceback.format_exc())
+            return {'success': False, 'message': f'Registration error: {str(e)}', 'photos_processed': 0}
+        finally:
+            self.enrollment_lock.release()
+
     def init_rpi_camera(self):
         """Initialize Raspberry Pi camera with Picamera2"""
         try:
@@ -631,22 +1066,27 @@ class EnhancedFaceRecognitionServer:
         })
 
             self.picamera2.start()
-            time.sleep(2)
 
-            for i in range(5):
+            # capture_array blocks until the next frame, so this returns as
+            # soon as auto exposure has settled instead of after a fixed wait
+            warmup_start = time.time()
+            frames = 0
+            while time.time() - warmup_start < self.rpi_warmup_seconds:
                 frame = self.picamera2.capture_array()
+                frames += 1
                 if frame is not None and frame.size:
                     bgr = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
                     mean_intensity = np.mean(bgr)
-                    gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
-                    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
-                    logging.info(f"Frame {i+1}: intensity={mean_intensity:.1f}, sharpness={sharpness:.1f}")
-                    if 20 < mean_intensity < 230 and sharpness > 5:
-                        self.camera_mode = 'rpi'
-                        self.camera_width, self.camera_height = 1280, 720
-                        logging.info("Raspberry Pi camera initialized successfully.")
-                        return True
-                time.sleep(0.5)
+                    if 20 < mean_intensity < 230:
+                        gray = cv2.cvtColor(bgr, cv2.COLOR_BGR2GRAY)
+                        sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+                        if sharpness > 5:
+                            self.camera_mode = 'rpi'
+                            self.camera_width, self.camera_height = 1280, 720
+                            self.camera_discovery.record_rpi(1280, 720, 60.0)
+                            logging.info(f"Raspberry Pi camera initialized after {frames} frames "
+                                         f"({time.time() - warmup_start:.2f}s)")
+                            return True
 
             self.picamera2.stop()
             self.picamera2.close()
@@ -671,41 +1111,36 @@ class EnhancedFaceRecognitionServer:
         """Initializing Opencv camera as fallback"""
         try:
             logging.info("Initializing USB camera")
-            backends_to_try = [cv2.CAP_V4L2,cv2.CAP_ANY]
-
-            for camera_id in [0,1,2]:
-                logging.info(f"Trying USB camera {camera_id}...")
+            # The probed handle is kept open and used directly
+            camera, profile = self.camera_discovery.open_usb(self.camera_settings)
+            if camera is None:
+                logging.error("No working cameras found")
+                return False
 
-                for backend in backends_to_try:
-                    try:
-                        test_camera = cv2.VideoCapture(camera_id,backend)
-
-                        if test_camera.isOpened():
-                            test_camera.set(cv2.CAP_PROP_FRAME_WIDTH,640)
-                            test_camera.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-                            test_camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)
-                            test_camera.set(cv2.CAP_PROP_FPS, 30)
-
-                            ret, frame = test_camera.read()
-                            test_camera.release()
-
-                            if ret and frame is not None and np.mean(frame) > 15:
-                                self.camera = cv2.VideoCapture(camera_id, backend)
-                                self.configure_camera()
-                                self.camera_mode = 'usb'
-                                logging.info(f"USB camera {camera_id} initialized successfully")
-                                return True
-                        else:
-                            test_camera.release()
-                    except Exception as e:
-                        logging.debug(f"USB camera {camera_id} backend {backend} failed: {e}")
-                        continue
-            logging.error("No working cameras found")
-            return False
+            self.camera = camera
+            self.configure_camera(apply_format=False)
+            self.camera_mode = 'usb'
+            logging.info(f"USB camera {profile['device']} initialized successfully "
+                         f"({self.camera_discovery.stats['last_open_ms']} ms)")
+            return True
         except Exception as e:
             logging.error(f"USB camera initialization error: {e}")
             return False
-        pass
+
+    def init_file_camera(self):
+        """Open the file-backed virtual camera configured by CAMERA_FILE*"""
+        try:
+            if self.camera:
+                self.camera.release()
+            self.camera = FileCamera.from_env()
+            self.camera_mode = 'file'
+            self.fps = self.camera.fps
+            logging.info(f"File camera playing {self.camera.source} at {self.camera.fps:.1f} fps")
+            return True
+        except Exception as e:
+            logging.error(f"File camera initialization error: {e}")
+            self.camera_error = f"File camera failed: {str(e)}"
+            return False
 
     def start_camera(self):
         """ camera initialization with Rpi camera priority"""
@@ -717,38 +1152,42 @@ class EnhancedFaceRecognitionServer:
             
                 self.camera_error = None
 
-                if self.init_rpi_camera():
+                if self.camera_source == 'file':
+                    if not self.init_file_camera():
+                        return False
                     self.camera_active = True
                     self.stop_capture = False
 
                     self.frame_capture_thread = threading.Thread(
-                        target= self._continuous_capture,
+                        target=self._continuous_capture,
+                        name='camera-capture',
                         daemon=True
                     )
                     self.frame_capture_thread.start()
-                    time.sleep(0.5)
-                    
-                    self.start_continuous_recognition() 
-                    logging.info("RPi camera started successfully")
+                    self.start_continuous_recognition()
+                    logging.info("File camera started successfully")
                     return True
-                
-                if self.camera_mode == 'usb' and self.camera and self.camera.isOpened():
-                    if self._validate_camera():
-                        self.camera_active = True
-                        self.stop_capture = False
-                        
-                        self.frame_capture_thread = threading.Thread(
-                            target= self._continuous_capture,
-                            daemon= True
-                        )
 
-                        self.frame_capture_thread.start()
-                        time.sleep(0.5)
+                # A cached USB profile means there is no Pi camera to wait for
+                if self.camera_discovery.cached_kind() == 'usb':
+                    started = self.init_usb_camera()
+                else:
+                    started = self.init_rpi_camera()
 
-                        self.start_continuous_recognition()
+                if started and self.camera_mode in ('rpi', 'usb'):
+                    self.camera_active = True
+                    self.stop_capture = False
 
-                        logging.info("usb camera started successfully as fallback")
-                        return True
+                    self.frame_capture_thread = threading.Thread(
+                        target= self._continuous_capture,
+                        name='camera-capture',
+                        daemon=True
+                    )
+                    self.frame_capture_thread.start()
+                    
+                    self.start_continuous_recognition() 
+                    logging.info(f"{self.camera_mode.upper()} camera started successfully")
+                    return True
                 
                 self.camera_error = "No working cameras found"
                 logging.error(self.camera_error)
@@ -787,6 +1226,7 @@ class EnhancedFaceRecognitionServer:
 
                 self.last_frame = None
                 self.camera_mode = None
+                self.frame_ready.notify_all()
              
                 if self.frame_capture_thread and self.frame_capture_thread.is_alive():
                     self.frame_capture_thread.join(timeout=2.0)
@@ -798,12 +1238,37 @@ class EnhancedFaceRecognitionServer:
             logging.error(f"Error stopping camera: {e}")
             return False
         
+    def _publish_frame(self, frame):
+        """Make frame the latest one and wake everyone waiting for it"""
+        with self.frame_ready:
+            self.last_frame = frame
+            self.frame_seq += 1
+            self.last_frame_time = time.monotonic()
+            self.frame_ready.notify_all()
+
+    def wait_for_frame(self, after_seq=0, timeout=1.0):
+        """Block until a frame newer than after_seq is captured.
+
+        Returns (seq, frame copy, capture time); frame is None on timeout or
+        when the camera stops.
+        """
+        with self.frame_ready:
+            self.frame_ready.wait_for(
+                lambda: self.frame_seq > after_seq or self.stop_capture or not self.camera_active,
+                timeout=timeout
+            )
+            if self.frame_seq <= after_seq or self.last_frame is None:
+                return after_seq, None, None
+            with self.metrics.time('copy'):
+                return self.frame_seq, self.last_frame.copy(), self.last_frame_time
+
     def capture_frame(self):
         """Get the latest captured frame"""
         try:
             with self.camera_lock:
                 if self.last_frame is not None:
-                    return self.last_frame.copy()
+                    with self.metrics.time('copy'):
+                        return self.last_frame.copy()
                 else:
                     logging.warning("No frame available in buffer")
                     return None
@@ -811,20 +1276,29 @@ class EnhancedFaceRecognitionServer:
             logging.error(f"Error capturing frame: {e}")
             return None
 
-    def preprocess_camera_frame(self, frame):
-        """Enhanced frame preprocessing for better recognition quality"""
+    def preprocess_camera_frame(self, frame, profile=None):
+        """Enhanced frame preprocessing for better recognition quality.
+
+        profile (default: the governor's active tier) is 'full' (denoise,
+        contrast and sharpen), 'light' (contrast only) or 'minimal' (resize only).
+        """
         try:
             if frame is None:
                 return None
+            profile = profile or self.governor.tier.preprocess
         
             height, width = frame.shape[:2]
             if width > 1280:
                 scale = 1280 / width
                 new_width = int(width * scale)
                 new_height = int(height * scale)
-                frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_LANCZOS4)
+                interpolation = cv2.INTER_LANCZOS4 if profile == 'full' else cv2.INTER_AREA
+                frame = cv2.resize(frame, (new_width, new_height), interpolation=interpolation)
+            if profile == 'minimal':
+                return frame
         
-            denoised = cv2.bilateralFilter(frame, 9, 75, 75)
+            # The bilateral filter is most of the preprocessing cost
+            denoised = cv2.bilateralFilter(frame, 9, 75, 75) if profile == 'full' else frame
         
             lab = cv2.cvtColor(denoised, cv2.COLOR_BGR2LAB)
             l, a, b = cv2.split(lab)
@@ -832,6 +1306,8 @@ class EnhancedFaceRecognitionServer:
             l = clahe.apply(l)
             enhanced = cv2.merge([l, a, b])
             enhanced = cv2.cvtColor(enhanced, cv2.COLOR_LAB2BGR)
+            if profile != 'full':
+                return enhanced
         
             kernel = np.array([[-1,-1,-1],
                                [-1, 9,-1],
@@ -851,27 +1327,30 @@ class EnhancedFaceRecognitionServer:
             if frame is None:
                 return None
             
-            ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
-            if not ret:
-                logging.error("Failed to encode frame to JPEG")
-                return None
+            with self.metrics.time('jpeg_encode'):
+                ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+                if not ret:
+                    logging.error("Failed to encode frame to JPEG")
+                    return None
             
-            jpg_as_text = base64.b64encode(buffer).decode('utf-8')
+                jpg_as_text = base64.b64encode(buffer).decode('utf-8')
             return jpg_as_text
         
         except Exception as e:
             logging.error(f"Error converting frame to base64: {e}")
             return None
 
-    def configure_camera(self):
+    def configure_camera(self, apply_format=True):
         """Configure camera with validation"""
         try:
             if not self.camera or not self.camera.isOpened():
                 return False  
-            self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.camera_settings['width'])
-            self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.camera_settings['height'])
-            self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)  
-            self.camera.set(cv2.CAP_PROP_FPS, self.camera_settings['fps'])
+            # Changing the format restarts the V4L2 stream; discovery already set it
+            if apply_format:
+                self.camera.set(cv2.CAP_PROP_FRAME_WIDTH, self.camera_settings['width'])
+                self.camera.set(cv2.CAP_PROP_FRAME_HEIGHT, self.camera_settings['height'])
+                self.camera.set(cv2.CAP_PROP_BUFFERSIZE, 1)  
+                self.camera.set(cv2.CAP_PROP_FPS, self.camera_settings['fps'])
 
             optional_settings = [
                 (cv2.CAP_PROP_BRIGHTNESS, self.camera_settings['brightness'] / 100.0),
@@ -894,37 +1373,6 @@ class EnhancedFaceRecognitionServer:
             logging.error(f"Error configuring camera: {e}")
             return False
 
-    def _validate_camera(self):
-        """Validate camera produces good frames"""
-        try:
-            if not self.camera or not self.camera.isOpened():
-                return False
-            
-            valid_frames = 0
-            for i in range(10):
-                ret, frame = self.camera.read()
-
-                if ret and frame is not None and frame.size > 0:
-                    mean_intensity = np.mean(frame)
-                    if mean_intensity > 15 and mean_intensity < 240:
-                        valid_frames += 1
-                        logging.debug(f"Frame {i+1}: valid (mean intensity: {mean_intensity:.1f})")
-                    else:
-                        logging.warning(f"Frame {i+1}: Invalid intensity {mean_intensity:.1f}")
-                else:
-                    logging.warning(f"Frame {i+1}: Failed to capture")
-                
-                time.sleep(0.05)
-
-            success_rate = valid_frames / 10
-            logging.info(f"Camera validation: {valid_frames}/10 valid frames ({success_rate*100:.1f}%)")
-        
-            return success_rate >= 0.6
-        
-        except Exception as e:
-            logging.error(f"Camera validation error: {e}")
-            return False
-
     def _continuous_capture(self):
         """Continuously capture frames in background thread (RPi or USB)"""
         frame_count = 0
@@ -935,17 +1383,18 @@ class EnhancedFaceRecognitionServer:
         logging.info(f"Starting continuous capture thread (mode: {self.camera_mode})")
 
         while not self.stop_capture and error_count < max_errors:
+            iteration_start = time.monotonic()
             try:
                 if self.camera_mode == 'rpi' and self.picamera2:
                     try:
-                        frame_rgb = self.picamera2.capture_array()
+                        with self.metrics.time('capture'):
+                            frame_rgb = self.picamera2.capture_array()
                         if frame_rgb is not None and frame_rgb.size > 0:
                             frame_bgr = cv2.cvtColor(frame_rgb, cv2.COLOR_RGB2BGR)  
                             mean_intensity = np.mean(frame_bgr)
 
                             if 15 < mean_intensity < 240:
-                                with self.camera_lock:
-                                    self.last_frame = frame_bgr.copy()
+                                self._publish_frame(frame_bgr)
                                 frame_count += 1
                                 error_count = 0
                                 last_good_frame_time = time.time()
@@ -962,14 +1411,14 @@ class EnhancedFaceRecognitionServer:
                         error_count += 1
                         logging.error(f"Error capturing frame: {e}")
                         continue
-                elif self.camera_mode == 'usb' and self.camera and self.camera.isOpened():
-                    ret, frame = self.camera.read()
+                elif self.camera_mode in ('usb', 'file') and self.camera and self.camera.isOpened():
+                    with self.metrics.time('capture'):
+                        ret, frame = self.camera.read()
                     if ret and frame is not None and frame.size > 0:
                         mean_intensity = np.mean(frame)
                     
                         if 15 < mean_intensity < 240:
-                            with self.camera_lock:
-                                self.last_frame = frame.copy()
+                            self._publish_frame(frame)
                             frame_count += 1
                             error_count = 0
                             last_good_frame_time = time.time()
@@ -992,10 +1441,16 @@ class EnhancedFaceRecognitionServer:
                     self._restart_camera_internal()
                     last_good_frame_time = time.time()
 
+                # The blocking read paces the loop; only back off on errors
                 if error_count > 5:
                     time.sleep(0.1)
-                else:
-                    time.sleep(1.0 / self.camera_settings['fps'])
+                
+                # Hot or low on battery: capture below the camera's own rate
+                capture_fps = self.governor.tier.capture_fps
+                if capture_fps:
+                    delay = 1.0 / capture_fps - (time.monotonic() - iteration_start)
+                    if delay > 0 and not self.stop_capture:
+                        time.sleep(delay)
                 
             except Exception as e:
                 error_count += 1
@@ -1006,31 +1461,36 @@ class EnhancedFaceRecognitionServer:
             logging.error("Max frame capture errors reached, stopping camera")
             self.camera_error = "Camera capture failed"
             self.camera_active = False
+            with self.frame_ready:
+                self.frame_ready.notify_all()
         
     def _restart_camera_internal(self):
         """Internal camera restart without external locking"""
         try:
+            if self.camera_mode == 'file':
+                return self.init_file_camera()
+
+            if self.camera_mode == 'rpi' and self.picamera2:
+                self.picamera2.stop()
+                self.picamera2.start()
+                frame = self.picamera2.capture_array()
+                if frame is not None and frame_is_usable(frame):
+                    logging.info("RPi camera restarted successfully")
+                    return True
+                logging.error("RPi camera restart did not deliver a usable frame")
+                return False
+
             if self.camera:
                 self.camera.release()
-                time.sleep(0.5)
+                self.camera = None
 
-            backends_to_try = [cv2.CAP_DSHOW, cv2.CAP_MSMF, cv2.CAP_V4L2, cv2.CAP_ANY]
-
-            for camera_id in [0, 1, 2]:
-                for backend in backends_to_try:
-                    try:
-                        test_camera = cv2.VideoCapture(camera_id, backend)
-                        if test_camera.isOpened():
-                            ret, frame = test_camera.read()
-                            test_camera.release()
-                        
-                            if ret and frame is not None and np.mean(frame) > 15:
-                                self.camera = cv2.VideoCapture(camera_id, backend)
-                                self.configure_camera()
-                                logging.info("Camera restarted successfully")
-                                return True
-                    except:
-                        continue
+            # Straight to the cached device; a full probe only if it is gone
+            camera, profile = self.camera_discovery.open_usb(self.camera_settings)
+            if camera is not None:
+                self.camera = camera
+                self.configure_camera(apply_format=False)
+                logging.info(f"Camera restarted successfully in {self.camera_discovery.stats['last_open_ms']} ms")
+                return True
         
             logging.error("Failed to restart camera")
             return False
@@ -1041,6 +1501,13 @@ class EnhancedFaceRecognitionServer:
 
 face_server = EnhancedFaceRecognitionServer()
 connected_clients = {}
+api_worker_processes = []
+
+def note_client_demand(client_id=None):
+    """Mark that results were requested so the recognition loop keeps running"""
+    if client_id in connected_clients:
+        connected_clients[client_id]['last_request'] = time.time()
+    face_server.recognition_rate.note_demand()
 
 @app.route('/')
 def web_interface():
@@ -1060,25 +1527,22 @@ def delete_person():
         if not name:
             return jsonify({'error': 'Name required'}), 400
         
-        conn = sqlite3.connect(face_server.db_path)
-        cursor = conn.cursor()
+        with face_server.db.transaction() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("SELECT id FROM people WHERE name = ?", (name,))
-        result = cursor.fetchone()
+            cursor.execute("SELECT id FROM people WHERE name = ?", (name,))
+            result = cursor.fetchone()
         
-        if not result:
-            return jsonify({'error': 'Person not found'}), 404
+            if not result:
+                return jsonify({'error': 'Person not found'}), 404
         
-        person_id = result[0]
+            person_id = result[0]
 
-        cursor.execute("DELETE FROM face_encodings WHERE person_id = ?", (person_id,))
-        cursor.execute("DELETE FROM people WHERE id = ?", (person_id,))
+            cursor.execute("DELETE FROM face_encodings WHERE person_id = ?", (person_id,))
+            cursor.execute("DELETE FROM people WHERE id = ?", (person_id,))
         
-        conn.commit()
-        conn.close()
 
-        if name in face_server.face_encodings:
-            del face_server.face_encodings[name]
+        face_server.gallery.remove_person(name)
         
         face_server.recognition_cache.clear()
         
@@ -1142,6 +1606,7 @@ def stop_camera():
 def get_camera_frame_add_friend():
     """Get camera frame for add friend"""
     try:
+        note_client_demand(request.args.get('client_id'))
         if not face_server.camera_active:
             return jsonify({
                 'success': False, 
@@ -1168,13 +1633,15 @@ def get_camera_frame_add_friend():
                 'error': 'Failed to encode frame'
             }), 500
         
-        return jsonify({
-            'success': True,
-            'frame_data': {
-                'image': frame_base64,
-                'timestamp': time.time()
-            }
-        })
+        with face_server.metrics.time('http_serialize'):
+            response = jsonify({
+                'success': True,
+                'frame_data': {
+                    'image': frame_base64,
+                    'timestamp': time.time()
+                }
+            })
+        return response
         
     except Exception as e:
         logging.error(f"Java frame endpoint error: {e}")
@@ -1190,6 +1657,7 @@ def connect_client():
         
         if client_id in connected_clients:
             logging.info(f"Client {client_id} already connected")
+            note_client_demand(client_id)
             return jsonify({
                 'success': True,
                 'message': f'Client {client_id} already connected',
@@ -1205,6 +1673,7 @@ def connect_client():
             'connected_at': time.time(),
             'last_request': time.time()
         }
+        note_client_demand(client_id)
         
         if not face_server.camera_active:
             success = face_server.start_camera()
@@ -1266,6 +1735,8 @@ def camera_health():
             'camera_mode': face_server.camera_mode or 'unknown',
             'resolution': f"{face_server.camera_width}x{face_server.camera_height}",
             'fps': face_server.fps,
+            'capture_fps_limit': face_server.governor.tier.capture_fps,
+            'performance_tier': face_server.governor.tier.name,
             'active_clients': len(connected_clients)
         })
     except Exception as e:
@@ -1295,6 +1766,7 @@ def test_endpoint():
 def get_camera_frame():
     """Get current frame with recognition results - OPTIMIZED"""
     try:
+        note_client_demand(request.args.get('client_id'))
         if not face_server.camera_active:
             return jsonify({
                 'error': 'Camera not active',
@@ -1318,19 +1790,21 @@ def get_camera_frame():
         
         frame_base64 = face_server.frame_to_base64(frame)
         
-        return jsonify({
-            'success': True,
-            'image': frame_base64,
-            'recognized': result.get('recognized', False),
-            'faces': result.get('faces', []),
-            'face_count': result.get('face_count', 0),
-            'recognized_count': result.get('recognized_count', 0),
-            'unknown_count': result.get('unknown_count', 0),
-            'message': result.get('message', 'Processing...'),
-            'processing_time': result.get('processing_time', 0),
-            'method_used': result.get('method_used', 'multi_face'),
-            'timestamp': datetime.now().isoformat()
-        })
+        with face_server.metrics.time('http_serialize'):
+            response = jsonify({
+                'success': True,
+                'image': frame_base64,
+                'recognized': result.get('recognized', False),
+                'faces': result.get('faces', []),
+                'face_count': result.get('face_count', 0),
+                'recognized_count': result.get('recognized_count', 0),
+                'unknown_count': result.get('unknown_count', 0),
+                'message': result.get('message', 'Processing...'),
+                'processing_time': result.get('processing_time', 0),
+                'method_used': result.get('method_used', 'multi_face'),
+                'timestamp': datetime.now().isoformat()
+            })
+        return response
         
     except Exception as e:
         logging.error(f"Frame endpoint error: {e}")
@@ -1342,6 +1816,210 @@ def get_camera_frame():
         }), 500
 
 
+def read_uploaded_image():
+    """Image bytes from a multipart 'image' file, a JSON base64 'image' or the raw body"""
+    upload = request.files.get('image')
+    if upload:
+        return upload.read()
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+        if not data.get('image'):
+            raise ValueError('No image provided')
+        return decode_base64(data['image'])
+    body = request.get_data()
+    if not body:
+        raise ValueError('No image provided')
+    return body
+
+def request_option(name, default=None):
+    """Option from the query string, or the JSON body when there is one"""
+    if name in request.args:
+        return request.args.get(name)
+    if request.is_json:
+        return (request.get_json(silent=True) or {}).get(name, default)
+    return request.form.get(name, default)
+
+@app.route('/api/recognize', methods=['POST'])
+def recognize_image():
+    """Recognize faces in one uploaded image (binary, multipart or base64 JSON)"""
+    request_start = time.perf_counter()
+    try:
+        if not face_server.model_loaded:
+            return jsonify({'error': 'Face recognition model not loaded', 'recognized': False}), 503
+
+        try:
+            max_side = int(request_option('max_side', face_server.recognize_max_side))
+            if not 32 <= max_side <= 8192:
+                raise ValueError
+        except (TypeError, ValueError):
+            return jsonify({'error': 'max_side must be an integer between 32 and 8192'}), 400
+        preprocess = str(request_option('preprocess', 'false')).lower() in ('1', 'true', 'yes')
+
+        try:
+            data = read_uploaded_image()
+            result = face_server.recognize_image_bytes(data, max_side, preprocess)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'recognized': False}), 400
+
+        face_server.log_writer.submit_result(result, source='api')
+
+        faces = result.get('faces', [])
+        primary = next((f for f in faces if f.get('recognized')), faces[0] if faces else None)
+        response = {
+            'success': True,
+            'recognized': result.get('recognized', False),
+            'name': primary.get('name') if primary and primary.get('recognized') else None,
+            'confidence': primary.get('confidence', 0.0) if primary else 0.0,
+            'message': result.get('message', ''),
+            'faces': faces,
+            'face_count': result.get('face_count', 0),
+            'recognized_count': result.get('recognized_count', 0),
+            'unknown_count': result.get('unknown_count', 0),
+            'processing_time': result.get('processing_time', 0),
+            'stage_times_ms': result.get('stage_times_ms', {}),
+            'image_info': result.get('image_info'),
+            'timestamp': datetime.now().isoformat()
+        }
+        response['stage_times_ms']['total'] = round((time.perf_counter() - request_start) * 1000.0, 3)
+
+        with face_server.metrics.time('http_serialize'):
+            payload = jsonify(response)
+        return payload
+
+    except Exception as e:
+        logging.error(f"Recognize endpoint error: {e}")
+        return jsonify({'error': str(e), 'recognized': False}), 500
+
+IMAGE_SUFFIXES = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+def read_zip_images(data, max_images, max_bytes):
+    """[(filename, bytes)] of the images in a zip archive, enforcing the batch limits"""
+    try:
+        archive = zipfile.ZipFile(io.BytesIO(data))
+    except zipfile.BadZipFile:
+        raise ValueError('Invalid zip archive')
+
+    with archive:
+        members = [m for m in archive.infolist()
+                   if not m.is_dir() and m.filename.lower().endswith(IMAGE_SUFFIXES)
+                   and not os.path.basename(m.filename).startswith('.')]
+        if len(members) > max_images:
+            raise OverflowError(f'Too many images (limit {max_images})')
+        if sum(m.file_size for m in members) > max_bytes:
+            raise OverflowError(f'Uncompressed images exceed {max_bytes // (1024 * 1024)} MB')
+        return [(m.filename, archive.read(m)) for m in members]
+
+def read_batch_uploads(max_images, max_bytes):
+    """[(filename, bytes)] from multipart files (zips are expanded) or a raw zip body"""
+    items = []
+    uploads = request.files.getlist('images') or list(request.files.values())
+    if uploads:
+        for upload in uploads:
+            data = upload.read()
+            if (upload.filename or '').lower().endswith('.zip') or upload.mimetype == 'application/zip':
+                items.extend(read_zip_images(data, max_images, max_bytes))
+            else:
+                items.append((upload.filename or f'image_{len(items)}', data))
+    elif request.content_type in ('application/zip', 'application/x-zip-compressed'):
+        items = read_zip_images(request.get_data(), max_images, max_bytes)
+    else:
+        raise ValueError('Send images as multipart files or a zip archive')
+
+    if not items:
+        raise ValueError('No images found in request')
+    if len(items) > max_images:
+        raise OverflowError(f'Too many images (limit {max_images})')
+    return items
+
+@app.route('/api/recognize_batch', methods=['POST'])
+def recognize_batch():
+    """Recognize many images per request, streaming one NDJSON line per image"""
+    try:
+        if not face_server.model_loaded:
+            return jsonify({'error': 'Face recognition model not loaded'}), 503
+
+        if request.content_length and request.content_length > face_server.batch_max_bytes:
+            return jsonify({'error': f'Request exceeds {face_server.batch_max_bytes // (1024 * 1024)} MB'}), 413
+
+        try:
+            max_side = int(request_option('max_side', face_server.recognize_max_side))
+            concurrency = max(1, min(int(request_option('concurrency', face_server.batch_concurrency)),
+                                     face_server.batch_concurrency))
+            batch_size = max(1, min(int(request_option('batch_size', face_server.batch_size)), 64))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'max_side, concurrency and batch_size must be integers'}), 400
+
+        try:
+            items = read_batch_uploads(face_server.batch_max_images, face_server.batch_max_bytes)
+        except OverflowError as e:
+            return jsonify({'error': str(e)}), 413
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+    except Exception as e:
+        logging.error(f"Batch recognition request error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    def decode(item):
+        filename, data = item
+        stage_start = time.perf_counter()
+        try:
+            image, info = decode_image(data, max_side)
+        except ValueError as e:
+            return filename, None, {'error': str(e)}, 0.0
+        return filename, image, info, time.perf_counter() - stage_start
+
+    def generate():
+        batch_start = time.perf_counter()
+        totals = {'images': len(items), 'faces': 0, 'recognized': 0, 'errors': 0}
+        chunks = [items[i:i + batch_size] for i in range(0, len(items), batch_size)]
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='batch-decode') as pool:
+            # Decode the next chunk while the current one is on the model
+            pending = [pool.submit(decode, item) for item in chunks[0]]
+            offset = 0
+            for chunk_index in range(len(chunks)):
+                decoded = [future.result() for future in pending]
+                if chunk_index + 1 < len(chunks):
+                    pending = [pool.submit(decode, item) for item in chunks[chunk_index + 1]]
+
+                valid = [d for d in decoded if d[1] is not None]
+                try:
+                    results = face_server.recognize_batch([d[1] for d in valid]) if valid else []
+                except Exception as e:
+                    logging.error(f"Batch recognition error: {e}")
+                    results = [{'error': str(e)} for _ in valid]
+                result_iter = iter(results)
+
+                for position, (filename, image, info, decode_time) in enumerate(decoded):
+                    line = {'index': offset + position, 'filename': filename}
+                    if image is None:
+                        line.update(info)
+                        totals['errors'] += 1
+                    else:
+                        result = next(result_iter)
+                        if 'stage_times_ms' in result:
+                            result['stage_times_ms']['decode'] = round(decode_time * 1000.0, 3)
+                        line.update(result)
+                        line['image_info'] = info
+                        totals['faces'] += result.get('face_count', 0)
+                        totals['recognized'] += result.get('recognized_count', 0)
+                        totals['errors'] += 1 if 'error' in result else 0
+                    yield json.dumps(line) + '\n'
+                offset += len(decoded)
+
+        elapsed = time.perf_counter() - batch_start
+        totals.update({
+            'done': True,
+            'seconds': round(elapsed, 3),
+            'images_per_second': round(len(items) / elapsed, 3) if elapsed > 0 else 0.0
+        })
+        face_server.metrics.observe('batch_request', elapsed)
+        yield json.dumps(totals) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/register', methods=['POST'])
 @app.route('/api/register_enhanced', methods=['POST'])
 def register_person_enhanced():
     """Registration endpoint"""
@@ -1365,54 +2043,71 @@ def register_person_enhanced():
         logging.error(f"Registration error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/register_from_stream', methods=['POST'])
+def register_from_stream():
+    """Register a person from a few seconds of the live camera"""
+    try:
+        data = request.json or {}
+        name = str(data.get('name', '')).strip()
+        if not name:
+            return jsonify({'error': 'Name required'}), 400
+
+        seconds = min(15.0, max(1.0, float(data.get('seconds', 4.0))))
+        frames = min(8, max(2, int(data.get('frames', 5))))
+
+        if not face_server.camera_active:
+            return jsonify({'error': 'Camera is not running; start it with /api/camera/start'}), 409
+
+        result = face_server.register_from_stream(name, seconds, frames)
+
+        return jsonify(result), 200 if result['success'] else 400
+
+    except Exception as e:
+        logging.error(f"Stream registration error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/analytics_enhanced', methods=['GET'])
 def analytics_enhanced():
     """Enhanced analytics endpoint"""
     try:
-        conn = sqlite3.connect(face_server.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT method_used, COUNT(*) as count
-            FROM recognition_logs
-            GROUP BY method_used
-        ''')
-        method_usage = dict(cursor.fetchall())
-        
-        cursor.execute('''
-            SELECT person_name, confidence, 
-                   CASE 
-                       WHEN confidence >= 0.85 THEN 'very_high'
-                       WHEN confidence >= 0.70 THEN 'high'
-                       WHEN confidence >= 0.50 THEN 'medium'
-                       WHEN confidence >= 0.35 THEN 'low'
-                       ELSE 'very_low'
-                   END as confidence_level,
-                   COUNT(*) as recognition_count
-            FROM recognition_logs
-            WHERE timestamp >= datetime('now', '-7 days')
-            GROUP BY person_name, confidence_level
-            ORDER BY timestamp DESC
-        ''')
-        recent_recognitions = []
-        for row in cursor.fetchall():
-            recent_recognitions.append({
-                'person_name': row[0],
-                'confidence': row[1],
-                'confidence_level': row[2],
-                'recognition_count': row[3]
-            })
+        with face_server.db.connection() as conn:
+            cursor = conn.cursor()
         
-        # Get hourly distribution
-        cursor.execute('''
-            SELECT CAST(strftime('%H', timestamp) AS INTEGER) as hour, COUNT(*) as count
-            FROM recognition_logs
-            WHERE timestamp >= datetime('now', '-1 day')
-            GROUP BY hour
-        ''')
-        hourly_distribution = dict(cursor.fetchall())
+            cursor.execute('''
+                SELECT method_used, SUM(count) as count
+                FROM recognition_rollup_person_daily
+                GROUP BY method_used
+            ''')
+            method_usage = dict(cursor.fetchall())
+        
+            level_sums = ', '.join(f"SUM({level})" for level in LEVEL_COLUMNS)
+            cursor.execute(f'''
+                SELECT person_name, SUM(confidence_sum) / SUM(count) as avg_confidence, {level_sums}
+                FROM recognition_rollup_person_daily
+                WHERE day >= ?
+                GROUP BY person_name
+                ORDER BY MAX(day) DESC
+            ''', (since(timedelta(days=7))[:10],))
+            recent_recognitions = []
+            for row in cursor.fetchall():
+                for level, count in zip(LEVEL_COLUMNS, row[2:]):
+                    if count:
+                        recent_recognitions.append({
+                            'person_name': row[0],
+                            'confidence': float(row[1]) if row[1] is not None else 0.0,
+                            'confidence_level': level,
+                            'recognition_count': count
+                        })
+        
+            # Get hourly distribution
+            cursor.execute('''
+                SELECT CAST(substr(hour, 12, 2) AS INTEGER) as hour_of_day, SUM(count) as count
+                FROM recognition_rollup_hourly
+                WHERE hour >= ?
+                GROUP BY hour_of_day
+            ''', (since(timedelta(days=1))[:13],))
+            hourly_distribution = dict(cursor.fetchall())
         
-        conn.close()
         
         return jsonify({
             'recognition_stats': face_server.recognition_stats,
@@ -1430,92 +2125,81 @@ def daily_report():
     """Daily report endpoint"""
     try:
         date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+        try:
+            # The rollups are keyed by the day string itself
+            datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'error': f"Invalid date '{date}', expected YYYY-MM-DD"}), 400
         
-        conn = sqlite3.connect(face_server.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                COUNT(*) as total_recognitions,
-                COUNT(DISTINCT person_name) as unique_people,
-                AVG(confidence) as avg_confidence,
-                AVG(quality_score) as avg_quality
-            FROM recognition_logs
-            WHERE DATE(timestamp) = ?
-        ''', (date,))
-        
-        row = cursor.fetchone()
-        summary = {
-            'total_recognitions': row[0] or 0,
-            'unique_people': row[1] or 0,
-            'avg_confidence': float(row[2]) if row[2] else 0.0,
-            'avg_quality': float(row[3]) if row[3] else 0.0
-        }
+        with face_server.db.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT 
-                person_name,
-                COUNT(*) as recognition_count,
-                AVG(confidence) as avg_confidence,
-                AVG(quality_score) as avg_quality,
-                method_used as most_used_method,
-                CASE 
-                    WHEN AVG(confidence) >= 0.85 THEN 'very_high'
-                    WHEN AVG(confidence) >= 0.70 THEN 'high'
-                    WHEN AVG(confidence) >= 0.50 THEN 'medium'
-                    WHEN AVG(confidence) >= 0.35 THEN 'low'
-                    ELSE 'very_low'
-                END as confidence_level
-            FROM recognition_logs
-            WHERE DATE(timestamp) = ?
-            GROUP BY person_name
-            ORDER BY recognition_count DESC
-        ''', (date,))
-        
-        people_analysis = []
-        for row in cursor.fetchall():
-            people_analysis.append({
-                'name': row[0],
-                'recognition_count': row[1],
-                'avg_confidence': float(row[2]),
-                'avg_quality': float(row[3]),
-                'most_used_method': row[4],
-                'confidence_level': row[5]
-            })
+            level_columns = ', '.join(LEVEL_COLUMNS)
+            cursor.execute(f'''
+                SELECT count, confidence_sum, quality_sum, {level_columns}
+                FROM recognition_rollup_daily
+                WHERE day = ?
+            ''', (date,))
+            day_row = cursor.fetchone()
+        
+            cursor.execute('''
+                SELECT person_name, method_used, count, confidence_sum, quality_sum
+                FROM recognition_rollup_person_daily
+                WHERE day = ?
+            ''', (date,))
+            person_rows = cursor.fetchall()
+        
+            total = day_row[0] if day_row else 0
+            summary = {
+                'total_recognitions': total,
+                'unique_people': len({row[0] for row in person_rows}),
+                'avg_confidence': float(day_row[1]) / total if total else 0.0,
+                'avg_quality': float(day_row[2]) / total if total else 0.0
+            }
         
-        cursor.execute('''
-            SELECT 
-                CASE 
-                    WHEN confidence >= 0.85 THEN 'very_high'
-                    WHEN confidence >= 0.70 THEN 'high'
-                    WHEN confidence >= 0.50 THEN 'medium'
-                    WHEN confidence >= 0.35 THEN 'low'
-                    ELSE 'very_low'
-                END as level,
-                COUNT(*) as count
-            FROM recognition_logs
-            WHERE DATE(timestamp) = ?
-            GROUP BY level
-        ''', (date,))
-        
-        confidence_distribution = dict(cursor.fetchall())
-        
-        insights = []
-        if summary['total_recognitions'] > 0:
-            if summary['avg_confidence'] > 0.8:
-                insights.append("✓ Excellent average confidence scores today")
-            elif summary['avg_confidence'] < 0.5:
-                insights.append("⚠ Low average confidence - consider improving lighting or re-registering people")
+            people = {}
+            for person_name, method_used, count, confidence_sum, quality_sum in person_rows:
+                person = people.setdefault(person_name, {
+                    'count': 0, 'confidence_sum': 0.0, 'quality_sum': 0.0, 'methods': {}
+                })
+                person['count'] += count
+                person['confidence_sum'] += confidence_sum
+                person['quality_sum'] += quality_sum
+                person['methods'][method_used] = person['methods'].get(method_used, 0) + count
+        
+            people_analysis = []
+            for name, person in sorted(people.items(), key=lambda item: item[1]['count'], reverse=True):
+                avg_confidence = person['confidence_sum'] / person['count']
+                people_analysis.append({
+                    'name': name,
+                    'recognition_count': person['count'],
+                    'avg_confidence': float(avg_confidence),
+                    'avg_quality': float(person['quality_sum'] / person['count']),
+                    'most_used_method': max(person['methods'], key=person['methods'].get),
+                    'confidence_level': confidence_level(avg_confidence)
+                })
+        
+            confidence_distribution = {}
+            if day_row:
+                confidence_distribution = {
+                    level: count for level, count in zip(LEVEL_COLUMNS, day_row[3:]) if count
+                }
+        
+            insights = []
+            if summary['total_recognitions'] > 0:
+                if summary['avg_confidence'] > 0.8:
+                    insights.append("✓ Excellent average confidence scores today")
+                elif summary['avg_confidence'] < 0.5:
+                    insights.append("⚠ Low average confidence - consider improving lighting or re-registering people")
             
-            if summary['avg_quality'] > 0.7:
-                insights.append("✓ High quality images captured")
-            elif summary['avg_quality'] < 0.4:
-                insights.append("⚠ Poor image quality detected - check camera settings")
+                if summary['avg_quality'] > 0.7:
+                    insights.append("✓ High quality images captured")
+                elif summary['avg_quality'] < 0.4:
+                    insights.append("⚠ Poor image quality detected - check camera settings")
             
-            if summary['unique_people'] > 5:
-                insights.append(f"✓ Recognized {summary['unique_people']} different people today")
+                if summary['unique_people'] > 5:
+                    insights.append(f"✓ Recognized {summary['unique_people']} different people today")
         
-        conn.close()
         
         return jsonify({
             'date': date,
@@ -1534,34 +2218,37 @@ def recognition_logs():
     """Recognition logs endpoint"""
     try:
         date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+        try:
+            day_start, day_end = day_range(date)
+        except ValueError:
+            return jsonify({'error': f"Invalid date '{date}', expected YYYY-MM-DD"}), 400
         
-        conn = sqlite3.connect(face_server.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT person_name, confidence, quality_score, processing_time, 
-                   method_used, timestamp
-            FROM recognition_logs
-            WHERE DATE(timestamp) = ?
-            ORDER BY timestamp DESC
-            LIMIT 100
-        ''', (date,))
-        
-        logs = []
-        for row in cursor.fetchall():
-            logs.append({
-                'person_name': row[0],
-                'confidence': float(row[1]),
-                'quality_score': float(row[2]),
-                'processing_time': float(row[3]),
-                'method_used': row[4],
-                'timestamp': row[5]
-            })
+        with face_server.db.connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute('''
+                SELECT person_name, confidence, quality_score, processing_time, 
+                       method_used, timestamp
+                FROM recognition_logs
+                WHERE timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp DESC
+                LIMIT 100
+            ''', (day_start, day_end))
+        
+            logs = []
+            for row in cursor.fetchall():
+                logs.append({
+                    'person_name': row[0],
+                    'confidence': float(row[1]),
+                    'quality_score': float(row[2]),
+                    'processing_time': float(row[3]),
+                    'method_used': row[4],
+                    'timestamp': row[5]
+                })
         
-        avg_confidence = sum([l['confidence'] for l in logs]) / len(logs) if logs else 0
-        avg_quality = sum([l['quality_score'] for l in logs]) / len(logs) if logs else 0
+            avg_confidence = sum([l['confidence'] for l in logs]) / len(logs) if logs else 0
+            avg_quality = sum([l['quality_score'] for l in logs]) / len(logs) if logs else 0
         
-        conn.close()
         
         return jsonify({
             'logs': logs,
@@ -1579,34 +2266,38 @@ def historical_data():
     """Historical performance data endpoint"""
     try:
         date = request.args.get('date', datetime.now().strftime('%Y-%m-%d'))
+        try:
+            range_start, _ = day_range(date, days=31, offset_days=-30)
+        except ValueError:
+            return jsonify({'error': f"Invalid date '{date}', expected YYYY-MM-DD"}), 400
         
-        conn = sqlite3.connect(face_server.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT 
-                DATE(timestamp) as date,
-                COUNT(*) as total_recognitions,
-                COUNT(DISTINCT person_name) as unique_people,
-                AVG(confidence) as avg_confidence,
-                AVG(quality_score) as avg_quality
-            FROM recognition_logs
-            WHERE DATE(timestamp) <= ? AND DATE(timestamp) >= DATE(?, '-30 days')
-            GROUP BY DATE(timestamp)
-            ORDER BY date DESC
-        ''', (date, date))
-        
-        days = []
-        for row in cursor.fetchall():
-            days.append({
-                'date': row[0],
-                'total_recognitions': row[1],
-                'unique_people': row[2],
-                'avg_confidence': float(row[3]) if row[3] else 0.0,
-                'avg_quality': float(row[4]) if row[4] else 0.0
-            })
+        with face_server.db.connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute('''
+                SELECT 
+                    d.day as date,
+                    d.count as total_recognitions,
+                    (SELECT COUNT(DISTINCT p.person_name)
+                     FROM recognition_rollup_person_daily p
+                     WHERE p.day = d.day) as unique_people,
+                    d.confidence_sum / d.count as avg_confidence,
+                    d.quality_sum / d.count as avg_quality
+                FROM recognition_rollup_daily d
+                WHERE d.day >= ? AND d.day <= ? AND d.count > 0
+                ORDER BY d.day DESC
+            ''', (range_start[:10], date))
+        
+            days = []
+            for row in cursor.fetchall():
+                days.append({
+                    'date': row[0],
+                    'total_recognitions': row[1],
+                    'unique_people': row[2],
+                    'avg_confidence': float(row[3]) if row[3] else 0.0,
+                    'avg_quality': float(row[4]) if row[4] else 0.0
+                })
         
-        conn.close()
         
         return jsonify({'days': days})
         
@@ -1619,31 +2310,30 @@ def historical_data():
 def analyze_person(name):
     """Analyze a specific person's registration quality"""
     try:
-        conn = sqlite3.connect(face_server.db_path)
-        cursor = conn.cursor()
+        with face_server.db.connection() as conn:
+            cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT p.id, p.photo_count, p.avg_quality, p.best_quality
-            FROM people p
-            WHERE p.name = ?
-        ''', (name,))
+            cursor.execute('''
+                SELECT p.id, p.photo_count, p.avg_quality, p.best_quality
+                FROM people p
+                WHERE p.name = ?
+            ''', (name,))
         
-        result = cursor.fetchone()
-        if not result:
-            return jsonify({'error': 'Person not found'}), 404
+            result = cursor.fetchone()
+            if not result:
+                return jsonify({'error': 'Person not found'}), 404
         
-        person_id, photo_count, avg_quality, best_quality = result
+            person_id, photo_count, avg_quality, best_quality = result
         
-        cursor.execute('''
-            SELECT image_quality
-            FROM face_encodings
-            WHERE person_id = ? AND is_outlier = FALSE
-            ORDER BY image_quality DESC
-        ''', (person_id,))
+            cursor.execute('''
+                SELECT image_quality
+                FROM face_encodings
+                WHERE person_id = ? AND is_outlier = FALSE
+                ORDER BY image_quality DESC
+            ''', (person_id,))
         
-        qualities = [float(row[0]) for row in cursor.fetchall()]
+            qualities = [float(row[0]) for row in cursor.fetchall()]
         
-        conn.close()
         
         recommendations = {
             'should_retake_photos': avg_quality < 0.3,
@@ -1670,40 +2360,41 @@ def analyze_person(name):
 def generate_test_data():
     """Generate test recognition data for testing reports"""
     try:
-        conn = sqlite3.connect(face_server.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT name FROM people LIMIT 5')
-        people = [row[0] for row in cursor.fetchall()]
-        
-        if not people:
-            return jsonify({
-                'success': False,
-                'error': 'No registered people found. Register someone first.'
-            })
+        with face_server.db.transaction() as conn:
+            cursor = conn.cursor()
         
-        import random
-        from datetime import timedelta
+            cursor.execute('SELECT name FROM people LIMIT 5')
+            people = [row[0] for row in cursor.fetchall()]
         
-        methods = ['multi_face_recognition', 'standard', 'enhanced']
-        now = datetime.now()
+            if not people:
+                return jsonify({
+                    'success': False,
+                    'error': 'No registered people found. Register someone first.'
+                })
         
-        for i in range(50):
-            person = random.choice(people)
-            confidence = random.uniform(0.4, 0.95)
-            quality = random.uniform(0.3, 0.9)
-            processing_time = random.uniform(0.1, 0.8)
-            method = random.choice(methods)
-            timestamp = now - timedelta(hours=random.randint(0, 23), minutes=random.randint(0, 59))
+            import random
+            from datetime import timedelta
+        
+            methods = ['multi_face_recognition', 'standard', 'enhanced']
+            now = datetime.now()
+            rows = []
+        
+            for i in range(50):
+                person = random.choice(people)
+                confidence = random.uniform(0.4, 0.95)
+                quality = random.uniform(0.3, 0.9)
+                processing_time = random.uniform(0.1, 0.8)
+                method = random.choice(methods)
+                timestamp = now - timedelta(hours=random.randint(0, 23), minutes=random.randint(0, 59))
+                rows.append((person, confidence, quality, processing_time, method, format_timestamp(timestamp)))
             
-            cursor.execute('''
+            cursor.executemany('''
                 INSERT INTO recognition_logs 
                 (person_name, confidence, quality_score, processing_time, method_used, timestamp)
                 VALUES (?, ?, ?, ?, ?, ?)
-            ''', (person, confidence, quality, processing_time, method, timestamp.isoformat()))
+            ''', rows)
+            update_rollups(conn, rows)
         
-        conn.commit()
-        conn.close()
         
         return jsonify({
             'success': True,
@@ -1720,55 +2411,95 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'model_loaded': face_server.model_loaded,
-        'people_count': len(face_server.face_encodings),
+        'performance_tier': face_server.governor.tier.name,
+        'people_count': len(face_server.gallery),
+        'similarity_backend': {
+            'name': face_server.gallery.backend.name,
+            'isa': face_server.gallery.backend.isa,
+            'embeddings': face_server.gallery.embedding_count()
+        },
+        'gallery_memory': face_server.gallery.memory_report(),
         'camera_active': face_server.camera_active,
         'camera_mode': face_server.camera_mode,
+        'camera_file': face_server.camera.get_stats() if face_server.camera_mode == 'file' and face_server.camera else None,
+        'camera_discovery': face_server.camera_discovery.get_stats(),
+        'capture': {
+            'frame_seq': face_server.frame_seq,
+            'last_frame_age_ms': round((time.monotonic() - face_server.last_frame_time) * 1000.0, 1)
+                                 if face_server.last_frame_time else None
+        },
         'recognition_stats': face_server.recognition_stats,
+        'log_writer': face_server.log_writer.get_stats(),
+        'database': face_server.db.get_stats(),
+        'retention': face_server.retention.get_stats(),
+        'recognition_rate': face_server.recognition_rate.get_stats(),
+        'frame_gate': face_server.frame_gate.get_stats(),
+        'governor': face_server.governor.get_stats(),
+        'frame_budget': {
+            'budget_ms': face_server.frame_time_budget * 1000.0,
+            'face_cost_estimate_ms': round(face_server.face_cost_estimate * 1000.0, 2),
+            'active_tracks': len(face_server.face_tracker.active_tracks())
+        },
+        'stage_latency': face_server.metrics.summary(),
+        'inference': face_server.inference.get_stats() if face_server.inference else None,
+        'serving': serving_stats(),
+        'process': face_server.process_info(),
         'multi_face_support': True
     })
 
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of stage latencies and recognition counters"""
+    lines = [face_server.metrics.render_prometheus()]
+    for key, value in face_server.recognition_stats.items():
+        name = f"face_server_recognition_{key}"
+        lines.append(f"# TYPE {name} {'gauge' if key.startswith('avg_') else 'counter'}\n{name} {float(value)}\n")
+    lines.append(f"# TYPE face_server_people gauge\nface_server_people {len(face_server.gallery)}\n")
+    lines.append(f"# TYPE face_server_camera_active gauge\nface_server_camera_active {int(bool(face_server.camera_active))}\n")
+    return Response(''.join(lines), mimetype='text/plain; version=0.0.4')
+
+
 @app.route('/api/people', methods=['GET'])
 def list_people():
     """List all registered people"""
     try:
-        conn = sqlite3.connect(face_server.db_path)
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT name, photo_count, created_at, avg_quality, best_quality
-            FROM people
-            ORDER BY created_at DESC
-        ''')
-        
-        people = []
-        for row in cursor.fetchall():
-            avg_quality = row[3]
-            best_quality = row[4]
+        with face_server.db.connection() as conn:
+            cursor = conn.cursor()
+        
+            cursor.execute('''
+                SELECT name, photo_count, created_at, avg_quality, best_quality
+                FROM people
+                ORDER BY created_at DESC
+            ''')
+        
+            people = []
+            for row in cursor.fetchall():
+                avg_quality = row[3]
+                best_quality = row[4]
             
-            if isinstance(avg_quality, bytes):
-                avg_quality = float(np.frombuffer(avg_quality, dtype=np.float32)[0])
-            elif avg_quality is None:
-                avg_quality = 0.0
-            else:
-                avg_quality = float(avg_quality)
+                if isinstance(avg_quality, bytes):
+                    avg_quality = float(np.frombuffer(avg_quality, dtype=np.float32)[0])
+                elif avg_quality is None:
+                    avg_quality = 0.0
+                else:
+                    avg_quality = float(avg_quality)
                 
-            if isinstance(best_quality, bytes):
-                best_quality = float(np.frombuffer(best_quality, dtype=np.float32)[0])
-            elif best_quality is None:
-                best_quality = 0.0
-            else:
-                best_quality = float(best_quality)
+                if isinstance(best_quality, bytes):
+                    best_quality = float(np.frombuffer(best_quality, dtype=np.float32)[0])
+                elif best_quality is None:
+                    best_quality = 0.0
+                else:
+                    best_quality = float(best_quality)
             
-            people.append({
-                'name': row[0],
-                'photo_count': row[1],
-                'created_at': row[2],
-                'avg_quality': round(avg_quality, 3),
-                'best_quality': round(best_quality, 3)
-            })
+                people.append({
+                    'name': row[0],
+                    'photo_count': row[1],
+                    'created_at': row[2],
+                    'avg_quality': round(avg_quality, 3),
+                    'best_quality': round(best_quality, 3)
+                })
         
-        conn.close()
         return jsonify({'people': people, 'total_count': len(people)})
         
     except Exception as e:
@@ -1795,7 +2526,74 @@ def cleanup_camera():
         face_server.stop_camera()
         logging.info("Camera resources cleaned up")   
 
+def cleanup_log_writer():
+    """Flush pending recognition events and close pooled connections"""
+    face_server.retention.stop()
+    face_server.log_writer.stop()
+    face_server.db.close_all()
+
+def cleanup_shared_gallery():
+    """Remove the shared gallery segments when the primary exits"""
+    if face_server.gallery_publisher:
+        face_server.gallery_publisher.close()
+
 atexit.register(cleanup_camera)
+atexit.register(cleanup_log_writer)
+atexit.register(cleanup_shared_gallery)
+
+# Inference endpoints may not take every worker from the frame pollers
+ENDPOINT_LIMITS = {
+    '/api/recognize_batch': 1,
+    '/api/recognize': 2,
+    # Both routes run register_person_enhanced, so they share one slot
+    ('/api/register', '/api/register_enhanced'): 1,
+    '/api/register_from_stream': 1
+}
+
+# Stateless endpoints the API workers serve; camera, live recognition and
+# anything that changes the gallery stay with the primary.
+API_WORKER_PATHS = (
+    '/api/recognize', '/api/recognize_batch', '/api/people', '/api/analytics_enhanced',
+    '/api/daily_report', '/api/recognition_logs', '/api/historical_data',
+    '/api/health', '/metrics'
+)
+
+def reject_primary_only_request():
+    if request.path in API_WORKER_PATHS or request.path.startswith('/api/analyze_person/'):
+        return None
+    return jsonify({'error': f'{request.path} is only served by the primary face server'}), 404
+
+def run_api_worker(index, listen_fd, gallery_prefix):
+    """Entry point of a forked API worker process"""
+    face_server.become_api_worker(index, gallery_prefix)
+    app.before_request(reject_primary_only_request)
+
+    def stop_worker(signum, frame):
+        face_server.log_writer.stop()
+        os._exit(0)
+    signal.signal(signal.SIGTERM, stop_worker)
+
+    logging.info(f"API worker {index} (pid {os.getpid()}) serving on port {face_server.api_worker_port}")
+    serve(app, face_server.api_worker_port, endpoint_limits=ENDPOINT_LIMITS, fd=listen_fd)
+
+def start_api_workers(count, port):
+    """Fork API workers that share one listening socket and the gallery"""
+    prefix = f"face_gallery_{os.getpid()}"
+    face_server.share_gallery(prefix)
+    listener = socket.create_server(('0.0.0.0', port), backlog=128)
+
+    context = multiprocessing.get_context('fork')
+    for index in range(count):
+        process = context.Process(
+            target=run_api_worker,
+            args=(index, listener.fileno(), prefix),
+            name=f'face-api-worker-{index}',
+            daemon=True
+        )
+        process.start()
+        api_worker_processes.append(process)
+    logging.info(f"Started {count} API workers on port {port}")
+    return listener
 
 if __name__ == '__main__':
     print("="*80)
@@ -1808,6 +2606,17 @@ if __name__ == '__main__':
     print(f"Server IP: {local_ip}")
     print(f"Server Port: {port}")
     print(f"Multi-face support: ENABLED")
+    print(f"Serving mode: {os.environ.get('SERVER_MODE', 'development')}")
+    if face_server.api_workers > 0:
+        print(f"API workers: {face_server.api_workers} on port {face_server.api_worker_port}")
     print("="*80)
+
+    if face_server.api_workers > 0:
+        # No thread has been started yet; background threads start after the fork
+        worker_listener = start_api_workers(face_server.api_workers, face_server.api_worker_port)
+        # Exit through atexit on SIGTERM so the workers and the shared
+        # gallery segments are cleaned up
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    face_server.start_background()
     
-    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
+    serve(app, port, endpoint_limits=ENDPOINT_LIMITS)
@@ -0,0 +1,239 @@
+"""
+Lightweight IoU face tracking and per-face priority for the live loop
+Place this in: smart_glasses_server/server/face_tracking.py
+
+Detections from consecutive frames are associated greedily by bounding box
+overlap, so each face keeps a track id together with the identity it was
+last recognized as.  recognize_multiple_faces uses the tracks to decide
+which faces to spend its per-frame time budget on, and deferred faces can
+report their track's last identity instead of nothing.
+
+A track's identity is not simply the latest frame's match.  Each
+recognition is a vote weighted by match confidence and face quality, kept
+over the last IDENTITY_WINDOW recognitions; a track settles on an identity
+once it holds IDENTITY_ENTER of the vote weight and only switches when a
+rival reaches IDENTITY_ENTER while the current identity has fallen below
+IDENTITY_EXIT.  A single noisy frame therefore no longer renames a face
+(and makes the phone announce it again).  Tracks that have held their
+identity for a full window are refreshed less often.
+"""
+
+import os
+import itertools
+import threading
+import time
+from collections import defaultdict, deque
+
+
+def bbox_iou(a, b):
+    """Intersection over union of two [x1, y1, x2, y2] boxes"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    if inter <= 0.0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / (area_a + area_b - inter)
+
+
+class IdentityVote:
+    """Confidence-weighted vote over a track's recent recognitions, with hysteresis"""
+
+    def __init__(self, window=8, enter_share=0.6, exit_share=0.35, min_votes=2,
+                 unknown_weight=0.3, instant_confidence=0.6):
+        self.votes = deque(maxlen=window)
+        self.enter_share = enter_share
+        self.exit_share = exit_share
+        self.min_votes = min_votes
+        # "No match" has no confidence of its own; it counts like a weak match
+        self.unknown_weight = unknown_weight
+        # A first match this strong is trusted without waiting for min_votes
+        self.instant_confidence = instant_confidence
+        self.identity = None
+        self.decided = False
+        self.held_votes = 0
+
+    def _totals(self):
+        totals = defaultdict(float)
+        for name, weight, _ in self.votes:
+            totals[name] += weight
+        return totals, sum(totals.values()) or 1.0
+
+    def share(self, name=None):
+        """Fraction of the vote weight held by name (the current identity by default)"""
+        totals, total = self._totals()
+        return totals.get(self.identity if name is None else name, 0.0) / total
+
+    @property
+    def confidence(self):
+        scores = [confidence for name, _, confidence in self.votes if name == self.identity]
+        return sum(scores) / len(scores) if scores else 0.0
+
+    @property
+    def stable(self):
+        return self.decided and self.held_votes >= self.votes.maxlen
+
+    def add(self, name, confidence, quality_score):
+        """Add one recognition; returns True when the voted identity changed"""
+        weight = (confidence if name is not None else self.unknown_weight) * max(0.1, quality_score)
+        self.votes.append((name, weight, confidence))
+
+        totals, total = self._totals()
+        leader = max(totals, key=totals.get)
+        leader_share = totals[leader] / total
+
+        if not self.decided:
+            ready = len(self.votes) >= self.min_votes or (
+                name is not None and len(self.votes) == 1 and confidence >= self.instant_confidence)
+            if ready and leader_share >= self.enter_share:
+                self.identity, self.decided, self.held_votes = leader, True, 1
+                return True
+            return False
+
+        if (leader != self.identity and leader_share >= self.enter_share
+                and totals.get(self.identity, 0.0) / total < self.exit_share):
+            self.identity, self.held_votes = leader, 1
+            return True
+        self.held_votes += 1
+        return False
+
+
+class FaceTrack:
+    def __init__(self, track_id, bbox, now, vote_settings=None):
+        self.track_id = track_id
+        self.bbox = list(bbox)
+        self.first_seen = now
+        self.last_seen = now
+        self.hits = 1
+        self.vote = IdentityVote(**(vote_settings or {}))
+        self.quality_score = 0.0
+        self.identified_at = None
+
+    @property
+    def is_new(self):
+        return self.identified_at is None
+
+    @property
+    def name(self):
+        return self.vote.identity
+
+    @property
+    def confidence(self):
+        return self.vote.confidence
+
+    @property
+    def decided(self):
+        return self.vote.decided
+
+    @property
+    def stable(self):
+        return self.vote.stable
+
+    def record_identity(self, name, confidence, quality_score, now):
+        """Vote with one frame's match; returns True when the track's identity changed"""
+        self.quality_score = quality_score
+        self.identified_at = now
+        return self.vote.add(name, confidence, quality_score)
+
+    def to_dict(self, now=None):
+        now = time.time() if now is None else now
+        return {
+            'track_id': self.track_id,
+            'bbox': self.bbox,
+            'name': self.name,
+            'confidence': self.confidence,
+            'decided': self.decided,
+            'stable': self.stable,
+            'vote_share': round(self.vote.share(), 3),
+            'hits': self.hits,
+            'age': round(now - self.first_seen, 3),
+            'identity_age': round(now - self.identified_at, 3) if self.identified_at is not None else None
+        }
+
+
+class FaceTracker:
+    def __init__(self, iou_threshold=0.3, max_age=2.0, vote_settings=None):
+        self.iou_threshold = iou_threshold
+        self.max_age = max_age
+        self.vote_settings = vote_settings or {}
+        self.tracks = {}
+        self.lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(vote_settings={
+            'window': int(env.get('IDENTITY_WINDOW', 8)),
+            'enter_share': float(env.get('IDENTITY_ENTER', 0.6)),
+            'exit_share': float(env.get('IDENTITY_EXIT', 0.35)),
+            'min_votes': int(env.get('IDENTITY_MIN_VOTES', 2))
+        })
+
+    def update(self, bboxes, now=None):
+        """Associate this frame's boxes with tracks; returns one track per box"""
+        now = time.time() if now is None else now
+        with self.lock:
+            for track_id in [t for t, track in self.tracks.items() if now - track.last_seen > self.max_age]:
+                del self.tracks[track_id]
+
+            pairs = []
+            for box_index, bbox in enumerate(bboxes):
+                for track in self.tracks.values():
+                    iou = bbox_iou(bbox, track.bbox)
+                    if iou >= self.iou_threshold:
+                        pairs.append((iou, box_index, track.track_id))
+            pairs.sort(reverse=True)
+
+            assigned = [None] * len(bboxes)
+            used_tracks = set()
+            for iou, box_index, track_id in pairs:
+                if assigned[box_index] is not None or track_id in used_tracks:
+                    continue
+                track = self.tracks[track_id]
+                track.bbox = list(bboxes[box_index])
+                track.last_seen = now
+                track.hits += 1
+                assigned[box_index] = track
+                used_tracks.add(track_id)
+
+            for box_index, bbox in enumerate(bboxes):
+                if assigned[box_index] is None:
+                    track = FaceTrack(next(self._ids), bbox, now, self.vote_settings)
+                    self.tracks[track.track_id] = track
+                    assigned[box_index] = track
+
+            return assigned
+
+    def active_tracks(self):
+        with self.lock:
+            return list(self.tracks.values())
+
+    def clear(self):
+        with self.lock:
+            self.tracks.clear()
+
+
+def face_priority(bbox, image_shape, track=None, now=None, refresh_interval=2.0, stable_factor=3.0):
+    """Higher for large, centred faces and for tracks that are new, unknown or stale;
+    tracks with a stable identity go stale stable_factor times slower"""
+    height, width = image_shape[:2]
+    face_area = max(0.0, bbox[2] - bbox[0]) * max(0.0, bbox[3] - bbox[1])
+    size = min(1.0, 4.0 * face_area / float(width * height)) if width and height else 0.0
+
+    cx, cy = (bbox[0] + bbox[2]) / 2.0, (bbox[1] + bbox[3]) / 2.0
+    dx, dy = (cx - width / 2.0) / (width / 2.0 or 1.0), (cy - height / 2.0) / (height / 2.0 or 1.0)
+    centre = max(0.0, 1.0 - (dx * dx + dy * dy) ** 0.5 / 2 ** 0.5)
+
+    priority = 0.5 * size + 0.3 * centre
+    if track is not None:
+        if track.is_new:
+            priority += 0.3
+        else:
+            if track.name is None:
+                priority += 0.15
+            now = time.time() if now is None else now
+            interval = refresh_interval * (stable_factor if track.stable else 1.0)
+            priority += 0.2 * min(1.0, (now - track.identified_at) / interval)
+    return priority
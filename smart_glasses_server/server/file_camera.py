@@ -0,0 +1,203 @@
+"""
+File-backed virtual camera for reproducible load testing
+Place this in: smart_glasses_server/server/file_camera.py
+
+FileCamera plays a video file or an image sequence (a directory or a glob)
+at a target fps behind the same isOpened()/read()/release() interface as
+cv2.VideoCapture, so the face server's capture thread feeds last_frame from
+it exactly as it does from a USB camera.
+
+Frames are delivered on a wall-clock schedule like a real sensor: a reader
+that falls behind gets the current frame rather than a backlog.  Optional
+jitter delays each delivery by up to jitter seconds and drop_rate silently
+discards that fraction of frames, to exercise the recognition loop and the
+streaming endpoints under imperfect capture.
+
+Selected in face_server.py with CAMERA_SOURCE=file and CAMERA_FILE=<path>.
+"""
+
+import os
+import glob
+import time
+import random
+import threading
+import logging
+
+import cv2
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp')
+
+
+class FileCamera:
+    def __init__(self, source, fps=None, loop=True, jitter=0.0, drop_rate=0.0, seed=None):
+        self.source = source
+        self.loop = loop
+        self.jitter = max(0.0, float(jitter))
+        self.drop_rate = min(max(0.0, float(drop_rate)), 0.95)
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.images = self._image_paths(source)
+        self.video = None
+        if self.images is None:
+            self.video = cv2.VideoCapture(source)
+            if not self.video.isOpened():
+                raise IOError(f"Cannot open video file: {source}")
+            source_fps = self.video.get(cv2.CAP_PROP_FPS) or 0.0
+        elif not self.images:
+            raise IOError(f"No images found for: {source}")
+        else:
+            source_fps = 0.0
+
+        self.fps = float(fps or source_fps or 15.0)
+        self.period = 1.0 / self.fps
+        self.position = 0
+        self.opened = True
+        self.started_at = None
+        self.last_slot = -1
+        self.stats = {
+            'delivered': 0,
+            'dropped': 0,
+            'skipped_late': 0,
+            'loops': 0
+        }
+
+    def _image_paths(self, source):
+        if os.path.isdir(source):
+            return sorted(
+                os.path.join(source, name) for name in os.listdir(source)
+                if name.lower().endswith(IMAGE_EXTENSIONS)
+            )
+        if any(ch in source for ch in '*?['):
+            return sorted(glob.glob(source))
+        return None
+
+    def isOpened(self):
+        return self.opened
+
+    def _skip_source_frame(self):
+        """Advance past one frame without decoding it; False at end of stream"""
+        if self.images is not None:
+            if self.position >= len(self.images):
+                if not self.loop:
+                    return False
+                self.stats['loops'] += 1
+                self.position = 0
+            self.position += 1
+            return True
+        if self.video.grab():
+            return True
+        return self._next_source_frame() is not None
+
+    def _next_source_frame(self):
+        """Decode the next frame of the source, rewinding when looping"""
+        for _ in range(2):
+            if self.images is not None:
+                if self.position < len(self.images):
+                    frame = cv2.imread(self.images[self.position])
+                    self.position += 1
+                    if frame is not None:
+                        return frame
+                    continue
+            else:
+                ret, frame = self.video.read()
+                if ret and frame is not None:
+                    return frame
+
+            if not self.loop:
+                return None
+            self.stats['loops'] += 1
+            self.position = 0
+            if self.video is not None:
+                self.video.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        return None
+
+    def read(self):
+        """Block until the next scheduled frame is due; returns (ret, frame)"""
+        with self.lock:
+            if not self.opened:
+                return False, None
+
+            now = time.monotonic()
+            if self.started_at is None:
+                self.started_at = now
+
+            slot = max(self.last_slot + 1, int((now - self.started_at) / self.period))
+            while True:
+                # Frames whose slot passed while nobody was reading are gone
+                for _ in range(slot - self.last_slot - 1):
+                    if not self._skip_source_frame():
+                        return self._end_of_stream()
+                    self.stats['skipped_late'] += 1
+                self.last_slot = slot
+
+                frame = self._next_source_frame()
+                if frame is None:
+                    return self._end_of_stream()
+
+                due = self.started_at + slot * self.period
+                if self.jitter:
+                    due += self.random.uniform(0.0, self.jitter)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+
+                if self.drop_rate and self.random.random() < self.drop_rate:
+                    self.stats['dropped'] += 1
+                    slot += 1
+                    continue
+
+                self.stats['delivered'] += 1
+                return True, frame
+
+    def _end_of_stream(self):
+        logging.info(f"File camera reached the end of {self.source}")
+        self.opened = False
+        return False, None
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_FPS:
+            return self.fps
+        if self.video is not None:
+            return self.video.get(prop)
+        return 0.0
+
+    def set(self, prop, value):
+        return False
+
+    def release(self):
+        with self.lock:
+            self.opened = False
+            if self.video is not None:
+                self.video.release()
+                self.video = None
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats.update({
+            'source': self.source,
+            'fps': self.fps,
+            'loop': self.loop,
+            'jitter': self.jitter,
+            'drop_rate': self.drop_rate,
+            'opened': self.opened
+        })
+        return stats
+
+    @classmethod
+    def from_env(cls):
+        """FileCamera configured by CAMERA_FILE* environment variables"""
+        env = os.environ
+        source = env.get('CAMERA_FILE')
+        if not source:
+            raise IOError("CAMERA_SOURCE=file requires CAMERA_FILE")
+        fps = env.get('CAMERA_FILE_FPS')
+        seed = env.get('CAMERA_FILE_SEED')
+        return cls(
+            source,
+            fps=float(fps) if fps else None,
+            loop=env.get('CAMERA_FILE_LOOP', '1').lower() not in ('0', 'false', 'no'),
+            jitter=float(env.get('CAMERA_FILE_JITTER_MS', 0)) / 1000.0,
+            drop_rate=float(env.get('CAMERA_FILE_DROP_RATE', 0)),
+            seed=int(seed) if seed else None
+        )
@@ -0,0 +1,161 @@
+"""
+Cheap frame quality gate run before face inference
+Place this in: smart_glasses_server/server/frame_quality.py
+
+Detection plus embedding costs tens of milliseconds per frame; frames taken
+while the wearer turns their head or walks into a dark room only produce
+low-confidence noise.  FrameQualityGate looks at a small grayscale copy of
+the frame (FRAME_GATE_WIDTH pixels wide, a millisecond or two) and
+rejects it when it is
+
+  * blurred:      variance of the Laplacian below FRAME_MIN_SHARPNESS, or
+                  below FRAME_BLUR_RATIO times the running average of
+                  recently accepted frames (absolute sharpness depends on
+                  the scene; a sudden drop is what motion blur looks like),
+  * badly exposed: mean outside [FRAME_MIN_BRIGHTNESS, FRAME_MAX_BRIGHTNESS]
+                  or more than FRAME_MAX_CLIPPED of the pixels crushed/blown,
+  * moving:       mean absolute difference to the previous frame above
+                  FRAME_MAX_MOTION.
+
+So that a dim room or a shaky mount cannot stop recognition completely,
+one frame is let through after FRAME_GATE_MAX_SKIP rejections in a row.
+Set FRAME_GATE=0 to disable the gate.
+"""
+
+import os
+import threading
+
+import cv2
+import numpy as np
+
+
+class FrameQualityGate:
+    def __init__(self, enabled=True, width=160, min_sharpness=20.0, blur_ratio=0.4, min_brightness=25.0,
+                 max_brightness=230.0, max_clipped=0.5, max_motion=18.0, max_skip=30):
+        self.enabled = enabled
+        self.width = width
+        self.min_sharpness = min_sharpness
+        self.blur_ratio = blur_ratio
+        self.min_brightness = min_brightness
+        self.max_brightness = max_brightness
+        self.max_clipped = max_clipped
+        self.max_motion = max_motion
+        self.max_skip = max_skip
+
+        self.lock = threading.Lock()
+        self.previous = None
+        self.consecutive_rejects = 0
+        self.reference_sharpness = None
+        self.last_metrics = None
+        self.stats = {
+            'evaluated': 0,
+            'accepted': 0,
+            'forced': 0,
+            'rejected_blur': 0,
+            'rejected_dark': 0,
+            'rejected_bright': 0,
+            'rejected_clipped': 0,
+            'rejected_motion': 0
+        }
+
+    def _small_gray(self, frame):
+        height, width = frame.shape[:2]
+        if width > self.width:
+            size = (self.width, max(1, int(round(height * self.width / float(width)))))
+            frame = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        if frame.ndim == 3:
+            frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return frame
+
+    def measure(self, frame):
+        """Sharpness, brightness, clipped fraction and motion of a frame"""
+        gray = self._small_gray(frame)
+        clipped = np.count_nonzero((gray < 10) | (gray > 245)) / float(gray.size)
+        with self.lock:
+            previous, self.previous = self.previous, gray
+        motion = None
+        if previous is not None and previous.shape == gray.shape:
+            motion = float(cv2.absdiff(gray, previous).mean())
+        return {
+            'sharpness': float(cv2.Laplacian(gray, cv2.CV_32F).var()),
+            'brightness': float(gray.mean()),
+            'clipped': round(float(clipped), 4),
+            'motion': motion
+        }
+
+    def _reason(self, metrics):
+        if metrics['brightness'] < self.min_brightness:
+            return 'dark'
+        if metrics['brightness'] > self.max_brightness:
+            return 'bright'
+        if metrics['clipped'] > self.max_clipped:
+            return 'clipped'
+        if metrics['motion'] is not None and metrics['motion'] > self.max_motion:
+            return 'motion'
+        if metrics['sharpness'] < self.min_sharpness:
+            return 'blur'
+        if self.reference_sharpness and metrics['sharpness'] < self.blur_ratio * self.reference_sharpness:
+            return 'blur'
+        return None
+
+    def _update_reference(self, sharpness):
+        if self.reference_sharpness is None:
+            self.reference_sharpness = sharpness
+        else:
+            self.reference_sharpness = 0.8 * self.reference_sharpness + 0.2 * sharpness
+
+    def check(self, frame):
+        """(accepted, reason, metrics); reason is None for good frames"""
+        if not self.enabled:
+            return True, None, None
+
+        metrics = self.measure(frame)
+        with self.lock:
+            reason = self._reason(metrics)
+            self.stats['evaluated'] += 1
+            self.last_metrics = metrics
+            if reason is None:
+                self.consecutive_rejects = 0
+                self._update_reference(metrics['sharpness'])
+                self.stats['accepted'] += 1
+                return True, None, metrics
+
+            self.consecutive_rejects += 1
+            if self.max_skip and self.consecutive_rejects > self.max_skip:
+                # A long run of soft frames is the new scene, not motion blur
+                self.consecutive_rejects = 0
+                self.reference_sharpness = metrics['sharpness']
+                self.stats['forced'] += 1
+                return True, reason, metrics
+
+            self.stats[f'rejected_{reason}'] += 1
+            return False, reason, metrics
+
+    def get_stats(self):
+        with self.lock:
+            stats = dict(self.stats)
+            evaluated = stats['evaluated']
+            rejected = evaluated - stats['accepted'] - stats['forced']
+            stats.update({
+                'enabled': self.enabled,
+                'rejected': rejected,
+                'reject_rate': round(rejected / evaluated, 4) if evaluated else 0.0,
+                'reference_sharpness': round(self.reference_sharpness, 2) if self.reference_sharpness else None,
+                'last_metrics': self.last_metrics
+            })
+        return stats
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(
+            enabled=env.get('FRAME_GATE', '1').lower() not in ('0', 'false', 'no'),
+            width=int(env.get('FRAME_GATE_WIDTH', 160)),
+            min_sharpness=float(env.get('FRAME_MIN_SHARPNESS', 20)),
+            blur_ratio=float(env.get('FRAME_BLUR_RATIO', 0.4)),
+            min_brightness=float(env.get('FRAME_MIN_BRIGHTNESS', 25)),
+            max_brightness=float(env.get('FRAME_MAX_BRIGHTNESS', 230)),
+            max_clipped=float(env.get('FRAME_MAX_CLIPPED', 0.5)),
+            max_motion=float(env.get('FRAME_MAX_MOTION', 18)),
+            max_skip=int(env.get('FRAME_GATE_MAX_SKIP', 30))
+        )
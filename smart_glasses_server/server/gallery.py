@@ -0,0 +1,289 @@
+"""
+In-memory face gallery with batched matching
+Place this in: smart_glasses_server/server/gallery.py
+
+Enrolled embeddings are kept packed in a single (n, d) matrix together with
+their norms, qualities and person labels, so a query face is scored against
+the whole gallery with one similarity kernel call instead of a Python loop
+over every stored embedding.
+
+The matrix can be kept in float32, float16 or scalar-quantized int8
+(FACE_EMBEDDING_DTYPE), halving or quartering gallery memory.  Scoring runs
+on the compact rows directly: cosine similarity is invariant to the per-row
+int8 scale, and the L2 term is rebuilt from the cosine and the float32 norms
+of the original embeddings.
+"""
+
+import os
+import logging
+import threading
+from collections import namedtuple
+import numpy as np
+
+from similarity import get_backend, top_k_mean_by_label, quantize_int8
+
+STORAGE_DTYPES = ('float32', 'float16', 'int8')
+
+GallerySnapshot = namedtuple(
+    'GallerySnapshot',
+    ['names', 'matrix', 'norms', 'code_norms', 'scales', 'qualities', 'labels', 'version']
+)
+
+
+def get_storage_dtype(dtype=None):
+    """Validated embedding storage dtype, FACE_EMBEDDING_DTYPE by default"""
+    dtype = (dtype or os.environ.get('FACE_EMBEDDING_DTYPE', 'float32')).lower()
+    if dtype not in STORAGE_DTYPES:
+        logging.warning(f"Unknown embedding dtype '{dtype}', using float32")
+        dtype = 'float32'
+    return dtype
+
+
+def encode_embedding(encoding, dtype='float32'):
+    """Serialize an embedding for the face_encodings table, returns (blob, scale)"""
+    encoding = np.asarray(encoding, dtype=np.float32).reshape(-1)
+    if dtype == 'int8':
+        codes, scales = quantize_int8(encoding)
+        return codes.tobytes(), float(scales[0])
+    if dtype == 'float16':
+        return encoding.astype(np.float16).tobytes(), 1.0
+    return encoding.tobytes(), 1.0
+
+
+def decode_embedding(blob, dtype='float32', scale=1.0):
+    """Inverse of encode_embedding, always returns float32"""
+    dtype = dtype or 'float32'
+    if dtype == 'int8':
+        return np.frombuffer(blob, dtype=np.int8).astype(np.float32) * float(scale or 1.0)
+    if dtype == 'float16':
+        return np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+    return np.frombuffer(blob, dtype=np.float32)
+
+
+class FaceGallery:
+    def __init__(self, backend=None, top_k=3, storage_dtype=None):
+        self.backend = backend or get_backend()
+        self.top_k = top_k
+        self.storage_dtype = get_storage_dtype(storage_dtype)
+        self.lock = threading.Lock()
+        self._people = {}
+        self._snapshot = self._empty_snapshot(0)
+        self.listeners = []
+
+    def _empty_snapshot(self, version):
+        return GallerySnapshot(
+            names=[],
+            matrix=np.zeros((0, 0), dtype=self.storage_dtype),
+            norms=np.zeros(0, dtype=np.float32),
+            code_norms=np.zeros(0, dtype=np.float32),
+            scales=np.zeros(0, dtype=np.float32),
+            qualities=np.zeros(0, dtype=np.float32),
+            labels=np.zeros(0, dtype=np.int64),
+            version=version
+        )
+
+    def _pack_entries(self, entries):
+        """Convert registration entries into compact per-person arrays"""
+        encodings = np.vstack([
+            np.asarray(e['encoding'], dtype=np.float32).reshape(1, -1) for e in entries
+        ])
+        norms = np.linalg.norm(encodings, axis=1).astype(np.float32)
+
+        if self.storage_dtype == 'int8':
+            codes, scales = quantize_int8(encodings)
+        elif self.storage_dtype == 'float16':
+            # Unit rows keep SIMD float16 dot products far from overflow; the
+            # real norms are kept in float32 alongside.
+            safe_norms = np.where(norms > 0, norms, 1.0)[:, None]
+            codes = (encodings / safe_norms).astype(np.float16)
+            scales = norms.copy()
+        else:
+            codes = encodings
+            scales = np.ones(len(encodings), dtype=np.float32)
+
+        return {
+            'encodings': codes,
+            'norms': norms,
+            'code_norms': np.linalg.norm(codes.astype(np.float32), axis=1).astype(np.float32),
+            'scales': scales,
+            'qualities': np.array([float(e.get('quality', 0.5)) for e in entries], dtype=np.float32),
+            'weights': np.array([float(e.get('weight', 1.0)) for e in entries], dtype=np.float32)
+        }
+
+    def snapshot(self):
+        """The current immutable GallerySnapshot"""
+        return self._snapshot
+
+    def add_listener(self, callback):
+        """Call callback(snapshot) after every rebuild, under the gallery lock"""
+        self.listeners.append(callback)
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    def __len__(self):
+        return len(self._people)
+
+    def __contains__(self, name):
+        return name in self._people
+
+    def names(self):
+        return list(self._people.keys())
+
+    def embedding_count(self):
+        return len(self.snapshot().labels)
+
+    def memory_bytes(self):
+        """Bytes held by the packed gallery arrays"""
+        snapshot = self.snapshot()
+        return int(sum(
+            array.nbytes for array in (
+                snapshot.matrix, snapshot.norms, snapshot.code_norms,
+                snapshot.scales, snapshot.qualities, snapshot.labels
+            )
+        ))
+
+    def memory_report(self):
+        snapshot = self.snapshot()
+        dim = snapshot.matrix.shape[1] if snapshot.matrix.ndim == 2 else 0
+        float32_bytes = len(snapshot.labels) * dim * 4
+        matrix_bytes = int(snapshot.matrix.nbytes)
+        return {
+            'storage_dtype': self.storage_dtype,
+            'embeddings': len(snapshot.labels),
+            'dimension': dim,
+            'matrix_bytes': matrix_bytes,
+            'total_bytes': self.memory_bytes(),
+            'float32_matrix_bytes': float32_bytes,
+            'compression_ratio': round(float32_bytes / matrix_bytes, 2) if matrix_bytes else 1.0
+        }
+
+    def set_person(self, name, entries):
+        """Replace all embeddings of a person.
+
+        entries is a list of dicts with 'encoding', 'quality' and 'weight'
+        keys, the same shape add_person_enhanced builds during registration.
+        """
+        if not entries:
+            return self.remove_person(name)
+
+        person = self._pack_entries(entries)
+
+        with self.lock:
+            self._people[name] = person
+            self._rebuild()
+        return True
+
+    def load(self, people_entries):
+        """Bulk load {name: entries}, rebuilding the packed matrix once"""
+        with self.lock:
+            for name, entries in people_entries.items():
+                if not entries:
+                    continue
+                self._people[name] = self._pack_entries(entries)
+            self._rebuild()
+
+    def remove_person(self, name):
+        with self.lock:
+            if name not in self._people:
+                return False
+            del self._people[name]
+            self._rebuild()
+        return True
+
+    def clear(self):
+        with self.lock:
+            self._people = {}
+            self._rebuild()
+
+    def _rebuild(self):
+        """Repack the gallery; callers must hold self.lock"""
+        version = self._snapshot.version + 1
+
+        if not self._people:
+            self._snapshot = self._empty_snapshot(version)
+            self._notify()
+            return
+
+        names = list(self._people.keys())
+        people = [self._people[n] for n in names]
+        matrix = np.ascontiguousarray(np.vstack([p['encodings'] for p in people]))
+        labels = np.concatenate([
+            np.full(len(p['encodings']), i, dtype=np.int64) for i, p in enumerate(people)
+        ])
+
+        # Point every person at a view of the new matrix so the gallery is
+        # held in memory once, not once per person plus once packed.
+        offset = 0
+        for person in people:
+            count = len(person['encodings'])
+            person['encodings'] = matrix[offset:offset + count]
+            offset += count
+
+        self._snapshot = GallerySnapshot(
+            names=names,
+            matrix=matrix,
+            norms=np.concatenate([p['norms'] for p in people]),
+            code_norms=np.concatenate([p['code_norms'] for p in people]),
+            scales=np.concatenate([p['scales'] for p in people]),
+            qualities=np.concatenate([p['qualities'] for p in people]),
+            labels=labels,
+            version=version
+        )
+        self._notify()
+
+    def _notify(self):
+        for callback in self.listeners:
+            try:
+                callback(self._snapshot)
+            except Exception as e:
+                logging.error(f"Gallery listener error: {e}")
+
+    def match(self, embeddings, face_qualities):
+        """Find the best matching person for each query embedding.
+
+        Scoring follows the original per-pair formula: 0.6 * cosine similarity
+        plus 0.4 * 1 / (1 + 0.3 * L2 distance), scaled by a quality factor of
+        the query and stored faces, then averaged over the best top_k stored
+        embeddings of each person.  The L2 distance is derived from the cosine
+        and the cached norms so only one kernel pass over the gallery is needed.
+
+        Returns a list of (name, confidence) tuples; name is None when nothing
+        scored above zero.
+        """
+        snapshot = self.snapshot()
+        if len(embeddings) == 0:
+            return []
+        if len(snapshot.labels) == 0:
+            return [(None, 0.0) for _ in embeddings]
+
+        queries = np.vstack([np.asarray(e, dtype=np.float32).reshape(1, -1) for e in embeddings])
+        query_norms = np.linalg.norm(queries, axis=1)
+        queries = queries / np.where(query_norms > 0, query_norms, 1.0)[:, None]
+
+        cosine = self.backend.cosine(queries, snapshot.matrix, snapshot.code_norms)
+
+        results = []
+        for i in range(len(queries)):
+            cos_row = cosine[i]
+            sq_dist = (query_norms[i] ** 2 + snapshot.norms ** 2
+                       - 2.0 * query_norms[i] * snapshot.norms * cos_row)
+            euclidean_sim = 1.0 / (1.0 + np.sqrt(np.maximum(sq_dist, 0.0)) * 0.3)
+            combined = cos_row * 0.6 + euclidean_sim * 0.4
+
+            quality_factor = np.minimum(
+                1.2, (float(face_qualities[i]) * 1.1 + snapshot.qualities * 0.9) / 1.5
+            )
+            scores = (combined * quality_factor).astype(np.float32)
+
+            per_person = top_k_mean_by_label(scores, snapshot.labels, len(snapshot.names), self.top_k)
+            best = int(np.argmax(per_person))
+            best_confidence = float(per_person[best])
+
+            if best_confidence > 0.0:
+                results.append((snapshot.names[best], best_confidence))
+            else:
+                results.append((None, 0.0))
+
+        return results
@@ -0,0 +1,278 @@
+"""
+Face gallery shared between processes through POSIX shared memory
+Place this in: smart_glasses_server/server/gallery_shm.py
+
+The primary face server owns the FaceGallery.  SharedGalleryPublisher copies
+every rebuilt snapshot (matrix, norms, qualities, labels and names) into a
+new segment "<prefix>_v<version>" and then points a small control segment
+"<prefix>_ctl" at it.  The control header is updated under a sequence
+counter (odd while being written), so readers never see a half-written
+name/version pair.
+
+API worker processes read through SharedGalleryReader, which maps the
+segments read-only straight from /dev/shm, checks the control version on
+every lookup (a few bytes) and remaps only when it changed.  The matrix is
+held once in RAM however many workers there are.  Linux only.
+"""
+
+import os
+import json
+import mmap
+import time
+import struct
+import logging
+import threading
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from gallery import FaceGallery, GallerySnapshot
+
+SHM_DIR = '/dev/shm'
+
+CONTROL = struct.Struct('<4sHHQQ64s')       # magic, layout, pad, seq, version, segment name
+DATA_HEADER = struct.Struct('<4sHHQQQQ')    # magic, layout, dtype, version, rows, dim, names bytes
+CONTROL_MAGIC = b'FGCT'
+DATA_MAGIC = b'FGDS'
+LAYOUT_VERSION = 1
+ALIGNMENT = 64
+
+DTYPE_CODES = {'float32': 0, 'float16': 1, 'int8': 2}
+DTYPE_NAMES = {code: name for name, code in DTYPE_CODES.items()}
+
+# (snapshot field, dtype) of the per-row arrays stored after the matrix
+ROW_ARRAYS = (
+    ('norms', np.float32),
+    ('code_norms', np.float32),
+    ('scales', np.float32),
+    ('qualities', np.float32),
+    ('labels', np.int64)
+)
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def _layout(rows, dim, dtype, names_bytes):
+    """Byte offsets of every array in a data segment and its total size"""
+    offsets = {}
+    offset = _align(DATA_HEADER.size)
+    offsets['matrix'] = offset
+    offset = _align(offset + rows * dim * np.dtype(dtype).itemsize)
+    for field, field_dtype in ROW_ARRAYS:
+        offsets[field] = offset
+        offset = _align(offset + rows * np.dtype(field_dtype).itemsize)
+    offsets['names'] = offset
+    return offsets, max(offset + names_bytes, 1)
+
+
+def _create_segment(name, size):
+    try:
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+    except FileExistsError:
+        # Left over from a crashed run with the same prefix
+        stale = shared_memory.SharedMemory(name=name)
+        stale.close()
+        stale.unlink()
+        return shared_memory.SharedMemory(name=name, create=True, size=size)
+
+
+def _map_readonly(name):
+    fd = os.open(os.path.join(SHM_DIR, name), os.O_RDONLY)
+    try:
+        return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+
+
+class SharedGalleryPublisher:
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.control = _create_segment(f"{prefix}_ctl", CONTROL.size)
+        self.current = None
+        self.seq = 0
+        self.stats = {'published': 0, 'last_bytes': 0, 'last_publish_ms': 0.0}
+
+    def publish(self, snapshot):
+        """Copy snapshot into a fresh segment and switch readers over to it"""
+        start = time.perf_counter()
+        matrix = np.ascontiguousarray(snapshot.matrix)
+        rows = len(snapshot.labels)
+        dim = matrix.shape[1] if matrix.ndim == 2 and rows else 0
+        dtype = str(matrix.dtype)
+        names = json.dumps(snapshot.names).encode('utf-8')
+        offsets, size = _layout(rows, dim, dtype, len(names))
+
+        segment = _create_segment(f"{self.prefix}_v{snapshot.version}", size)
+        buf = segment.buf
+        DATA_HEADER.pack_into(buf, 0, DATA_MAGIC, LAYOUT_VERSION, DTYPE_CODES[dtype],
+                              snapshot.version, rows, dim, len(names))
+        if rows:
+            target = np.ndarray((rows, dim), dtype=dtype, buffer=buf, offset=offsets['matrix'])
+            target[:] = matrix
+            for field, field_dtype in ROW_ARRAYS:
+                target = np.ndarray(rows, dtype=field_dtype, buffer=buf, offset=offsets[field])
+                target[:] = getattr(snapshot, field)
+            del target
+        buf[offsets['names']:offsets['names'] + len(names)] = names
+        del buf
+
+        self._write_control(snapshot.version, segment.name.lstrip('/'))
+
+        previous, self.current = self.current, segment
+        if previous is not None:
+            # Readers that already mapped it keep their mapping; the name goes
+            previous.close()
+            previous.unlink()
+
+        self.stats['published'] += 1
+        self.stats['last_bytes'] = size
+        self.stats['last_publish_ms'] = round((time.perf_counter() - start) * 1000.0, 3)
+
+    def _write_control(self, version, name):
+        buf = self.control.buf
+        self.seq += 1
+        struct.pack_into('<Q', buf, 8, self.seq)
+        CONTROL.pack_into(buf, 0, CONTROL_MAGIC, LAYOUT_VERSION, 0, self.seq,
+                          version, name.encode('ascii'))
+        self.seq += 1
+        struct.pack_into('<Q', buf, 8, self.seq)
+        del buf
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['segment'] = self.current.name.lstrip('/') if self.current else None
+        return stats
+
+    def close(self):
+        """Unlink all segments; call once in the primary at shutdown"""
+        for segment in (self.current, self.control):
+            if segment is None:
+                continue
+            try:
+                segment.close()
+                segment.unlink()
+            except (FileNotFoundError, BufferError):
+                pass
+        self.current = None
+
+
+class SharedGalleryReader:
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.control = _map_readonly(f"{prefix}_ctl")
+        self.lock = threading.Lock()
+        self.mapping = None
+        self.retired = []
+        self.storage_dtype = 'float32'
+        self._snapshot = GallerySnapshot(
+            names=[], matrix=np.zeros((0, 0), dtype=np.float32),
+            norms=np.zeros(0, dtype=np.float32), code_norms=np.zeros(0, dtype=np.float32),
+            scales=np.zeros(0, dtype=np.float32), qualities=np.zeros(0, dtype=np.float32),
+            labels=np.zeros(0, dtype=np.int64), version=-1
+        )
+        self.stats = {'reattached': 0, 'failed_attaches': 0}
+
+    def _read_control(self):
+        """(version, segment name) from a consistent read of the control header"""
+        for _ in range(1000):
+            magic, _, _, seq, version, name = CONTROL.unpack_from(self.control, 0)
+            if seq % 2 == 0 and struct.unpack_from('<Q', self.control, 8)[0] == seq:
+                if magic != CONTROL_MAGIC or seq == 0:
+                    return None, None
+                return version, name.rstrip(b'\0').decode('ascii')
+            time.sleep(0)
+        return None, None
+
+    def _attach(self, name):
+        mapping = _map_readonly(name)
+        magic, layout, dtype_code, version, rows, dim, names_bytes = DATA_HEADER.unpack_from(mapping, 0)
+        if magic != DATA_MAGIC or layout != LAYOUT_VERSION:
+            mapping.close()
+            raise ValueError(f"Unexpected gallery segment layout in {name}")
+
+        dtype = DTYPE_NAMES[dtype_code]
+        offsets, _ = _layout(rows, dim, dtype, names_bytes)
+        arrays = {
+            'matrix': np.frombuffer(mapping, dtype=dtype, count=rows * dim,
+                                    offset=offsets['matrix']).reshape(rows, dim)
+        }
+        for field, field_dtype in ROW_ARRAYS:
+            arrays[field] = np.frombuffer(mapping, dtype=field_dtype, count=rows, offset=offsets[field])
+        names = json.loads(bytes(mapping[offsets['names']:offsets['names'] + names_bytes]).decode('utf-8'))
+
+        return mapping, dtype, GallerySnapshot(names=names, version=version, **arrays)
+
+    def _close_retired(self):
+        still_used = []
+        for mapping in self.retired:
+            try:
+                mapping.close()
+            except BufferError:
+                # A request still holds arrays of this snapshot
+                still_used.append(mapping)
+        self.retired = still_used
+
+    def snapshot(self):
+        """Current snapshot, remapped if the primary published a new version"""
+        version, name = self._read_control()
+        if version is None or version == self._snapshot.version:
+            return self._snapshot
+
+        with self.lock:
+            if version == self._snapshot.version:
+                return self._snapshot
+            try:
+                mapping, dtype, snapshot = self._attach(name)
+            except (FileNotFoundError, ValueError) as e:
+                # Replaced again between reading the control and mapping; the
+                # next lookup picks up the newer one
+                self.stats['failed_attaches'] += 1
+                logging.debug(f"Gallery segment {name} not attached: {e}")
+                return self._snapshot
+
+            if self.mapping is not None:
+                self.retired.append(self.mapping)
+            self.mapping = mapping
+            self.storage_dtype = dtype
+            self._snapshot = snapshot
+            self.stats['reattached'] += 1
+            self._close_retired()
+            return snapshot
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats.update({
+            'version': self._snapshot.version,
+            'retired_mappings': len(self.retired)
+        })
+        return stats
+
+
+class SharedFaceGallery(FaceGallery):
+    """Read-only FaceGallery whose snapshots come from a SharedGalleryReader"""
+
+    def __init__(self, reader, backend=None, top_k=3):
+        self.reader = reader
+        super().__init__(backend=backend, top_k=top_k, storage_dtype=None)
+        self.snapshot()
+
+    def snapshot(self):
+        snapshot = self.reader.snapshot()
+        self.storage_dtype = self.reader.storage_dtype
+        return snapshot
+
+    def __len__(self):
+        return len(self.snapshot().names)
+
+    def __contains__(self, name):
+        return name in self.snapshot().names
+
+    def names(self):
+        return list(self.snapshot().names)
+
+    def _read_only(self, *args, **kwargs):
+        raise RuntimeError("The shared gallery is read-only; register people on the primary server")
+
+    set_person = load = remove_person = clear = _read_only
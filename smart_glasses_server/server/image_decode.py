@@ -0,0 +1,89 @@
+"""
+Decoding of uploaded images with early downscaling
+Place this in: smart_glasses_server/server/image_decode.py
+
+Phone photos are often 12 MP or more, while the face detector works on
+640x640.  decode_image() reads the dimensions from the header first and, for
+JPEGs, lets libjpeg decode directly at 1/2, 1/4 or 1/8 scale
+(IMREAD_REDUCED_COLOR_*), which is several times cheaper than decoding the
+full image and resizing it afterwards.  The remainder is done with
+INTER_AREA so the longest side ends up at most max_side pixels.
+"""
+
+import io
+import base64
+import binascii
+
+import cv2
+import numpy as np
+from PIL import Image
+
+REDUCED_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+)
+
+
+def decode_base64(data):
+    """Bytes from a base64 string, tolerating data: URLs and line breaks"""
+    if isinstance(data, str) and data.startswith('data:'):
+        data = data.split(',', 1)[-1]
+    try:
+        return base64.b64decode(data)
+    except (binascii.Error, ValueError) as e:
+        raise ValueError(f"Invalid base64 image: {e}")
+
+
+def image_size(data):
+    """(width, height, format) from the image header, or (None, None, None)"""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size[0], img.size[1], img.format
+    except Exception:
+        return None, None, None
+
+
+def decode_image(data, max_side=None):
+    """Decode image bytes to BGR, downscaled so the longest side is <= max_side.
+
+    Returns (image, info) where info has the original and decoded sizes.
+    Raises ValueError if the bytes are not a decodable image.
+    """
+    if not data:
+        raise ValueError("Empty image")
+    buffer = np.frombuffer(data, np.uint8)
+    width, height, fmt = image_size(data)
+
+    flag = cv2.IMREAD_COLOR
+    reduction = 1
+    if max_side and width and height and fmt == 'JPEG':
+        longest = max(width, height)
+        for factor, reduced_flag in REDUCED_FLAGS:
+            if longest / factor >= max_side:
+                flag, reduction = reduced_flag, factor
+                break
+
+    try:
+        image = cv2.imdecode(buffer, flag)
+    except cv2.error:
+        image = None
+    if image is None:
+        raise ValueError("Could not decode image")
+
+    decoded_height, decoded_width = image.shape[:2]
+    longest = max(decoded_height, decoded_width)
+    if max_side and longest > max_side:
+        scale = max_side / float(longest)
+        image = cv2.resize(
+            image,
+            (max(1, int(round(decoded_width * scale))), max(1, int(round(decoded_height * scale)))),
+            interpolation=cv2.INTER_AREA
+        )
+
+    return image, {
+        'original_size': [width or decoded_width, height or decoded_height],
+        'decoded_size': [image.shape[1], image.shape[0]],
+        'jpeg_reduction': reduction,
+        'bytes': len(data)
+    }
@@ -0,0 +1,341 @@
+"""
+Offline identity indexing of recorded videos with resumable checkpoints
+Place this in: smart_glasses_server/server/index_video.py
+
+Runs the live recognition pipeline (preprocess_camera_frame, then
+recognize_multiple_faces with tracking and identity voting) over a recorded
+session from the glasses and writes a timeline of who was seen when.
+
+The video is split into segments of --segment-seconds that are processed in
+a ProcessPoolExecutor.  Each worker imports the face server once, so the
+model is loaded once per process, and runs its ONNX sessions with
+--threads-per-worker threads so the pool, not ORT, spreads the work over the
+cores.  Workers read identities from a copy of the enrolment database
+taken at the start of the run, so the live database is never touched.
+
+Every finished segment is written to <output>.parts/ before the next one is
+reported, so an interrupted run (power loss on the Pi, Ctrl+C) resumes with
+only the unfinished segments.  Track ids restart in every segment and are
+reported as "<segment>:<track>".
+
+Output is JSON, or SQLite when --output ends in .db/.sqlite:
+
+  * frames:  one row per face per sampled frame, with the track's voted
+             identity and the frame's own match,
+  * tracks:  first/last time, frame count and final identity of each track,
+  * people:  per identity the number of tracks, first/last time and seconds
+             in view.
+
+Usage:
+    python index_video.py session.mp4
+    python index_video.py session.mp4 --workers 4 --sample-fps 5 --output session.db
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import cv2
+
+CHECKPOINT_VERSION = 1
+
+_server = None
+
+
+def probe_video(path):
+    capture = cv2.VideoCapture(path)
+    if not capture.isOpened():
+        return None
+    info = {
+        'fps': float(capture.get(cv2.CAP_PROP_FPS) or 0.0) or 30.0,
+        'frame_count': int(capture.get(cv2.CAP_PROP_FRAME_COUNT) or 0),
+        'width': int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        'height': int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    }
+    capture.release()
+    return info
+
+
+def plan_segments(frame_count, video_fps, segment_seconds):
+    """[(index, first_frame, end_frame)] covering the whole video"""
+    length = max(1, int(round(segment_seconds * video_fps)))
+    return [(index, start, min(start + length, frame_count))
+            for index, start in enumerate(range(0, frame_count, length))]
+
+
+def snapshot_database(source, target):
+    """Consistent copy of the enrolment database, even while the server writes to it"""
+    source_conn = sqlite3.connect(source)
+    target_conn = sqlite3.connect(target)
+    try:
+        source_conn.backup(target_conn)
+    finally:
+        target_conn.close()
+        source_conn.close()
+
+
+def _write_json(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def _init_worker(db_path, threads):
+    """Load the face server (and with it the model) once per worker process"""
+    global _server
+    os.environ['FACE_DB_PATH'] = db_path
+    os.environ['FACE_INFERENCE_THREADS'] = str(threads)
+    os.environ['FACE_WORKERS'] = '0'
+    # Stay in the full tier so the timeline does not depend on the device's
+    # temperature or load while indexing
+    os.environ['GOVERNOR'] = '0'
+    from face_server import face_server
+    # Only the inference thread; the indexer logs nothing and its snapshot
+    # database must not be archived by retention
+    face_server.start_background(log_writer=False, retention=False, governor=False)
+    # Offline every face is recognised; nothing is deferred to a later frame
+    face_server.frame_time_budget = float('inf')
+    _server = face_server
+
+
+def process_segment(video, index, first_frame, end_frame, stride, video_fps):
+    """Recognise every stride-th frame of one segment; returns the segment record"""
+    from face_tracking import FaceTracker
+
+    if _server is None or not _server.model_loaded:
+        raise RuntimeError("Face model failed to load in worker")
+    _server.face_tracker = FaceTracker.from_env()
+
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+    capture = cv2.VideoCapture(video)
+    capture.set(cv2.CAP_PROP_POS_FRAMES, first_frame)
+
+    detections = []
+    sampled = 0
+    frame_number = first_frame
+    while frame_number < end_frame:
+        if (frame_number - first_frame) % stride:
+            ok = capture.grab()
+        else:
+            ok, frame = capture.read()
+            if ok:
+                processed = _server.preprocess_camera_frame(frame)
+                result = _server.recognize_multiple_faces(processed, use_tracking=True,
+                                                          now=frame_number / video_fps)
+                sampled += 1
+                for face in result.get('faces', []):
+                    detections.append({
+                        'frame': frame_number,
+                        'time': round(frame_number / video_fps, 3),
+                        'track': f"{index}:{face.get('track_id')}",
+                        'name': face.get('name'),
+                        'confidence': round(float(face.get('confidence', 0.0)), 4),
+                        'frame_name': face.get('frame_name'),
+                        'frame_confidence': round(float(face.get('frame_confidence', 0.0)), 4),
+                        'pending': bool(face.get('pending')),
+                        'bbox': [round(float(v), 1) for v in face['bbox']]
+                    })
+        if not ok:
+            break
+        frame_number += 1
+    capture.release()
+
+    return {
+        'segment': index,
+        'first_frame': first_frame,
+        'end_frame': end_frame,
+        'frames_sampled': sampled,
+        'detections': detections,
+        'wall_seconds': round(time.perf_counter() - wall_start, 3),
+        'cpu_seconds': round(time.process_time() - cpu_start, 3),
+        'worker_pid': os.getpid()
+    }
+
+
+def summarize(detections, sample_interval):
+    """Per-track and per-person summaries of the detections"""
+    tracks = {}
+    for detection in detections:
+        track = tracks.setdefault(detection['track'], {
+            'track': detection['track'], 'first_time': detection['time'], 'frames': 0, 'name': None
+        })
+        track['last_time'] = detection['time']
+        track['frames'] += 1
+        if not detection['pending']:
+            track['name'] = detection['name']
+
+    people = {}
+    for track in tracks.values():
+        if track['name'] is None:
+            continue
+        person = people.setdefault(track['name'], {
+            'name': track['name'], 'tracks': 0, 'first_time': track['first_time'],
+            'last_time': track['last_time'], 'seconds_in_view': 0.0
+        })
+        person['tracks'] += 1
+        person['first_time'] = min(person['first_time'], track['first_time'])
+        person['last_time'] = max(person['last_time'], track['last_time'])
+        person['seconds_in_view'] = round(person['seconds_in_view'] + track['frames'] * sample_interval, 3)
+
+    return (sorted(tracks.values(), key=lambda t: t['first_time']),
+            sorted(people.values(), key=lambda p: p['first_time']))
+
+
+def write_sqlite(path, report, detections, tracks, people):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('CREATE TABLE run (key TEXT PRIMARY KEY, value TEXT)')
+        conn.execute('''CREATE TABLE frames (frame INTEGER, time REAL, track TEXT, name TEXT, confidence REAL,
+                        frame_name TEXT, frame_confidence REAL, pending INTEGER,
+                        x1 REAL, y1 REAL, x2 REAL, y2 REAL)''')
+        conn.execute('CREATE INDEX idx_frames_time ON frames(time)')
+        conn.execute('CREATE INDEX idx_frames_name ON frames(name)')
+        conn.execute('''CREATE TABLE tracks (track TEXT PRIMARY KEY, name TEXT, first_time REAL,
+                        last_time REAL, frames INTEGER)''')
+        conn.execute('''CREATE TABLE people (name TEXT PRIMARY KEY, tracks INTEGER, first_time REAL,
+                        last_time REAL, seconds_in_view REAL)''')
+        conn.executemany('INSERT INTO run VALUES (?, ?)',
+                         [(key, json.dumps(value)) for key, value in report.items()])
+        conn.executemany('INSERT INTO frames VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', [
+            (d['frame'], d['time'], d['track'], d['name'], d['confidence'], d['frame_name'],
+             d['frame_confidence'], int(d['pending']), *d['bbox']) for d in detections
+        ])
+        conn.executemany('INSERT INTO tracks VALUES (?, ?, ?, ?, ?)', [
+            (t['track'], t['name'], t['first_time'], t['last_time'], t['frames']) for t in tracks
+        ])
+        conn.executemany('INSERT INTO people VALUES (?, ?, ?, ?, ?)', [
+            (p['name'], p['tracks'], p['first_time'], p['last_time'], p['seconds_in_view']) for p in people
+        ])
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index who appears when in a recorded video")
+    parser.add_argument('video', help='Video file to index')
+    parser.add_argument('--output', help='Timeline file, .json or .db/.sqlite (default <video>_timeline.json)')
+    parser.add_argument('--database', default=os.environ.get('FACE_DB_PATH', 'face_database.db'),
+                        help='Enrolment database with the known people')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--threads-per-worker', type=int, default=1, help='ONNX Runtime threads per worker')
+    parser.add_argument('--sample-fps', type=float, default=5.0, help='Frames per second of video to recognise')
+    parser.add_argument('--segment-seconds', type=float, default=60.0, help='Video seconds per task/checkpoint')
+    parser.add_argument('--restart', action='store_true', help='Discard checkpoints of an earlier run')
+    args = parser.parse_args()
+
+    video = os.path.abspath(args.video)
+    info = probe_video(video)
+    if info is None or info['frame_count'] <= 0:
+        print(f"Could not read {args.video}")
+        return 1
+    if not os.path.exists(args.database):
+        print(f"Enrolment database {args.database} not found")
+        return 1
+
+    output = args.output or f"{os.path.splitext(args.video)[0]}_timeline.json"
+    parts_dir = f"{output}.parts"
+    stride = max(1, int(round(info['fps'] / args.sample_fps))) if args.sample_fps > 0 else 1
+    manifest = {
+        'version': CHECKPOINT_VERSION,
+        'video': video,
+        'video_size': os.path.getsize(video),
+        'video_mtime': int(os.path.getmtime(video)),
+        'frame_count': info['frame_count'],
+        'video_fps': info['fps'],
+        'stride': stride,
+        'segment_seconds': args.segment_seconds
+    }
+
+    manifest_path = os.path.join(parts_dir, 'manifest.json')
+    if args.restart and os.path.isdir(parts_dir):
+        for name in os.listdir(parts_dir):
+            os.remove(os.path.join(parts_dir, name))
+    os.makedirs(parts_dir, exist_ok=True)
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            if json.load(f) != manifest:
+                print(f"{parts_dir} belongs to a different video or settings; use --restart to discard it")
+                return 1
+    else:
+        _write_json(manifest_path, manifest)
+
+    # Resumed runs keep the gallery they started with
+    gallery_db = os.path.join(parts_dir, 'gallery.db')
+    if not os.path.exists(gallery_db):
+        snapshot_database(args.database, gallery_db)
+
+    segments = plan_segments(info['frame_count'], info['fps'], args.segment_seconds)
+    part_path = lambda index: os.path.join(parts_dir, f"segment_{index:05d}.json")
+    pending = [segment for segment in segments if not os.path.exists(part_path(segment[0]))]
+    print(f"{len(segments)} segments, {len(segments) - len(pending)} already done, "
+          f"{len(pending)} to process with {args.workers} workers (every {stride} frames)")
+
+    start = time.perf_counter()
+    if pending:
+        workers = max(1, min(args.workers, len(pending)))
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                 initializer=_init_worker,
+                                 initargs=(os.path.abspath(gallery_db), args.threads_per_worker)) as pool:
+            futures = [pool.submit(process_segment, video, index, first, end, stride, info['fps'])
+                       for index, first, end in pending]
+            for done, future in enumerate(as_completed(futures), 1):
+                record = future.result()
+                _write_json(part_path(record['segment']), record)
+                fps = record['frames_sampled'] / record['wall_seconds'] if record['wall_seconds'] else 0.0
+                print(f"[{done}/{len(pending)}] segment {record['segment']}: "
+                      f"{record['frames_sampled']} frames, {fps:.2f} fps, {len(record['detections'])} faces")
+    elapsed = time.perf_counter() - start
+
+    records = []
+    for index, _, _ in segments:
+        with open(part_path(index)) as f:
+            records.append(json.load(f))
+    detections = [d for record in records for d in record['detections']]
+    tracks, people = summarize(detections, stride / info['fps'])
+
+    frames_sampled = sum(r['frames_sampled'] for r in records)
+    busy_seconds = sum(r['wall_seconds'] for r in records)
+    processed_now = {index for index, _, _ in pending}
+    run_frames = sum(r['frames_sampled'] for r in records if r['segment'] in processed_now)
+    report = {
+        'created_at': datetime.now().isoformat(),
+        'video': video,
+        'video_fps': info['fps'],
+        'frame_size': f"{info['width']}x{info['height']}",
+        'stride': stride,
+        'segments': len(segments),
+        'frames_sampled': frames_sampled,
+        'workers': args.workers,
+        'threads_per_worker': args.threads_per_worker,
+        'wall_seconds': round(elapsed, 3),
+        'fps': round(run_frames / elapsed, 3) if elapsed > 0 and run_frames else None,
+        'fps_per_core': round(frames_sampled / busy_seconds, 3) if busy_seconds else None,
+        'cpu_seconds_per_frame': round(sum(r['cpu_seconds'] for r in records) / frames_sampled, 4)
+        if frames_sampled else None
+    }
+
+    if output.endswith(('.db', '.sqlite')):
+        write_sqlite(output, report, detections, tracks, people)
+    else:
+        _write_json(output, dict(report, people=people, tracks=tracks, frames=detections))
+
+    print(f"{frames_sampled} frames, {len(tracks)} tracks, {len(people)} known people; "
+          f"{report['fps'] or 0:.2f} fps overall, {report['fps_per_core'] or 0:.2f} fps per core")
+    for person in people:
+        print(f"  {person['name']}: {person['first_time']:.1f}s - {person['last_time']:.1f}s "
+              f"({person['seconds_in_view']:.1f}s in view, {person['tracks']} tracks)")
+    print(f"Timeline written to {output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
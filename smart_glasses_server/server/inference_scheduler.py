@@ -0,0 +1,262 @@
+"""
+Single owner of the InsightFace model with prioritised, batched access
+Place this in: smart_glasses_server/server/inference_scheduler.py
+
+The live recognition loop, on-demand /api/recognize requests, enrolment
+and batch uploads all need the detector and the embedding model.  Calling
+the ONNX sessions from every thread at once oversubscribes the CPU (each
+session already uses all cores) and lets a stack of enrolment photos delay
+live frames.  Instead every call is a job for InferenceScheduler, whose
+worker thread(s) run one model call at a time in priority order:
+
+    live > on_demand > enrollment > batch
+
+Jobs are split into chunks (one image per detection, at most max_batch
+crops per embedding call) and the rest of a job goes back into the queue
+after each chunk, so a live frame never waits for more than the chunk that
+is already running.  Queued embedding jobs of the same priority are
+coalesced into one get_feat() call up to max_batch crops (lower priority
+crops are not, as they would make the live call itself slower).
+
+Queue wait per priority and model time per kind are recorded in the
+server's StageMetrics (inference_wait_<priority>, inference_<kind>) and
+get_stats() reports the current queue depths.
+"""
+
+import os
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+LIVE, ON_DEMAND, ENROLLMENT, BATCH = range(4)
+PRIORITY_NAMES = ('live', 'on_demand', 'enrollment', 'batch')
+
+
+class InferenceJob:
+    def __init__(self, kind, priority, items, max_num=0):
+        self.kind = kind
+        self.priority = priority
+        self.items = items
+        self.max_num = max_num
+        self.results = [None] * len(items)
+        self.next_item = 0
+        self.remaining = len(items)
+        self.submitted = time.perf_counter()
+        self.started = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class InferenceScheduler:
+    def __init__(self, model, metrics=None, max_batch=16, workers=1):
+        self.model = model
+        self.recognition = model.models['recognition']
+        self.crop_size = self.recognition.input_size[0]
+        self.metrics = metrics
+        self.max_batch = max(1, max_batch)
+        self.workers = max(1, workers)
+        # Detector input (w, h); None uses the size the model was prepared with
+        self.det_size = None
+
+        self.queue = []
+        self.condition = threading.Condition()
+        self._seq = itertools.count()
+        self.threads = []
+        self.stopped = False
+        self.running = 0
+        self.stats = {
+            'jobs': {name: 0 for name in PRIORITY_NAMES},
+            'model_calls': 0,
+            'coalesced_calls': 0,
+            'embedded_crops': 0,
+            'detected_images': 0,
+            'errors': 0
+        }
+
+    @classmethod
+    def from_env(cls, model, metrics=None):
+        return cls(
+            model,
+            metrics=metrics,
+            max_batch=int(os.environ.get('INFERENCE_MAX_BATCH', 16)),
+            workers=int(os.environ.get('INFERENCE_WORKERS', 1))
+        )
+
+    def start(self):
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"inference-{index}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def _run(self, kind, priority, items, max_num=0):
+        if not items:
+            return []
+        job = InferenceJob(kind, priority, items, max_num)
+        with self.condition:
+            if self.stopped:
+                raise RuntimeError("Inference scheduler is stopped")
+            heapq.heappush(self.queue, (priority, next(self._seq), job))
+            self.stats['jobs'][PRIORITY_NAMES[priority]] += 1
+            self.condition.notify()
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.results
+
+    def detect(self, image, priority=LIVE, max_num=0):
+        """(bboxes, kpss) of the detector for one image"""
+        return self._run('detect', priority, [image], max_num)[0]
+
+    def embed(self, crops, priority=LIVE):
+        """One embedding per aligned crop"""
+        return self._run('embed', priority, list(crops))
+
+    def align(self, image, kps):
+        """Aligned crop for the embedding model; plain CPU work, not scheduled"""
+        from insightface.utils import face_align
+        return face_align.norm_crop(image, landmark=kps, image_size=self.crop_size)
+
+    def _take_chunk(self):
+        """Pop the most urgent work: one detection, or up to max_batch crops from
+        the queued embedding jobs of that priority.  Called with the condition held."""
+        _, seq, job = heapq.heappop(self.queue)
+        if job.kind == 'detect':
+            chunk = [(job, job.next_item, 1)]
+            job.next_item += 1
+            if job.next_item < len(job.items):
+                heapq.heappush(self.queue, (job.priority, seq, job))
+            return 'detect', chunk
+
+        chunk = []
+        budget = self.max_batch
+        requeue = [(job.priority, seq, job)]
+        while True:
+            count = min(budget, len(job.items) - job.next_item)
+            chunk.append((job, job.next_item, count))
+            job.next_item += count
+            budget -= count
+            if job.next_item >= len(job.items):
+                requeue.pop()
+            if budget == 0 or not self.queue:
+                break
+            # Coalesce the next queued embedding job of the same priority
+            candidates = [entry for entry in self.queue
+                          if entry[2].kind == 'embed' and entry[0] == job.priority]
+            if not candidates:
+                break
+            entry = min(candidates)
+            self.queue.remove(entry)
+            heapq.heapify(self.queue)
+            _, seq, job = entry
+            requeue.append(entry)
+        for entry in requeue:
+            heapq.heappush(self.queue, entry)
+        return 'embed', chunk
+
+    def _worker(self):
+        while True:
+            with self.condition:
+                while not self.queue and not self.stopped:
+                    self.condition.wait()
+                if self.stopped:
+                    return
+                kind, chunk = self._take_chunk()
+                self.running += 1
+
+            now = time.perf_counter()
+            for job, _, _ in chunk:
+                if job.started is None:
+                    job.started = now
+                    if self.metrics is not None:
+                        self.metrics.observe(f"inference_wait_{PRIORITY_NAMES[job.priority]}", now - job.submitted)
+
+            try:
+                if kind == 'detect':
+                    self._run_detect(chunk)
+                else:
+                    self._run_embed(chunk)
+                error = None
+            except Exception as e:
+                logging.error(f"Inference {kind} error: {e}")
+                self.stats['errors'] += 1
+                error = e
+            finally:
+                if self.metrics is not None:
+                    self.metrics.observe(f"inference_{kind}", time.perf_counter() - now)
+
+            with self.condition:
+                self.running -= 1
+                for job, _, count in chunk:
+                    if error is not None and job.error is None:
+                        job.error = error
+                    job.remaining -= count
+                    if job.remaining == 0 or job.error is not None:
+                        if job.error is not None:
+                            self._drop(job)
+                        job.done.set()
+
+    def _drop(self, job):
+        """Remove the rest of a failed job from the queue"""
+        entries = [entry for entry in self.queue if entry[2] is job]
+        for entry in entries:
+            self.queue.remove(entry)
+        if entries:
+            heapq.heapify(self.queue)
+
+    def _run_detect(self, chunk):
+        job, index, _ = chunk[0]
+        options = {'input_size': self.det_size} if self.det_size else {}
+        job.results[index] = self.model.det_model.detect(job.items[index], max_num=job.max_num,
+                                                         metric='default', **options)
+        self.stats['model_calls'] += 1
+        self.stats['detected_images'] += 1
+
+    def _run_embed(self, chunk):
+        crops = [crop for job, start, count in chunk for crop in job.items[start:start + count]]
+        try:
+            embeddings = list(self.recognition.get_feat(crops))
+            self.stats['model_calls'] += 1
+        except Exception as e:
+            if len(crops) == 1:
+                raise
+            # Models exported with a fixed batch size of 1
+            logging.debug(f"Batched embedding failed ({e}), embedding faces one by one")
+            embeddings = [self.recognition.get_feat(crop).flatten() for crop in crops]
+            self.stats['model_calls'] += len(crops)
+
+        if len(chunk) > 1:
+            self.stats['coalesced_calls'] += 1
+        self.stats['embedded_crops'] += len(crops)
+        offset = 0
+        for job, start, count in chunk:
+            job.results[start:start + count] = embeddings[offset:offset + count]
+            offset += count
+
+    def get_stats(self):
+        with self.condition:
+            depth = {name: 0 for name in PRIORITY_NAMES}
+            for priority, _, job in self.queue:
+                depth[PRIORITY_NAMES[priority]] += 1
+            stats = {
+                'queue_depth': depth,
+                'running': self.running,
+                'workers': self.workers,
+                'max_batch': self.max_batch,
+                'det_size': self.det_size,
+                'jobs': dict(self.stats['jobs'])
+            }
+            stats.update({key: value for key, value in self.stats.items() if key != 'jobs'})
+        if self.metrics is not None:
+            summary = self.metrics.summary()
+            stats['wait_ms'] = {
+                name: {key: summary[f"inference_wait_{name}"][key] for key in ('count', 'p50_ms', 'p99_ms')}
+                for name in PRIORITY_NAMES if f"inference_wait_{name}" in summary
+            }
+        return stats
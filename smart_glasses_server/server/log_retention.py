@@ -0,0 +1,197 @@
+"""
+Retention, archival and downsampling for recognition_logs
+Place this in: smart_glasses_server/server/log_retention.py
+
+Raw recognition rows older than raw_days are exported to per-day gzip'd
+JSON-lines archives, deleted and their pages handed back with
+PRAGMA incremental_vacuum.  Rollups (the downsampled form of the raw rows)
+are kept much longer.  Everything runs on a background thread in small
+chunks with a pause between them, so each write transaction is short and
+the recognition log writer is never stalled behind the cleanup.
+
+Archives are written before rows are deleted; if the process dies in
+between, the next pass exports those rows again (at-least-once).
+"""
+
+import os
+import gzip
+import json
+import time
+import threading
+import logging
+from datetime import datetime, timedelta
+
+from face_db import format_timestamp
+
+ARCHIVE_COLUMNS = [
+    'id', 'person_name', 'confidence', 'quality_score', 'processing_time',
+    'method_used', 'face_count', 'timestamp', 'source'
+]
+
+
+class RetentionPolicy:
+    def __init__(self, raw_days=7, hourly_days=30, daily_days=365, archive_dir='recognition_archive',
+                 chunk_size=500, chunk_pause=0.05, interval=3600.0, vacuum_pages=200):
+        self.raw_days = raw_days
+        self.hourly_days = hourly_days
+        self.daily_days = daily_days
+        self.archive_dir = archive_dir
+        self.chunk_size = chunk_size
+        self.chunk_pause = chunk_pause
+        self.interval = interval
+        self.vacuum_pages = vacuum_pages
+
+    @classmethod
+    def from_env(cls):
+        """Policy from RETENTION_* environment variables, defaults otherwise"""
+        env = os.environ
+        return cls(
+            raw_days=int(env.get('RETENTION_RAW_DAYS', 7)),
+            hourly_days=int(env.get('RETENTION_HOURLY_DAYS', 30)),
+            daily_days=int(env.get('RETENTION_DAILY_DAYS', 365)),
+            archive_dir=env.get('RETENTION_ARCHIVE_DIR', 'recognition_archive'),
+            chunk_size=int(env.get('RETENTION_CHUNK_SIZE', 500)),
+            interval=float(env.get('RETENTION_INTERVAL_SECONDS', 3600))
+        )
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+
+class RetentionEngine:
+    def __init__(self, database, policy=None):
+        self.database = database
+        self.policy = policy or RetentionPolicy.from_env()
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.stats = {
+            'runs': 0,
+            'rows_archived': 0,
+            'rows_deleted': 0,
+            'rollup_rows_deleted': 0,
+            'archive_files': 0,
+            'pages_vacuumed': 0,
+            'last_run': None,
+            'last_run_seconds': 0.0,
+            'errors': 0
+        }
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run_loop, name='log-retention', daemon=True)
+        self.thread.start()
+        logging.info(f"Log retention started (raw rows kept {self.policy.raw_days} days)")
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['policy'] = self.policy.to_dict()
+        stats['running'] = bool(self.thread and self.thread.is_alive())
+        return stats
+
+    def _run_loop(self):
+        # Let the server finish starting up before the first pass
+        if self.stop_event.wait(min(60.0, self.policy.interval)):
+            return
+        while not self.stop_event.is_set():
+            self.run_once()
+            self.stop_event.wait(self.policy.interval)
+
+    def run_once(self):
+        """One full retention pass; safe to call directly (e.g. from a CLI)"""
+        start = time.time()
+        try:
+            now = datetime.now()
+            self._archive_raw_rows(format_timestamp(now - timedelta(days=self.policy.raw_days)))
+            self._expire_rollups(now)
+            self._incremental_vacuum()
+            self.stats['runs'] += 1
+        except Exception as e:
+            self.stats['errors'] += 1
+            logging.error(f"Log retention error: {e}")
+        finally:
+            self.stats['last_run'] = format_timestamp(datetime.now())
+            self.stats['last_run_seconds'] = round(time.time() - start, 3)
+
+    def _archive_path(self, day):
+        return os.path.join(self.policy.archive_dir, f"recognition_logs_{day}.jsonl.gz")
+
+    def _write_archive(self, rows):
+        by_day = {}
+        for row in rows:
+            by_day.setdefault(str(row[7])[:10], []).append(row)
+
+        os.makedirs(self.policy.archive_dir, exist_ok=True)
+        for day, day_rows in by_day.items():
+            path = self._archive_path(day)
+            if not os.path.exists(path):
+                self.stats['archive_files'] += 1
+            # Appending adds another gzip member; readers see one stream.
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                for row in day_rows:
+                    f.write(json.dumps(dict(zip(ARCHIVE_COLUMNS, row))) + '\n')
+            self.stats['rows_archived'] += len(day_rows)
+
+    def _archive_raw_rows(self, cutoff):
+        columns = ', '.join(ARCHIVE_COLUMNS)
+        while not self.stop_event.is_set():
+            with self.database.connection() as conn:
+                rows = conn.execute(f'''
+                    SELECT {columns}
+                    FROM recognition_logs
+                    WHERE timestamp < ?
+                    ORDER BY timestamp
+                    LIMIT ?
+                ''', (cutoff, self.policy.chunk_size)).fetchall()
+
+            if not rows:
+                return
+
+            self._write_archive(rows)
+
+            with self.database.transaction() as conn:
+                conn.executemany("DELETE FROM recognition_logs WHERE id = ?", [(row[0],) for row in rows])
+            self.stats['rows_deleted'] += len(rows)
+
+            self.stop_event.wait(self.policy.chunk_pause)
+
+    def _expire_rollups(self, now):
+        expiries = [
+            ('recognition_rollup_hourly', 'hour',
+             (now - timedelta(days=self.policy.hourly_days)).strftime('%Y-%m-%d %H')),
+            ('recognition_rollup_daily', 'day',
+             (now - timedelta(days=self.policy.daily_days)).strftime('%Y-%m-%d')),
+            ('recognition_rollup_person_daily', 'day',
+             (now - timedelta(days=self.policy.daily_days)).strftime('%Y-%m-%d')),
+        ]
+        for table, column, cutoff in expiries:
+            while not self.stop_event.is_set():
+                with self.database.transaction() as conn:
+                    deleted = conn.execute(f'''
+                        DELETE FROM {table} WHERE rowid IN (
+                            SELECT rowid FROM {table} WHERE {column} < ? LIMIT ?
+                        )
+                    ''', (cutoff, self.policy.chunk_size)).rowcount
+                self.stats['rollup_rows_deleted'] += deleted
+                if deleted < self.policy.chunk_size:
+                    break
+                self.stop_event.wait(self.policy.chunk_pause)
+
+    def _incremental_vacuum(self):
+        with self.database.connection() as conn:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                return
+        while not self.stop_event.is_set():
+            with self.database.connection() as conn:
+                free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                if free_pages == 0:
+                    return
+                conn.execute(f"PRAGMA incremental_vacuum({self.policy.vacuum_pages})").fetchall()
+            self.stats['pages_vacuumed'] += min(free_pages, self.policy.vacuum_pages)
+            self.stop_event.wait(self.policy.chunk_pause)
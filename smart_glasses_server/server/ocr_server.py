@@ -32,6 +32,9 @@ except ImportError:
 
 
 from flask_cors import CORS
+from sampling_profiler import profiler_blueprint
+from serving import serve
+from thermal_governor import ThermalGovernor
 
 BASE_DIR = '/opt/research_project'
 TEMPLATES_DIR = '/opt/research_project/templates'
@@ -42,6 +45,7 @@ app = Flask(
     static_folder=STATIC_DIR
 )
 CORS(app)
+app.register_blueprint(profiler_blueprint)
 
 logging.basicConfig(level=logging.INFO)
 
@@ -78,6 +82,8 @@ class SinhalaOCRServer:
         self.stop_capture = False
         self.frame_capture_thread = None
         self.camera_error = None
+        self.capture_fps = 20
+        self.governor = ThermalGovernor.from_env()
 
         self.language_configs = [
             'sin',  
@@ -97,6 +103,7 @@ class SinhalaOCRServer:
         self.setup_database()
         self.setup_tesseract()
         self.init_models()
+        self.governor.start()
     
     def init_rpi_camera(self):
         """Initialize Raspberry Pi camera with Picamera2"""
@@ -281,6 +288,7 @@ class SinhalaOCRServer:
 
                     self.frame_capture_thread = threading.Thread(
                         target=self._continuous_capture,
+                        name='camera-capture',
                         daemon=True
                     )
                     self.frame_capture_thread.start()
@@ -296,6 +304,7 @@ class SinhalaOCRServer:
                     
                         self.frame_capture_thread = threading.Thread(
                             target=self._continuous_capture,
+                            name='camera-capture',
                             daemon=True
                         )
 
@@ -343,7 +352,9 @@ class SinhalaOCRServer:
                     with self.camera_lock:
                         self.last_frame = frame.copy()
                 
-                time.sleep(0.05)  # ~20 FPS
+                # 20 FPS, less when the governor is throttling the device
+                capture_fps = min(self.capture_fps, self.governor.tier.capture_fps or self.capture_fps)
+                time.sleep(1.0 / capture_fps)
                 
         except Exception as e:
             logging.error(f"Continuous capture error: {e}")
@@ -1346,6 +1357,8 @@ def ocr_health():
         'tesseract_ready': ocr_server.tesseract_available,
         'tts_ready': ocr_server.tts_engine is not None,
         'database_ready': ocr_server.conn is not None,
+        'performance_tier': ocr_server.governor.tier.name,
+        'governor': ocr_server.governor.get_stats(),
         'stats': ocr_server.processing_stats
     })
 
@@ -1355,6 +1368,7 @@ def health():
     return jsonify({
         'status': 'healthy',
         'service': 'ocr',
+        'performance_tier': ocr_server.governor.tier.name,
         'timestamp': datetime.now().isoformat()
     })
 
@@ -1808,12 +1822,10 @@ if __name__ == '__main__':
         print(f"Template found at {template_path}")
 
     try:
-        app.run(
-            host='0.0.0.0',
-            port=port,
-            debug=False,
-            threaded=True
-        )
+        serve(app, port, endpoint_limits={
+            '/api/ocr/process': 1,
+            '/api/ocr/speak': 1
+        })
     except KeyboardInterrupt:
         print("\n\nShutting down OCR server...")
         if ocr_server.conn:
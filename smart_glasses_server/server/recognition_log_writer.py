@@ -0,0 +1,183 @@
+"""
+Asynchronous batched writer for recognition_logs
+Place this in: smart_glasses_server/server/recognition_log_writer.py
+
+The recognition loop only pushes events onto a bounded in-memory queue
+(never blocking, dropping when full).  A background thread drains the queue
+and writes batches in a single transaction every flush_interval seconds or
+every batch_size events, whichever comes first, and folds them into the
+analytics rollups within the same transaction.  Repeated sightings of the
+same person within dedup_window seconds are collapsed into one row.
+"""
+
+import sqlite3
+import threading
+import time
+import logging
+from queue import Queue, Empty, Full
+
+from face_db import format_timestamp
+from analytics_rollups import update_rollups
+
+
+class RecognitionLogWriter:
+    def __init__(self, database, flush_interval=0.25, batch_size=100,
+                 max_queue=10000, dedup_window=5.0):
+        self.database = database
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.dedup_window = dedup_window
+
+        self.queue = Queue(maxsize=max_queue)
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.last_logged = {}
+
+        self.stats = {
+            'queued': 0,
+            'written': 0,
+            'dropped': 0,
+            'deduplicated': 0,
+            'batches': 0,
+            'errors': 0,
+            'last_flush_ms': 0.0
+        }
+
+    def start(self):
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._writer_loop, name='recognition-log-writer', daemon=True)
+        self.thread.start()
+        logging.info("Recognition log writer started")
+
+    def stop(self, timeout=2.0):
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join(timeout=timeout)
+        logging.info("Recognition log writer stopped")
+
+    def submit(self, person_name, confidence, quality_score=0.0, processing_time=0.0,
+               method_used='standard', face_count=1, source='realtime'):
+        """Queue one event; never blocks the caller"""
+        event = (
+            time.time(), person_name, float(confidence), float(quality_score),
+            float(processing_time), method_used, int(face_count), source
+        )
+        try:
+            self.queue.put_nowait(event)
+            self.stats['queued'] += 1
+            return True
+        except Full:
+            self.stats['dropped'] += 1
+            return False
+
+    def submit_result(self, result, source='realtime'):
+        """Queue one event per recognized face of a recognize_multiple_faces result"""
+        faces = result.get('faces') or []
+        for face in faces:
+            # Deferred faces repeat an earlier track identity, not a new sighting
+            if not face.get('recognized') or face.get('deferred'):
+                continue
+            self.submit(
+                face.get('name'),
+                face.get('confidence', 0.0),
+                face.get('quality_score', 0.0),
+                result.get('processing_time', 0.0),
+                result.get('method_used', 'standard'),
+                result.get('face_count', len(faces)),
+                source
+            )
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats['queue_depth'] = self.queue.qsize()
+        stats['running'] = bool(self.thread and self.thread.is_alive())
+        return stats
+
+    def _is_duplicate(self, event_time, person_name):
+        last = self.last_logged.get(person_name)
+        if last is not None and event_time - last < self.dedup_window:
+            return True
+        self.last_logged[person_name] = event_time
+        return False
+
+    def _collect_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                event = self.queue.get(timeout=remaining)
+            except Empty:
+                break
+
+            if self._is_duplicate(event[0], event[1]):
+                self.stats['deduplicated'] += 1
+                continue
+            batch.append(event)
+
+        return batch
+
+    def _drain_remaining(self):
+        batch = []
+        while True:
+            try:
+                event = self.queue.get_nowait()
+            except Empty:
+                return batch
+            if self._is_duplicate(event[0], event[1]):
+                self.stats['deduplicated'] += 1
+                continue
+            batch.append(event)
+
+    def _write_batch(self, conn, batch):
+        rows = [
+            (person_name, confidence, quality_score, processing_time, method_used,
+             face_count, format_timestamp(event_time), source)
+            for (event_time, person_name, confidence, quality_score,
+                 processing_time, method_used, face_count, source) in batch
+        ]
+
+        start = time.perf_counter()
+        try:
+            with conn:
+                conn.executemany('''
+                    INSERT INTO recognition_logs
+                    (person_name, confidence, quality_score, processing_time,
+                     method_used, face_count, timestamp, source)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', rows)
+                update_rollups(conn, [
+                    (row[0], row[1], row[2], row[3], row[4], row[6]) for row in rows
+                ])
+            self.stats['written'] += len(rows)
+            self.stats['batches'] += 1
+        except sqlite3.Error as e:
+            self.stats['errors'] += 1
+            logging.error(f"Recognition log write error: {e}")
+        self.stats['last_flush_ms'] = round((time.perf_counter() - start) * 1000.0, 3)
+
+    def _prune_dedup_state(self):
+        cutoff = time.time() - self.dedup_window
+        for name in [n for n, t in self.last_logged.items() if t < cutoff]:
+            del self.last_logged[name]
+
+    def _writer_loop(self):
+        try:
+            with self.database.connection() as conn:
+                while not self.stop_event.is_set():
+                    batch = self._collect_batch()
+                    if batch:
+                        self._write_batch(conn, batch)
+                    if len(self.last_logged) > 1000:
+                        self._prune_dedup_state()
+
+                batch = self._drain_remaining()
+                if batch:
+                    self._write_batch(conn, batch)
+        except Exception as e:
+            logging.error(f"Recognition log writer error: {e}")
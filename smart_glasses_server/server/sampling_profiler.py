@@ -0,0 +1,159 @@
+"""
+On-demand statistical sampling profiler for the live servers
+Place this in: smart_glasses_server/server/sampling_profiler.py
+
+A request to /api/admin/profile samples the stack of every thread (the
+recognition loop, camera capture, request handlers, ...) with
+sys._current_frames() every few milliseconds for N seconds and returns the
+result as collapsed stacks ("thread;outer;...;inner count" per line), which
+flamegraph.pl, speedscope and inferno read directly.
+
+Safety limits: the endpoint is disabled unless PROFILER_TOKEN is set and the
+caller sends it, only one profile runs at a time (409 otherwise), duration
+and sampling rate are clamped, and stacks are truncated at MAX_STACK_DEPTH.
+The face, OCR and STT servers all register profiler_blueprint.
+"""
+
+import os
+import sys
+import hmac
+import time
+import threading
+import logging
+from collections import Counter
+
+from flask import Blueprint, Response, request, jsonify
+
+MAX_DURATION = float(os.environ.get('PROFILER_MAX_SECONDS', 60))
+MIN_INTERVAL = 0.002
+MAX_STACK_DEPTH = 64
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class SamplingProfiler:
+    def __init__(self):
+        self.run_lock = threading.Lock()
+        self.last_run = None
+
+    def busy(self):
+        return self.run_lock.locked()
+
+    def sample(self, duration, interval, stop_event=None):
+        """Sample all threads; returns (Counter of collapsed stacks, run info).
+
+        Raises RuntimeError if another profile is already running.
+        """
+        if not self.run_lock.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            duration = max(0.1, min(float(duration), MAX_DURATION))
+            interval = max(MIN_INTERVAL, float(interval))
+            own_ident = threading.get_ident()
+            stacks = Counter()
+            samples = 0
+            sampling_time = 0.0
+
+            start = time.perf_counter()
+            deadline = start + duration
+            while time.perf_counter() < deadline:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                tick = time.perf_counter()
+                names = {t.ident: t.name for t in threading.enumerate()}
+                frame = None
+                for ident, frame in sys._current_frames().items():
+                    if ident == own_ident:
+                        continue
+                    labels = []
+                    while frame is not None and len(labels) < MAX_STACK_DEPTH:
+                        labels.append(_frame_label(frame))
+                        frame = frame.f_back
+                    labels.append(names.get(ident, f"thread-{ident}"))
+                    stacks[';'.join(reversed(labels))] += 1
+                del frame
+                samples += 1
+                spent = time.perf_counter() - tick
+                sampling_time += spent
+                time.sleep(max(0.0, interval - spent))
+
+            elapsed = time.perf_counter() - start
+            info = {
+                'duration': round(elapsed, 3),
+                'interval_ms': round(interval * 1000.0, 3),
+                'samples': samples,
+                'unique_stacks': len(stacks),
+                # Share of one core spent walking stacks while profiling
+                'overhead': round(sampling_time / elapsed, 4) if elapsed > 0 else 0.0,
+                'finished_at': time.time()
+            }
+            self.last_run = info
+            return stacks, info
+        finally:
+            self.run_lock.release()
+
+
+def collapsed_text(stacks):
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+profiler = SamplingProfiler()
+profiler_blueprint = Blueprint('sampling_profiler', __name__, url_prefix='/api/admin')
+
+
+def _authorized():
+    token = os.environ.get('PROFILER_TOKEN')
+    if not token:
+        return False
+    supplied = request.headers.get('X-Admin-Token', '')
+    auth = request.headers.get('Authorization', '')
+    if auth.startswith('Bearer '):
+        supplied = auth[len('Bearer '):]
+    return hmac.compare_digest(supplied.encode(), token.encode())
+
+
+@profiler_blueprint.route('/profile', methods=['GET', 'POST'])
+def run_profile():
+    """Profile all threads for ?seconds=N; returns collapsed stacks (or JSON with format=json)"""
+    if not _authorized():
+        return jsonify({'error': 'Profiler disabled or invalid admin token'}), 403
+
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 10)) / 1000.0
+    except ValueError:
+        return jsonify({'error': 'seconds and interval_ms must be numbers'}), 400
+
+    try:
+        stacks, info = profiler.sample(seconds, interval)
+    except RuntimeError as e:
+        return jsonify({'error': str(e)}), 409
+    except Exception as e:
+        logging.error(f"Profiler error: {e}")
+        return jsonify({'error': str(e)}), 500
+
+    logging.info(f"Profile finished: {info['samples']} samples, {info['unique_stacks']} stacks, "
+                 f"overhead {info['overhead'] * 100:.1f}%")
+
+    if request.args.get('format') == 'json':
+        return jsonify({'profile': info, 'stacks': dict(stacks.most_common())})
+
+    response = Response(collapsed_text(stacks), mimetype='text/plain')
+    response.headers['Content-Disposition'] = f"attachment; filename=profile-{int(time.time())}.collapsed"
+    response.headers['X-Profile-Samples'] = str(info['samples'])
+    response.headers['X-Profile-Overhead'] = str(info['overhead'])
+    return response
+
+
+@profiler_blueprint.route('/profile/status', methods=['GET'])
+def profile_status():
+    if not _authorized():
+        return jsonify({'error': 'Profiler disabled or invalid admin token'}), 403
+    return jsonify({
+        'running': profiler.busy(),
+        'last_run': profiler.last_run,
+        'max_seconds': MAX_DURATION
+    })
@@ -0,0 +1,360 @@
+"""
+Shared HTTP serving for the face, OCR, STT and ultrasonic servers
+Place this in: smart_glasses_server/server/serving.py
+
+serve(app, port, endpoint_limits) is the common entry point at the bottom
+of every server script.
+
+SERVER_MODE=development (default) keeps app.run(threaded=True), the
+Werkzeug development server with one new thread per request.
+
+SERVER_MODE=production runs PooledWSGIServer instead:
+  * a fixed pool of SERVER_THREADS worker threads,
+  * an accept queue of at most SERVER_QUEUE connections; beyond that new
+    connections get an immediate 503 with Retry-After instead of piling up,
+  * HTTP/1.1 keep-alive, so polling clients (frame endpoints every few
+    hundred ms) reuse one connection.  Idle connections time out after
+    SERVER_KEEPALIVE seconds and are closed early when others are queued,
+    so they never hold a worker hostage.
+
+In both modes EndpointLimiter caps how many requests may run concurrently
+on each heavy endpoint (for example /api/ocr/process), so inference calls
+cannot occupy every worker and starve the light polling endpoints.
+"""
+
+import os
+import json
+import queue
+import socket
+import logging
+import threading
+
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+from werkzeug.wsgi import ClosingIterator
+
+BUSY_RESPONSE = (
+    b"HTTP/1.1 503 Service Unavailable\r\n"
+    b"Content-Type: application/json\r\n"
+    b"Retry-After: 1\r\n"
+    b"Connection: close\r\n"
+    b"Content-Length: 26\r\n"
+    b"\r\n"
+    b'{"error": "Server busy"}\r\n'
+)
+
+# Unread request bodies up to this size are drained so the connection can
+# be reused; larger leftovers close it instead.
+MAX_DRAIN_BYTES = 64 * 1024
+
+
+class EndpointLimiter:
+    """WSGI middleware capping concurrent requests per path prefix.
+
+    limits maps a path prefix to its cap.  Up to `cap` further requests may
+    wait (at most wait_timeout seconds) for a slot; anything beyond that is
+    answered with 503 straight away so waiting requests cannot tie up the
+    whole worker pool.  A tuple of prefixes as the key shares one cap
+    between several routes (e.g. two routes into the same handler).
+    """
+
+    def __init__(self, app, limits, wait_timeout=10.0):
+        self.app = app
+        self.wait_timeout = wait_timeout
+        self.lock = threading.Lock()
+        groups = {}
+        prefixes = []
+        for key, cap in limits.items():
+            group = ', '.join(key) if isinstance(key, tuple) else key
+            groups[group] = cap
+            for prefix in (key if isinstance(key, tuple) else (key,)):
+                prefixes.append((prefix, group))
+        # Longest prefix first so '/api/recognize_batch' wins over '/api/recognize'
+        self.limits = sorted(prefixes, key=lambda item: len(item[0]), reverse=True)
+        self.slots = {group: threading.BoundedSemaphore(cap) for group, cap in groups.items()}
+        self.caps = groups
+        self.waiting = {group: 0 for group in groups}
+        self.stats = {group: {'limit': cap, 'active': 0, 'served': 0, 'rejected': 0}
+                      for group, cap in groups.items()}
+
+    def _match(self, path):
+        for prefix, group in self.limits:
+            if path == prefix or path.startswith(prefix.rstrip('/') + '/'):
+                return group, self.caps[group]
+        return None, None
+
+    def _reject(self, start_response, prefix):
+        with self.lock:
+            self.stats[prefix]['rejected'] += 1
+        body = json.dumps({'error': f'Too many concurrent requests to {prefix}, retry shortly'}).encode()
+        start_response('503 Service Unavailable', [
+            ('Content-Type', 'application/json'),
+            ('Content-Length', str(len(body))),
+            ('Retry-After', '1')
+        ])
+        return [body]
+
+    def __call__(self, environ, start_response):
+        prefix, cap = self._match(environ.get('PATH_INFO', ''))
+        if prefix is None:
+            return self.app(environ, start_response)
+
+        slot = self.slots[prefix]
+        if not slot.acquire(blocking=False):
+            with self.lock:
+                queue_full = self.waiting[prefix] >= cap
+                if not queue_full:
+                    self.waiting[prefix] += 1
+            if queue_full:
+                return self._reject(start_response, prefix)
+            try:
+                acquired = slot.acquire(timeout=self.wait_timeout)
+            finally:
+                with self.lock:
+                    self.waiting[prefix] -= 1
+            if not acquired:
+                return self._reject(start_response, prefix)
+
+        with self.lock:
+            self.stats[prefix]['active'] += 1
+
+        def release():
+            with self.lock:
+                self.stats[prefix]['active'] -= 1
+                self.stats[prefix]['served'] += 1
+            slot.release()
+
+        try:
+            # Streaming responses hold the slot until fully sent
+            return ClosingIterator(self.app(environ, start_response), [release])
+        except Exception:
+            release()
+            raise
+
+    def get_stats(self):
+        with self.lock:
+            return {prefix: dict(stats, waiting=self.waiting[prefix]) for prefix, stats in self.stats.items()}
+
+
+class _CountingInput:
+    """wsgi.input wrapper that remembers how much of the body was read"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.consumed = 0
+
+    def read(self, *args):
+        data = self.stream.read(*args)
+        self.consumed += len(data)
+        return data
+
+    def readline(self, *args):
+        data = self.stream.readline(*args)
+        self.consumed += len(data)
+        return data
+
+    def readlines(self, *args):
+        lines = self.stream.readlines(*args)
+        self.consumed += sum(len(line) for line in lines)
+        return lines
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+
+class _NoDrain:
+    """Stands in for rfile while Werkzeug drains the socket after a response.
+
+    That drain assumes the connection is about to close and would swallow
+    (or block on) the next request of a persistent connection.
+    """
+
+    def read(self, *args):
+        return b''
+
+
+class KeepAliveRequestHandler(WSGIRequestHandler):
+    """Werkzeug's handler with HTTP/1.1 persistent connections.
+
+    Werkzeug always answers 'Connection: close' because it cannot know
+    whether the application read the whole request body.  Here the body is
+    counted and drained after each request, so the connection can safely
+    serve the next one.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def setup(self):
+        self.timeout = self.server.keepalive_timeout
+        super().setup()
+
+    def send_header(self, keyword, value):
+        if keyword.lower() == 'connection' and value.lower() == 'close':
+            if self._can_keep_alive():
+                return
+            # The unread body is too large to drain: announce the close
+            self.close_connection = True
+        super().send_header(keyword, value)
+
+    def _unread_body(self):
+        """Bytes of the request body the application has not read, None if unknown"""
+        environ = getattr(self, 'environ', None)
+        if environ is None or environ.get('HTTP_TRANSFER_ENCODING', '').lower() == 'chunked':
+            return None
+        try:
+            return max(0, int(environ.get('CONTENT_LENGTH') or 0) - environ['wsgi.input'].consumed)
+        except (TypeError, ValueError, KeyError, AttributeError):
+            return None
+
+    def _can_keep_alive(self):
+        remaining = self._unread_body()
+        return remaining is not None and remaining <= MAX_DRAIN_BYTES
+
+    def make_environ(self):
+        environ = super().make_environ()
+        environ['wsgi.input'] = _CountingInput(environ['wsgi.input'])
+        # wsgi.input keeps the real stream; everything else sees _NoDrain
+        self.real_rfile, self.rfile = self.rfile, _NoDrain()
+        return environ
+
+    def run_wsgi(self):
+        self.real_rfile = None
+        # Werkzeug sets environ for this request; never judge it by the last one
+        self.environ = None
+        try:
+            super().run_wsgi()
+        finally:
+            if self.real_rfile is not None:
+                self.rfile = self.real_rfile
+        remaining = self._unread_body()
+        if remaining is None or remaining > MAX_DRAIN_BYTES:
+            self.close_connection = True
+        elif remaining > 0:
+            self.environ['wsgi.input'].read(remaining)
+        self.environ = None
+
+    def handle(self):
+        try:
+            self.close_connection = True
+            self.handle_one_request()
+            while not self.close_connection:
+                # Hand the worker to a queued connection rather than idling here
+                if self.server.pending_connections() > 0:
+                    break
+                self.handle_one_request()
+        except (ConnectionError, socket.timeout) as e:
+            self.connection_dropped(e)
+
+
+class PooledWSGIServer(BaseWSGIServer):
+    """WSGI server with a fixed worker pool and a bounded connection queue"""
+
+    multithread = True
+
+    def __init__(self, host, port, app, threads=8, queue_size=64, keepalive_timeout=5.0, fd=None):
+        self.keepalive_timeout = keepalive_timeout
+        self.queue_size = queue_size
+        self.connections = queue.Queue()
+        self.idle_workers = 0
+        self.idle_lock = threading.Lock()
+        self.stats = {'accepted': 0, 'rejected': 0, 'errors': 0}
+        super().__init__(host, port, app, handler=KeepAliveRequestHandler, fd=fd)
+
+        self.workers = [
+            threading.Thread(target=self._worker, name=f'http-worker-{i}', daemon=True)
+            for i in range(threads)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+    def pending_connections(self):
+        return self.connections.qsize()
+
+    def process_request(self, request, client_address):
+        # Connections handed to idle workers that have not woken up yet do
+        # not count against the queue limit
+        with self.idle_lock:
+            room = self.queue_size + self.idle_workers - self.connections.qsize()
+        if room > 0:
+            self.connections.put((request, client_address))
+            self.stats['accepted'] += 1
+        else:
+            self.stats['rejected'] += 1
+            try:
+                request.settimeout(1.0)
+                request.sendall(BUSY_RESPONSE)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+
+    def _worker(self):
+        while True:
+            with self.idle_lock:
+                self.idle_workers += 1
+            request, client_address = self.connections.get()
+            with self.idle_lock:
+                self.idle_workers -= 1
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.stats['errors'] += 1
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def get_stats(self):
+        stats = dict(self.stats)
+        stats.update({
+            'threads': len(self.workers),
+            'queued': self.connections.qsize(),
+            'idle_workers': self.idle_workers,
+            'queue_limit': self.queue_size,
+            'keepalive_timeout': self.keepalive_timeout
+        })
+        return stats
+
+
+_active = {'server': None, 'limiter': None, 'mode': None}
+
+
+def serving_stats():
+    """Mode, pool and per-endpoint limiter stats of the running server"""
+    server, limiter = _active['server'], _active['limiter']
+    return {
+        'mode': _active['mode'],
+        'pool': server.get_stats() if server else None,
+        'endpoint_limits': limiter.get_stats() if limiter else {}
+    }
+
+
+def serve(app, port, endpoint_limits=None, host='0.0.0.0', fd=None):
+    """Run the app in the mode chosen by SERVER_MODE (development or production).
+
+    fd serves an already listening socket inherited from a parent process,
+    which always uses the production server.
+    """
+    mode = 'production' if fd is not None else os.environ.get('SERVER_MODE', 'development').lower()
+    _active['mode'] = mode
+
+    if endpoint_limits:
+        limiter = EndpointLimiter(
+            app.wsgi_app, endpoint_limits,
+            wait_timeout=float(os.environ.get('ENDPOINT_WAIT_SECONDS', 10))
+        )
+        app.wsgi_app = limiter
+        _active['limiter'] = limiter
+
+    if mode != 'production':
+        app.run(host=host, port=port, debug=False, threaded=True)
+        return
+
+    server = PooledWSGIServer(
+        host, port, app,
+        threads=int(os.environ.get('SERVER_THREADS', 8)),
+        queue_size=int(os.environ.get('SERVER_QUEUE', 64)),
+        keepalive_timeout=float(os.environ.get('SERVER_KEEPALIVE', 5)),
+        fd=fd
+    )
+    _active['server'] = server
+    logging.info(f"Production server on {host}:{port} with {len(server.workers)} workers, "
+                 f"queue {server.queue_size}, keep-alive {server.keepalive_timeout}s")
+    server.serve_forever()
@@ -0,0 +1,199 @@
+"""
+Similarity backends for face embedding comparison
+Place this in: smart_glasses_server/server/similarity.py
+
+All backends work on whole batches: a (m, d) block of query embeddings is
+compared against an (n, d) gallery matrix in one call.  The SimSIMD backend
+uses the library's hand-written NEON / SVE / AVX2 / AVX-512 kernels, the
+NumPy backend is the portable fallback used when simsimd is missing or the
+CPU has no supported SIMD extension.
+"""
+
+import os
+import logging
+import numpy as np
+
+try:
+    import simsimd
+    SIMSIMD_AVAILABLE = True
+except ImportError:
+    simsimd = None
+    SIMSIMD_AVAILABLE = False
+
+SIMD_CAPABILITIES = (
+    'neon', 'sve', 'neon_f16', 'sve_f16', 'neon_i8', 'sve_i8',
+    'haswell', 'skylake', 'ice', 'genoa', 'sapphire', 'turin', 'sierra'
+)
+
+
+CHUNK_ROWS = 4096
+
+
+def quantize_int8(vectors):
+    """Symmetric per-row int8 quantization, returns (codes, scales)"""
+    vectors = _as_2d(vectors).astype(np.float32, copy=False)
+    scales = np.abs(vectors).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def _as_2d(array):
+    array = np.asarray(array)
+    if array.ndim == 1:
+        array = array.reshape(1, -1)
+    return array
+
+
+class NumpyBackend:
+    """Pure NumPy implementation, works on every platform"""
+
+    name = 'numpy'
+
+    def __init__(self):
+        self.isa = 'numpy'
+
+    def cosine(self, queries, matrix, matrix_norms=None):
+        """Cosine similarity of every query against every gallery row, shape (m, n)
+
+        matrix_norms may carry precomputed row norms of the gallery matrix.
+        """
+        queries = _as_2d(queries).astype(np.float32, copy=False)
+        matrix = _as_2d(matrix)
+        dots = self._chunked_dot(queries, matrix)
+        q_norms = np.linalg.norm(queries, axis=1)
+        if matrix_norms is None:
+            matrix_norms = np.concatenate([
+                np.linalg.norm(matrix[i:i + CHUNK_ROWS].astype(np.float32), axis=1)
+                for i in range(0, len(matrix), CHUNK_ROWS)
+            ]) if len(matrix) else np.zeros(0, dtype=np.float32)
+        m_norms = matrix_norms
+        denom = np.outer(q_norms, m_norms)
+        denom[denom == 0] = 1.0
+        return dots / denom
+
+    @staticmethod
+    def _chunked_dot(queries, matrix):
+        """queries @ matrix.T; compact (float16/int8) matrices are widened one
+        block at a time so the gallery never exists in float32 as a whole"""
+        if matrix.dtype == np.float32:
+            return queries @ matrix.T
+        dots = np.empty((len(queries), len(matrix)), dtype=np.float32)
+        for start in range(0, len(matrix), CHUNK_ROWS):
+            block = matrix[start:start + CHUNK_ROWS].astype(np.float32)
+            dots[:, start:start + len(block)] = queries @ block.T
+        return dots
+
+    def sqeuclidean(self, queries, matrix):
+        """Squared L2 distance of every query against every gallery row, shape (m, n)"""
+        queries = _as_2d(queries).astype(np.float32, copy=False)
+        matrix = _as_2d(matrix).astype(np.float32, copy=False)
+        q_sq = np.einsum('ij,ij->i', queries, queries)
+        m_sq = np.einsum('ij,ij->i', matrix, matrix)
+        dist = q_sq[:, None] + m_sq[None, :] - 2.0 * (queries @ matrix.T)
+        return np.maximum(dist, 0.0)
+
+    def dot(self, queries, matrix):
+        """Inner product of every query against every gallery row, shape (m, n)"""
+        queries = _as_2d(queries).astype(np.float32, copy=False)
+        return self._chunked_dot(queries, _as_2d(matrix))
+
+
+class SimSIMDBackend:
+    """Batched SimSIMD kernels (ARM NEON/SVE, x86 AVX2/AVX-512)"""
+
+    name = 'simsimd'
+
+    def __init__(self, threads=1):
+        if not SIMSIMD_AVAILABLE:
+            raise RuntimeError("simsimd is not installed")
+        self.threads = threads
+        capabilities = simsimd.get_capabilities()
+        enabled = [cap for cap in SIMD_CAPABILITIES if capabilities.get(cap)]
+        self.isa = ','.join(enabled) if enabled else 'serial'
+        self._fallback = NumpyBackend()
+
+    def _cdist(self, queries, matrix, metric):
+        queries = np.ascontiguousarray(_as_2d(queries))
+        matrix = np.ascontiguousarray(_as_2d(matrix))
+        if queries.dtype != matrix.dtype:
+            if matrix.dtype == np.int8:
+                if metric != 'cosine':
+                    raise ValueError("int8 gallery rows only support the scale-invariant cosine metric")
+                queries, _ = quantize_int8(queries)
+            else:
+                queries = queries.astype(matrix.dtype)
+        result = simsimd.cdist(queries, matrix, metric=metric,
+                               threads=self.threads, out_dtype='float32')
+        return np.asarray(result)
+
+    def cosine(self, queries, matrix, matrix_norms=None):
+        try:
+            return 1.0 - self._cdist(queries, matrix, 'cosine')
+        except (TypeError, ValueError) as e:
+            logging.debug(f"simsimd cosine fallback to numpy: {e}")
+            return self._fallback.cosine(queries, matrix, matrix_norms)
+
+    def sqeuclidean(self, queries, matrix):
+        try:
+            return self._cdist(queries, matrix, 'sqeuclidean')
+        except (TypeError, ValueError) as e:
+            logging.debug(f"simsimd sqeuclidean fallback to numpy: {e}")
+            return self._fallback.sqeuclidean(queries, matrix)
+
+    def dot(self, queries, matrix):
+        try:
+            return self._cdist(queries, matrix, 'dot')
+        except (TypeError, ValueError) as e:
+            logging.debug(f"simsimd dot fallback to numpy: {e}")
+            return self._fallback.dot(queries, matrix)
+
+
+def simd_supported():
+    """True when simsimd is installed and the CPU has a SIMD extension it can use"""
+    if not SIMSIMD_AVAILABLE:
+        return False
+    capabilities = simsimd.get_capabilities()
+    return any(capabilities.get(cap) for cap in SIMD_CAPABILITIES)
+
+
+def get_backend(name=None):
+    """Pick a similarity backend.
+
+    name may be 'simsimd', 'numpy' or 'auto'; when omitted the
+    SIMILARITY_BACKEND environment variable is used, defaulting to 'auto'.
+    """
+    name = (name or os.environ.get('SIMILARITY_BACKEND', 'auto')).lower()
+
+    if name == 'numpy':
+        return NumpyBackend()
+
+    if name == 'simsimd' or (name == 'auto' and simd_supported()):
+        try:
+            return SimSIMDBackend()
+        except Exception as e:
+            logging.warning(f"SimSIMD backend unavailable ({e}), using NumPy")
+
+    return NumpyBackend()
+
+
+def top_k_mean_by_label(scores, labels, label_count, k=3):
+    """Mean of the k best scores of every label.
+
+    scores and labels are 1-D arrays of the same length; the result has one
+    entry per label (0 for labels without any score).
+    """
+    if len(scores) == 0:
+        return np.zeros(label_count, dtype=np.float32)
+
+    order = np.lexsort((-scores, labels))
+    sorted_scores = scores[order]
+    sorted_labels = labels[order]
+
+    starts = np.searchsorted(sorted_labels, np.arange(label_count))
+    rank = np.arange(len(sorted_labels)) - starts[sorted_labels]
+    keep = rank < k
+
+    sums = np.bincount(sorted_labels[keep], weights=sorted_scores[keep], minlength=label_count)
+    counts = np.bincount(sorted_labels[keep], minlength=label_count)
+    return (sums / np.maximum(counts, 1)).astype(np.float32)
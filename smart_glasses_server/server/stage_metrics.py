@@ -0,0 +1,126 @@
+"""
+Fixed-bucket latency histograms per pipeline stage
+Place this in: smart_glasses_server/server/stage_metrics.py
+
+Each observation is one bisect into a short bucket list plus a couple of
+integer increments under a lock, cheap enough to leave on in production.
+render_prometheus() produces the text exposition format for /metrics and
+summary() gives p50/p95/p99 estimates (interpolated inside the bucket) for
+/api/health.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Upper bounds in seconds; the last bucket is +Inf
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+    0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+
+class LatencyHistogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = bisect.bisect_left(self.buckets, seconds)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.counts), self.count, self.sum, self.max
+
+    def quantile(self, q, snapshot=None):
+        """Estimated q-quantile in seconds (linear within the bucket, capped at the max seen)"""
+        counts, count, _, largest = snapshot or self.snapshot()
+        if count == 0:
+            return 0.0
+
+        rank = q * count
+        cumulative = 0
+        for index, bucket_count in enumerate(counts):
+            if bucket_count and cumulative + bucket_count >= rank:
+                lower = self.buckets[index - 1] if index > 0 else 0.0
+                if index >= len(self.buckets):
+                    return largest
+                upper = self.buckets[index]
+                return min(largest, lower + (upper - lower) * (rank - cumulative) / bucket_count)
+            cumulative += bucket_count
+        return largest
+
+
+class StageMetrics:
+    def __init__(self, prefix, buckets=DEFAULT_BUCKETS):
+        self.prefix = prefix
+        self.buckets = buckets
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram(self.buckets))
+        return histogram
+
+    def items(self):
+        with self.lock:
+            return sorted(self.histograms.items())
+
+    def observe(self, stage, seconds):
+        self.histogram(stage).observe(seconds)
+
+    @contextmanager
+    def time(self, stage):
+        """Record the duration of the with-block under `stage`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.histogram(stage).observe(time.perf_counter() - start)
+
+    def summary(self):
+        """{stage: count, avg/p50/p95/p99 in milliseconds}"""
+        result = {}
+        for stage, histogram in self.items():
+            snapshot = histogram.snapshot()
+            _, count, total, _ = snapshot
+            result[stage] = {
+                'count': count,
+                'avg_ms': round(total * 1000.0 / count, 3) if count else 0.0,
+                'p50_ms': round(histogram.quantile(0.50, snapshot) * 1000.0, 3),
+                'p95_ms': round(histogram.quantile(0.95, snapshot) * 1000.0, 3),
+                'p99_ms': round(histogram.quantile(0.99, snapshot) * 1000.0, 3)
+            }
+        return result
+
+    def render_prometheus(self):
+        """Text exposition format (version 0.0.4)"""
+        name = f"{self.prefix}_stage_duration_seconds"
+        lines = [
+            f"# HELP {name} Time spent per pipeline stage.",
+            f"# TYPE {name} histogram"
+        ]
+        for stage, histogram in self.items():
+            counts, count, total, _ = histogram.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound:g}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{stage="{stage}",le="+Inf"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {total:.6f}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {count}')
+        return '\n'.join(lines) + '\n'
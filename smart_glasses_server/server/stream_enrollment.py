@@ -0,0 +1,122 @@
+"""
+Frame scoring and selection for enrolling people from the live camera
+Place this in: smart_glasses_server/server/stream_enrollment.py
+
+/api/register_from_stream watches the server's own camera for a few
+seconds instead of receiving uploaded photos.  Every frame it manages to
+look at is scored cheaply from the detector output alone (no embedding):
+
+  * size:      shortest side of the face box, saturating at GOOD_FACE_SIZE,
+  * sharpness: Laplacian variance of the aligned 112x112 crop,
+  * pose:      yaw and pitch estimated from the five landmarks.
+
+Frames with two similarly large faces are skipped, since it is unclear who
+is being enrolled.  select_diverse() then picks the best K frames that also
+differ in pose or are well apart in time, so the stored embeddings cover
+the person rather than K copies of one moment.  Only those K crops are
+embedded.
+"""
+
+import numpy as np
+import cv2
+
+GOOD_FACE_SIZE = 160.0
+GOOD_SHARPNESS = 150.0
+MAX_YAW = 0.45
+MAX_PITCH = 0.35
+
+
+def estimate_pose(kps):
+    """(yaw, pitch) from InsightFace's 5 landmarks, both about 0 when frontal.
+
+    yaw is the nose's horizontal offset from the eye midpoint in units of
+    the eye distance; pitch is how far the nose sits from its usual height
+    between the eyes and the mouth.
+    """
+    kps = np.asarray(kps, dtype=np.float32)
+    left_eye, right_eye, nose, left_mouth, right_mouth = kps[:5]
+    eye_mid = (left_eye + right_eye) / 2.0
+    mouth_mid = (left_mouth + right_mouth) / 2.0
+    eye_distance = float(np.linalg.norm(right_eye - left_eye)) or 1.0
+    face_height = float(mouth_mid[1] - eye_mid[1]) or 1.0
+
+    yaw = float(nose[0] - eye_mid[0]) / eye_distance
+    pitch = float(nose[1] - eye_mid[1]) / face_height - 0.55
+    return yaw, pitch
+
+
+def crop_sharpness(crop):
+    gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY) if crop.ndim == 3 else crop
+    return float(cv2.Laplacian(gray, cv2.CV_32F).var())
+
+
+def score_face(bbox, kps, crop, det_score=1.0):
+    """Score dict for one detected face, or None if the pose is unusable"""
+    x1, y1, x2, y2 = (float(v) for v in bbox[:4])
+    size = min(x2 - x1, y2 - y1)
+    yaw, pitch = estimate_pose(kps)
+    if abs(yaw) > MAX_YAW or abs(pitch) > MAX_PITCH:
+        return None
+
+    sharpness = crop_sharpness(crop)
+    size_score = min(1.0, size / GOOD_FACE_SIZE)
+    sharp_score = min(1.0, sharpness / GOOD_SHARPNESS)
+    pose_score = (1.0 - abs(yaw) / MAX_YAW) * (1.0 - abs(pitch) / MAX_PITCH)
+    score = (0.35 * size_score + 0.35 * sharp_score + 0.3 * pose_score) * min(1.0, float(det_score))
+    return {
+        'score': round(score, 4),
+        'face_size': round(size, 1),
+        'sharpness': round(sharpness, 1),
+        'yaw': round(yaw, 3),
+        'pitch': round(pitch, 3)
+    }
+
+
+def dominant_face(bboxes, ambiguity_ratio=0.5):
+    """Index of the largest face, or None if another face is nearly as large"""
+    if len(bboxes) == 0:
+        return None
+    areas = (bboxes[:, 2] - bboxes[:, 0]) * (bboxes[:, 3] - bboxes[:, 1])
+    order = np.argsort(areas)[::-1]
+    if len(order) > 1 and areas[order[1]] > ambiguity_ratio * areas[order[0]]:
+        return None
+    return int(order[0])
+
+
+def select_diverse(candidates, k, min_pose_gap=0.08, min_time_gap=0.4):
+    """Best-scoring candidates that differ in pose or capture time.
+
+    A candidate is taken in score order if, against every frame already
+    chosen, its pose differs by min_pose_gap or it was captured at least
+    min_time_gap seconds apart.  If that leaves fewer than k, the remaining
+    slots go to the next best frames that are not near-duplicates in time.
+    """
+    ranked = sorted(candidates, key=lambda c: c['score'], reverse=True)
+    selected = []
+
+    def distinct(candidate, pose_gap, time_gap):
+        for other in selected:
+            pose_distance = abs(candidate['yaw'] - other['yaw']) + abs(candidate['pitch'] - other['pitch'])
+            if pose_distance < pose_gap and abs(candidate['time'] - other['time']) < time_gap:
+                return False
+        return True
+
+    for pose_gap, time_gap in ((min_pose_gap, min_time_gap), (0.0, min_time_gap / 4.0)):
+        for candidate in ranked:
+            if len(selected) >= k:
+                return selected
+            if candidate in selected:
+                continue
+            if distinct(candidate, pose_gap, time_gap):
+                selected.append(candidate)
+    return selected
+
+
+def consistent_embeddings(embeddings, min_similarity=0.3):
+    """Indices of embeddings that agree with the group mean (same person)"""
+    vectors = np.vstack([np.asarray(e, dtype=np.float32).reshape(1, -1) for e in embeddings])
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-6)
+    mean = vectors.mean(axis=0)
+    mean /= max(float(np.linalg.norm(mean)), 1e-6)
+    similarity = vectors @ mean
+    return [i for i, s in enumerate(similarity) if s >= min_similarity]
@@ -1,6 +1,8 @@
 # -*- coding: utf-8 -*-
 from flask import Flask, request, jsonify, Response, send_from_directory
 from flask_cors import CORS
+from sampling_profiler import profiler_blueprint
+from serving import serve
 import librosa
 import numpy as np
 import base64
@@ -47,6 +49,7 @@ except ImportError:
 
 app = Flask(__name__)
 CORS(app)
+app.register_blueprint(profiler_blueprint)
 logging.basicConfig(level=logging.INFO)
 
 class AudioProcessor:
@@ -189,7 +192,7 @@ class MicrophoneRecorder:
             self.is_recording = True
             
             # Start recording thread
-            self.recording_thread = threading.Thread(target=self._recording_worker, daemon=True)
+            self.recording_thread = threading.Thread(target=self._recording_worker, name='stt-recording', daemon=True)
             self.recording_thread.start()
             
             print("Microphone recording started successfully")
@@ -1167,13 +1170,11 @@ if __name__ == '__main__':
     print("="*60)
     
     try:
-        app.run(
-            host='0.0.0.0',
-            port=port,
-            debug=False,
-            threaded=True
-            
-        )
+        serve(app, port, endpoint_limits={
+            '/stt/transcribe_file': 1,
+            '/stt/transcribe_path': 1,
+            '/stt/stop_recording': 1
+        })
     except KeyboardInterrupt:
         print("\n\nShutting down STT server...")
         print("STT server stopped.")
\ No newline at end of file
@@ -0,0 +1,235 @@
+"""
+Thermal and power governor with performance tiers for the vision pipeline
+Place this in: smart_glasses_server/server/thermal_governor.py
+
+The Pi in the glasses runs on battery inside a closed frame.  Left at full
+speed it reaches its soft temperature limit and the firmware throttles the
+CPU, which hurts far more than running a lighter pipeline on purpose.
+ThermalGovernor samples, every GOVERNOR_INTERVAL seconds:
+
+  * the SoC temperature   (THERMAL_ZONE_PATH, millidegrees C),
+  * the firmware throttle flags (THROTTLED_PATH, hex as in vcgencmd
+    get_throttled; under-voltage, frequency capped, throttled, soft limit),
+  * the battery level     (BATTERY_CAPACITY_PATH, percent),
+  * the 1-minute load average per core,
+
+and picks one of the PERFORMANCE_TIERS below.  Each tier sets the
+recognition rate scale, the detector input size, the preprocessing profile
+and a capture fps cap.  Heat steps up immediately; stepping back down goes
+one tier at a time, only after GOVERNOR_MIN_DWELL seconds in the current
+tier and once the temperature is THERMAL_HYSTERESIS below the threshold,
+so the pipeline does not oscillate around a threshold.
+
+All paths are plain files and can point at fake ones for testing; missing
+files are ignored (a laptop has no throttle flags or battery).  Set
+GOVERNOR=0 to stay in the full tier.
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import namedtuple
+
+PerformanceTier = namedtuple('PerformanceTier', ['name', 'rate_scale', 'det_size', 'preprocess', 'capture_fps'])
+
+# det_size None keeps the model's own input size; capture_fps None = camera rate
+PERFORMANCE_TIERS = (
+    PerformanceTier('full', 1.0, None, 'full', None),
+    PerformanceTier('balanced', 0.75, 480, 'full', 15),
+    PerformanceTier('cool', 0.5, 320, 'light', 10),
+    PerformanceTier('critical', 0.25, 256, 'minimal', 5)
+)
+
+# get_throttled bits that are set while the condition is active
+UNDER_VOLTAGE = 0x1
+FREQUENCY_CAPPED = 0x2
+THROTTLED = 0x4
+SOFT_TEMP_LIMIT = 0x8
+
+
+def read_number(path, base=10):
+    try:
+        with open(path) as f:
+            text = f.read().strip()
+        return int(text, base) if base != 10 else float(text)
+    except (OSError, ValueError):
+        return None
+
+
+class ThermalGovernor:
+    def __init__(self, enabled=True, temp_path='/sys/class/thermal/thermal_zone0/temp',
+                 throttled_path='/sys/devices/platform/soc/soc:firmware/get_throttled',
+                 battery_path='/sys/class/power_supply/battery/capacity', interval=5.0,
+                 thresholds=(65.0, 72.0, 78.0), hysteresis=3.0, min_dwell=15.0,
+                 battery_low=20.0, battery_critical=10.0, max_load=1.5):
+        self.enabled = enabled
+        self.temp_path = temp_path
+        self.throttled_path = throttled_path
+        self.battery_path = battery_path
+        self.interval = interval
+        self.thresholds = tuple(thresholds)
+        self.hysteresis = hysteresis
+        self.min_dwell = min_dwell
+        self.battery_low = battery_low
+        self.battery_critical = battery_critical
+        self.max_load = max_load
+
+        self.lock = threading.Lock()
+        self.level = 0
+        self.reasons = []
+        self.last_sample = None
+        self.changed_at = time.monotonic()
+        self.listeners = []
+        self.thread = None
+        self.stop_event = threading.Event()
+        self.stats = {'samples': 0, 'tier_changes': 0, 'seconds_in_tier': {t.name: 0.0 for t in PERFORMANCE_TIERS}}
+
+    @property
+    def tier(self):
+        return PERFORMANCE_TIERS[self.level]
+
+    def add_listener(self, callback):
+        """callback(tier) runs now and after every tier change"""
+        self.listeners.append(callback)
+        callback(self.tier)
+
+    def sample(self):
+        temperature = read_number(self.temp_path)
+        try:
+            load = os.getloadavg()[0] / float(os.cpu_count() or 1)
+        except OSError:
+            load = None
+        return {
+            'temperature_c': round(temperature / 1000.0, 1) if temperature is not None else None,
+            'throttled': read_number(self.throttled_path, 16),
+            'battery_percent': read_number(self.battery_path),
+            'load_per_core': round(load, 2) if load is not None else None
+        }
+
+    def target_level(self, sample):
+        """(tier index, reasons) the sample calls for, hysteresis applied"""
+        level = 0
+        reasons = []
+
+        temperature = sample['temperature_c']
+        if temperature is not None:
+            for index, threshold in enumerate(self.thresholds, 1):
+                # Thresholds at or below the current tier only release with margin
+                limit = threshold - self.hysteresis if index <= self.level else threshold
+                if temperature >= limit:
+                    level = index
+            if level:
+                reasons.append(f"temperature {temperature}C")
+
+        throttled = sample['throttled']
+        if throttled:
+            if throttled & (THROTTLED | FREQUENCY_CAPPED | SOFT_TEMP_LIMIT):
+                level = max(level, 2)
+                reasons.append(f"firmware throttling 0x{throttled:x}")
+            elif throttled & UNDER_VOLTAGE:
+                level = max(level, 1)
+                reasons.append("under-voltage")
+
+        battery = sample['battery_percent']
+        if battery is not None:
+            if battery <= self.battery_critical:
+                level = max(level, 2)
+                reasons.append(f"battery {battery:.0f}%")
+            elif battery <= self.battery_low:
+                level = max(level, 1)
+                reasons.append(f"battery {battery:.0f}%")
+
+        load = sample['load_per_core']
+        if load is not None and load > self.max_load:
+            level = max(level, 1)
+            reasons.append(f"load {load}/core")
+
+        return min(level, len(PERFORMANCE_TIERS) - 1), reasons
+
+    def update(self, now=None):
+        """Take one sample and switch tiers if needed; returns the active tier"""
+        if not self.enabled:
+            return self.tier
+        now = now or time.monotonic()
+        sample = self.sample()
+
+        with self.lock:
+            target, reasons = self.target_level(sample)
+            self.last_sample = sample
+            self.reasons = reasons
+            self.stats['samples'] += 1
+
+            if target > self.level:
+                new_level = target
+            elif target < self.level and now - self.changed_at >= self.min_dwell:
+                new_level = self.level - 1
+            else:
+                return self.tier
+
+            self.stats['seconds_in_tier'][self.tier.name] += now - self.changed_at
+            previous = self.tier
+            self.level = new_level
+            self.changed_at = now
+            self.stats['tier_changes'] += 1
+            tier = self.tier
+
+        logging.info(f"Performance tier {previous.name} -> {tier.name} ({', '.join(reasons) or 'conditions cleared'})")
+        for callback in self.listeners:
+            try:
+                callback(tier)
+            except Exception as e:
+                logging.error(f"Performance tier listener error: {e}")
+        return tier
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            self.update()
+
+    def start(self):
+        if not self.enabled or (self.thread and self.thread.is_alive()):
+            return
+        self.update()
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, name='thermal-governor', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def get_stats(self):
+        with self.lock:
+            seconds = dict(self.stats['seconds_in_tier'])
+            seconds[self.tier.name] += time.monotonic() - self.changed_at
+            return {
+                'enabled': self.enabled,
+                'tier': self.tier.name,
+                'level': self.level,
+                'settings': self.tier._asdict(),
+                'reasons': list(self.reasons),
+                'sample': self.last_sample,
+                'samples': self.stats['samples'],
+                'tier_changes': self.stats['tier_changes'],
+                'seconds_in_tier': {name: round(value, 1) for name, value in seconds.items()}
+            }
+
+    @classmethod
+    def from_env(cls):
+        env = os.environ
+        return cls(
+            enabled=env.get('GOVERNOR', '1').lower() not in ('0', 'false', 'no'),
+            temp_path=env.get('THERMAL_ZONE_PATH', '/sys/class/thermal/thermal_zone0/temp'),
+            throttled_path=env.get('THROTTLED_PATH', '/sys/devices/platform/soc/soc:firmware/get_throttled'),
+            battery_path=env.get('BATTERY_CAPACITY_PATH', '/sys/class/power_supply/battery/capacity'),
+            interval=float(env.get('GOVERNOR_INTERVAL', 5.0)),
+            thresholds=(
+                float(env.get('THERMAL_WARM', 65.0)),
+                float(env.get('THERMAL_HOT', 72.0)),
+                float(env.get('THERMAL_CRITICAL', 78.0))
+            ),
+            hysteresis=float(env.get('THERMAL_HYSTERESIS', 3.0)),
+            min_dwell=float(env.get('GOVERNOR_MIN_DWELL', 15.0)),
+            battery_low=float(env.get('BATTERY_LOW', 20.0)),
+            battery_critical=float(env.get('BATTERY_CRITICAL', 10.0)),
+            max_load=float(env.get('GOVERNOR_MAX_LOAD', 1.5))
+        )
@@ -13,6 +13,7 @@ import threading
 from datetime import datetime, timedelta
 from flask import Flask, jsonify, request, render_template
 from flask_cors import CORS
+from serving import serve
 import statistics
 from collections import deque, defaultdict
 import logging
@@ -586,7 +587,7 @@ if __name__ == '__main__':
         logger.info("Starting Pi 5 Ultrasonic Distance Sensor Server...")
         logger.info("Measurement interval: 4 seconds")
         logger.info(f"GPIO pins - Trig: {TRIG_PIN}, Echo: {ECHO_PIN}")
-        app.run(host='0.0.0.0', port=5001, debug=False)
+        serve(app, 5001)
     except KeyboardInterrupt:
         logger.info("Shutting down...")
     finally: